@@ -12,9 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from datetime import datetime, timedelta
-from os.path import join, abspath, dirname, isfile
-import re
+from datetime import datetime
+from functools import partial
+from os.path import join, abspath, dirname
 import time
 
 from alsaaudio import Mixer
@@ -24,29 +24,36 @@ from mycroft import MycroftSkill, intent_handler
 from mycroft.configuration.config import LocalConf, USER_CONFIG
 from mycroft.messagebus.message import Message
 from mycroft.skills import skill_api_method
-from mycroft.util import play_mp3
-from mycroft.util.format import nice_date_time, nice_time, nice_date, join_list
-from mycroft.util.parse import extract_datetime, extract_number
-from mycroft.util.time import to_utc, now_local, now_utc
+from mycroft.util.format import nice_date_time, nice_time, join_list
+from mycroft.util.time import to_utc, now_local
 
 from mycroft.util.time import to_system
 
-from .lib.alarm import (
-    alarm_log_dump,
-    curate_alarms,
-    get_alarm_local,
-    get_next_repeat,
-    has_expired_alarm,
-)
+from .lib.alarm import get_alarm_local
+from .lib.display import MouthDisplay
+from .lib.engine import AlarmEngine
 from .lib.format import nice_relative_time
-from .lib.parse import fuzzy_match, utterance_has_midnight
+from .lib.frames import FrameScheduler
+from .lib.journal import AlarmJournal
+from .lib.parse import (
+    ExtractionCache,
+    ParsedUtterance,
+    RegexFileCache,
+    VocabMatcher,
+    fuzzy_match,
+)
+from .lib.player import AlarmPlayer
 from .lib.recur import (
     create_day_set,
-    create_recurring_rule,
     describe_recurrence,
     describe_repeat_rule,
+    get_repeat_rule_cache_info,
 )
+from .lib.ringing import AlarmRinger
+from .lib.sounds import SoundCache
+from .lib.stats import FiringLog, LatencyStats, traced
 
+MARK_I = "mycroft_mark_1"
 MARK_II = "mycroft_mark_2"
 USE_24_HOUR = "full"
 
@@ -85,24 +92,25 @@ class AlarmSkill(MycroftSkill):
 
     def __init__(self):
         super(AlarmSkill, self).__init__()
-        self.beep_process = None
-        self.beep_start_time = None
+        self.player = AlarmPlayer()
+        self.ringer = AlarmRinger(self.player)
         self.flash_state = 0
         self.recurrence_dict = None
         self.sound_name = None
-
-        # Seconds of gap between sound repeats.
-        # The value name must match an option from the 'sound' value of the
-        # settingmeta.json, which also corresponds to the name of an mp3
-        # file in the skill's sounds/ folder.  E.g. <skill>/sounds/bell.mp3
-        #
-        self.sounds = {
-            "bell": 5.0,
-            "escalate": 32.0,
-            "constant_beep": 5.0,
-            "beep4": 4.0,
-            "chimes": 22.0,
-        }
+        self.engine = None
+        self.name_regex = RegexFileCache()
+        self.name_rx_files = {}  # lang -> path of name.rx
+        self.extraction_cache = ExtractionCache()
+        self.animation = FrameScheduler()
+        self.latency = LatencyStats()
+        self.firings = FiringLog()
+        self.display = None
+        self.stop_vocab = None
+
+        # The sound setting is the name of an mp3 file in the skill's sounds/
+        # folder, e.g. <skill>/sounds/bell.mp3. The options of the 'sound'
+        # value in settingsmeta.json must match these names.
+        self.sound_cache = None
 
         # initialize alarm settings
         self.init_settings()
@@ -138,6 +146,14 @@ class AlarmSkill(MycroftSkill):
         #       be in the utc timezone.
         #
         # NOTE: Using list instead of tuple because of serialization
+        #
+        # At runtime the alarms are held by an AlarmEngine (self.engine) which
+        # persists every change to an AlarmJournal in the Skill's file system
+        # and notifies the Skill through next_alarm_changed() and
+        # active_changed(). Older versions stored the list in
+        # settings["alarm"], it is migrated to the journal on first load.
+        # settings["alarm"] is still kept as a copy of the list, through
+        # alarms_changed(), for older versions of the Skill.
 
     def init_settings(self):
         """Add any missing default settings."""
@@ -151,28 +167,56 @@ class AlarmSkill(MycroftSkill):
         """Executed immediately after Skill has been initialized."""
         self.register_entity_file("daytype.entity")  # TODO: Keep?
         self.recurrence_dict = self.translate_namedvalues("recurring")
+        self._get_name_patterns()
+        self.stop_vocab = VocabMatcher(
+            join(abspath(dirname(__file__)), "vocab"), "StopBeeping"
+        )
 
-        # Time is the first value, so this will sort alarms by time
-        self.settings["alarm"] = sorted(
-            self.settings["alarm"], key=lambda a: a["timestamp"]
+        anim_dir = join(abspath(dirname(__file__)), "anim")
+        self.display = MouthDisplay(self.enclosure, anim_dir)
+        # Encode the confirmation animation now rather than while it plays.
+        # TODO: the first tile, Alarm-N-1.png, isn't drawn as images > 8x8
+        #       choked mouth_display_png() (likely on the enclosure side)
+        for i in range(1, 16):
+            tiles = [(16, "Alarm-{}-3.png"), (24, "Alarm-{}-4.png")]
+            if i < 8:
+                tiles.insert(0, (8, "Alarm-{}-2.png"))
+            tiles = [(x, join(anim_dir, png.format(i))) for x, png in tiles]
+            self.display.add_frame("alarm-{}".format(i), tiles)
+
+        # Decode the selected sound now so the first alarm doesn't have to
+        self.sound_cache = SoundCache(
+            join(abspath(dirname(__file__)), "sounds"),
+            join(self.file_system.path, "sounds"),
+        )
+        self.sound_cache.prepare(self.settings["sound"] or self.DEFAULT_SOUND)
+
+        # On the first run with the journal the alarms in the settings are
+        # migrated to it
+        self.engine = AlarmEngine(
+            AlarmJournal(self.file_system.path),
+            notifier=self,
+            alarms=self.settings["alarm"],
         )
 
         # This will reschedule alarms which have expired within the last
         # 5 minutes, and cull anything older.
-        self.settings["alarm"] = curate_alarms(self.settings["alarm"], 5 * 60)
+        self.engine.curate(5 * 60)
 
-        self._schedule()
+        self.engine.update()
 
         # TODO: remove the "private.mycroftai.has_alarm" event in favor of the
         #   "skill.alarm.query-active" event.
         self.add_event("private.mycroftai.has_alarm", self.on_has_alarm)
         self.add_event("skill.alarm.query-active", self.handle_active_alarm_query)
+        self.add_event("skill.alarm.query-cache-stats", self.handle_cache_stats_query)
+        self.add_event("skill.alarm.stats", self.handle_stats_query)
 
     # TODO: remove the "private.mycroftai.has_alarm" event in favor of the
     #   "skill.alarm.query-active" event.
     def on_has_alarm(self, message):
         """Reply to requests for alarm on/off status."""
-        total = len(self.settings["alarm"])
+        total = len(self.engine)
         self.bus.emit(message.response(data={"active_alarms": total}))
 
     def handle_active_alarm_query(self, message):
@@ -181,56 +225,88 @@ class AlarmSkill(MycroftSkill):
         In this case, an "active alarm" is defined as any alarms that exist for a time
         in the future.
         """
-        event_data = {"active_alarms": bool(self.settings["alarm"])}
+        event_data = {"active_alarms": bool(self.engine)}
         event = message.response(data=event_data)
         self.bus.emit(event)
 
+    def handle_cache_stats_query(self, message):
+        """Emits the hit and miss counts of the parsing caches."""
+        event_data = {
+            "extraction": self.extraction_cache.info(),
+            "repeat_rule": get_repeat_rule_cache_info(),
+        }
+        self.bus.emit(message.response(data=event_data))
+
+    def handle_stats_query(self, message):
+        """Emits the latency of each stage of the intent handlers.
+
+        If the message data has "dump": true, the statistics are also
+        written to latency.json in the Skill's file system.
+        """
+        event_data = {"latency": self.latency.summary()}
+        if message.data.get("dump"):
+            event_data["file"] = self._dump_latency()
+        self.bus.emit(message.response(data=event_data))
+
+    def _dump_latency(self):
+        stats_file = join(self.file_system.path, "latency.json")
+        try:
+            self.latency.dump(stats_file)
+        except OSError as err:
+            self.log.warning("Can't write latency stats: {}".format(err))
+            return None
+        return stats_file
+
     def set_alarm(self, when, name=None, repeat=None):
         """Set an alarm at the specified datetime."""
-        requested_time = when.replace(second=0, microsecond=0)
-        if repeat:
-            alarm = create_recurring_rule(requested_time, repeat)
-            alarm = {
-                "timestamp": alarm["timestamp"],
-                "repeat_rule": alarm["repeat_rule"],
-                "name": name or "",
-            }
-        else:
-            alarm = {
-                "timestamp": to_utc(requested_time).timestamp(),
-                "repeat_rule": "",
-                "name": name or "",
-            }
-
-        for existing in self.settings["alarm"]:
-            if alarm == existing:
-                self.speak_dialog("alarm.already.exists")
-                return None
-        self.settings["alarm"].append(alarm)
-        self._schedule()
+        with self.latency.span("schedule"):
+            alarm = self.engine.create(when, name, repeat)
+        if alarm is None:
+            self.speak_dialog("alarm.already.exists")
         return alarm
 
-    def _schedule(self):
-        """Schedule future event for an alarm and clean up as required."""
-        # cancel any existing timed event
-        self.cancel_scheduled_event("NextAlarm")
-        self.settings["alarm"] = curate_alarms(self.settings["alarm"])
+    def alarms_changed(self, alarms):
+        """Keep a copy of the alarm list in the settings for older versions.
 
-        # set timed event for next alarm (if it exists)
-        if self.settings["alarm"]:
-            alarm_dt = get_alarm_local(self.settings["alarm"][0])
+        Mycroft writes the settings to disk when the Skill is unloaded.
+        """
+        self.settings["alarm"] = list(alarms)
+
+    def next_alarm_changed(self, alarm):
+        """Arm the timed event for the next alarm (if it exists)."""
+        self.cancel_scheduled_event("NextAlarm")
+        if alarm:
+            alarm_dt = get_alarm_local(alarm)
             self.schedule_event(
                 self._alarm_expired, to_system(alarm_dt), name="NextAlarm"
             )
-        event_data = {"active_alarms": bool(self.settings["alarm"])}
+
+    def active_changed(self, active):
+        """Announce that there start or stop being active alarms."""
+        event_data = {"active_alarms": active}
         event = Message("skill.alarm.scheduled", data=event_data)
         self.bus.emit(event)
 
-    def _get_recurrence(self, utterance: str):
-        """Get recurrence pattern from user utterance."""
-        recur = create_day_set(utterance, self.recurrence_dict)
+    def _parse_utterance(self, utterance):
+        """Wrap an utterance for lazy extraction of the alarm details."""
+        return ParsedUtterance(
+            utterance,
+            lang=self.lang,
+            threshold=self.THRESHOLD,
+            midnight_voc=self.translate_list("midnight"),
+            recurrence_dict=self.recurrence_dict,
+            name_extractor=self._get_alarm_name,
+            cache=self.extraction_cache,
+            timer=self.latency.record,
+        )
+
+    def _get_recurrence(self, parsed):
+        """Get recurrence pattern from a parsed user utterance."""
+        utterance = parsed.utterance
+        recur = parsed.recurrence
         while not recur:
-            response = self.get_response("query.recurrence", num_retries=1)
+            with self.latency.span("prompt"):
+                response = self.get_response("query.recurrence", num_retries=1)
             if not response:
                 return
             recur = create_day_set(response, self.recurrence_dict)
@@ -253,13 +329,15 @@ class AlarmSkill(MycroftSkill):
                 recur_description = describe_recurrence(
                     recur, self.recurrence_dict, self.translate("and")
                 )
-                conf = self.ask_yesno(
-                    "confirm.recurring.alarm",
-                    data={"time": alarm_nice_time, "recurrence": recur_description},
-                )
+                with self.latency.span("prompt"):
+                    conf = self.ask_yesno(
+                        "confirm.recurring.alarm",
+                        data={"time": alarm_nice_time, "recurrence": recur_description},
+                    )
             else:
                 alarm_nice_dt = nice_date_time(alarm_time, now=today, use_ampm=True)
-                conf = self.ask_yesno("confirm.alarm", data={"time": alarm_nice_dt})
+                with self.latency.span("prompt"):
+                    conf = self.ask_yesno("confirm.alarm", data={"time": alarm_nice_dt})
             if not conf:
                 return
             if conf == "yes":
@@ -267,9 +345,7 @@ class AlarmSkill(MycroftSkill):
                 confirmed_time = True
             else:
                 # check if a new (corrected) time was given
-                when = extract_datetime(conf)
-                if when is not None:
-                    when = when[0]
+                when = self._parse_utterance(conf).when
                 if not when or when == today:
                     # Not a confirmation and no date/time in statement, quit
                     return
@@ -295,45 +371,51 @@ class AlarmSkill(MycroftSkill):
         .optionally("Recurring")
         .optionally("Recurrence")
     )
+    @traced("set")
     def handle_set_alarm(self, message):
         """Handler for "set an alarm for..."""
         utt = message.data.get("utterance").lower()
+        parsed = self._parse_utterance(utt)
         recur = None
 
         if message.data.get("Recurring"):
             # Just ignoring the 'Recurrence' now, we support more complex stuff
             # recurrence = message.data.get('Recurrence')
-            recur = self._get_recurrence(utt)
+            recur = self._get_recurrence(parsed)
 
         # Get the time
-        when, utt_no_datetime = extract_datetime(utt) or (None, utt)
+        when = parsed.when
 
         # Get name from leftover string from extract_datetime
-        name = self._get_alarm_name(utt_no_datetime)
+        name = parsed.name
 
         # Will return dt of unmatched string
-        today = extract_datetime("today", lang="en-us")[0]
+        today = self.engine.today()
 
         # Check the time if it's midnight. This is to check if the user
         # said a recurring alarm with only the Day or if the user did
         # specify to set an alarm on midnight. If it's confirmed that
         # it's for a day only, then get another response from the user
         # to clarify what time on that day the recurring alarm is.
-        is_midnight = utterance_has_midnight(
-            utt, when, self.THRESHOLD, self.translate_list("midnight")
-        )
+        is_midnight = parsed.is_midnight
 
         if (when is None or when.time() == today.time()) and not is_midnight:
-            response = self.get_response("query.for.when", validator=extract_datetime)
+            responses = {}
+
+            def has_datetime(response):
+                responses[response] = self._parse_utterance(response)
+                return responses[response].when is not None
+
+            with self.latency.span("prompt"):
+                response = self.get_response("query.for.when", validator=has_datetime)
             if not response:
                 self.speak_dialog("alarm.schedule.cancelled")
                 return
-            when_temp = extract_datetime(response)
+            parsed_response = responses.get(response) or self._parse_utterance(response)
+            when_temp = parsed_response.when
             if when_temp is not None:
-                when_temp = when_temp[0]
                 # TODO add check for midnight
-                # is_midnight = utterance_has_midnight(response, when_temp, self.THRESHOLD,
-                #                                      self.translate_list("midnight"))
+                # is_midnight = parsed_response.is_midnight
                 when = (
                     when_temp
                     if when is None
@@ -357,7 +439,7 @@ class AlarmSkill(MycroftSkill):
         alarm = {}
         if not recur:
             alarm_time_ts = to_utc(alarm_time).timestamp()
-            now_ts = now_utc().timestamp()
+            now_ts = self.engine.now().timestamp()
             if alarm_time_ts > now_ts:
                 alarm = self.set_alarm(alarm_time, name)
             else:
@@ -379,43 +461,56 @@ class AlarmSkill(MycroftSkill):
 
         # Don't want to hide the animation
         self.enclosure.deactivate_mouth_events()
-        if confirmed_time:
-            self.speak_dialog("alarm.scheduled")
-        else:
-            alarm_nice_time = self._describe(alarm)
-            reltime = nice_relative_time(get_alarm_local(alarm))
-            if recur:
-                self.speak_dialog(
-                    "recurring.alarm.scheduled.for.time",
-                    data={"time": alarm_nice_time, "rel": reltime},
-                )
+        with self.latency.span("speak"):
+            if confirmed_time:
+                self.speak_dialog("alarm.scheduled")
             else:
-                self.speak_dialog(
-                    "alarm.scheduled.for.time",
-                    data={"time": alarm_nice_time, "rel": reltime},
-                )
+                alarm_nice_time = self._describe(alarm)
+                reltime = nice_relative_time(get_alarm_local(alarm))
+                if recur:
+                    self.speak_dialog(
+                        "recurring.alarm.scheduled.for.time",
+                        data={"time": alarm_nice_time, "rel": reltime},
+                    )
+                else:
+                    self.speak_dialog(
+                        "alarm.scheduled.for.time",
+                        data={"time": alarm_nice_time, "rel": reltime},
+                    )
 
-        self._show_alarm_ui(alarm_time, name)
-        self._show_alarm_anim(alarm_time)
-        self.enclosure.activate_mouth_events()
+        with self.latency.span("ui"):
+            self._show_alarm_ui(alarm_time, name)
+        with self.latency.span("animation"):
+            self._show_alarm_anim(alarm_time)
+
+    def _get_name_patterns(self):
+        """Get the compiled name.rx patterns for the current language."""
+        if self.lang not in self.name_rx_files:
+            self.name_rx_files[self.lang] = self.find_resource("name.rx", "regex")
+        rx_file = self.name_rx_files[self.lang]
+        if not rx_file:
+            return []
+        return self.name_regex.get(rx_file)
 
     def _get_alarm_name(self, utt):
         """Get the alarm name using regex on an utterance."""
         self.log.debug("Utterance being searched: " + utt)
+        start = time.monotonic()
+        name = self._extract_alarm_name(utt)
+        self.log.debug(
+            "Alarm name extracted in {:.2f} ms".format(
+                (time.monotonic() - start) * 1000
+            )
+        )
+        return name
+
+    def _extract_alarm_name(self, utt):
+        """Match an utterance against the name.rx patterns."""
         invalid_names = self.translate_list("invalid_names")
-        rx_file = self.find_resource("name.rx", "regex")
-        if utt and rx_file:
-            patterns = []
-            with open(rx_file) as regex_file:
-                patterns = [
-                    p.strip()
-                    for p in regex_file.readlines()
-                    if not p.strip().startswith("#")
-                ]
-
-            for pat in patterns:
-                self.log.debug("Regex pattern: {}".format(pat))
-                res = re.search(pat, utt)
+        if utt:
+            for pat in self._get_name_patterns():
+                self.log.debug("Regex pattern: {}".format(pat.pattern))
+                res = pat.search(utt)
                 if res:
                     try:
                         name = res.group("Name").strip()
@@ -472,66 +567,71 @@ class AlarmSkill(MycroftSkill):
         .require("Alarm")
         .optionally("Recurring")
     )
+    @traced("status")
     def handle_status(self, message):
         """Respond to request for alarm status."""
         utt = message.data.get("utterance")
 
-        if len(self.settings["alarm"]) == 0:
+        if len(self.engine) == 0:
             self.speak_dialog("alarms.list.empty")
             return
 
         status, alarms = self._get_alarm_matches(
             utt,
-            alarm=self.settings["alarm"],
             max_results=3,
             dialog="ask.which.alarm",
             is_response=False,
         )
         total = None
         desc = []
-        if alarms:
-            total = len(alarms)
-            for alarm in alarms:
-                desc.append(self._describe(alarm))
+        with self.latency.span("describe"):
+            if alarms:
+                total = len(alarms)
+                for alarm in alarms:
+                    desc.append(self._describe(alarm))
 
-        items_string = ""
-        if desc:
-            items_string = join_list(desc, self.translate("and"))
+            items_string = ""
+            if desc:
+                items_string = join_list(desc, self.translate("and"))
 
-        if status == "No Match Found":
-            self.speak_dialog("alarm.not.found")
-        elif status == "User Cancelled":
+        if status == "User Cancelled":
             return
-        elif status == "Next":
-            reltime = nice_relative_time(get_alarm_local(alarms[0]))
-
-            self.speak_dialog(
-                "next.alarm",
-                data={"when": self._describe(alarms[0]), "duration": reltime},
-            )
-        else:
-            if total == 1:
+        with self.latency.span("speak"):
+            if status == "No Match Found":
+                self.speak_dialog("alarm.not.found")
+            elif status == "Next":
                 reltime = nice_relative_time(get_alarm_local(alarms[0]))
+
                 self.speak_dialog(
-                    "alarms.list.single", data={"item": desc[0], "duration": reltime}
+                    "next.alarm",
+                    data={"when": self._describe(alarms[0]), "duration": reltime},
                 )
             else:
-                self.speak_dialog(
-                    "alarms.list.multi", data={"count": total, "items": items_string}
-                )
+                if total == 1:
+                    reltime = nice_relative_time(get_alarm_local(alarms[0]))
+                    self.speak_dialog(
+                        "alarms.list.single",
+                        data={"item": desc[0], "duration": reltime},
+                    )
+                else:
+                    self.speak_dialog(
+                        "alarms.list.multi",
+                        data={"count": total, "items": items_string},
+                    )
 
     def _get_alarm_matches(
         self,
         utt,
-        alarm=None,
+        alarm_ids=None,
         max_results=1,
         dialog="ask.which.alarm",
         is_response=False,
     ):
         """Get list of alarms that match based on a user utterance.
         Arguments:
-            utt (str): string spoken by the user
-            alarm (list): list of alarm to match against
+            utt (str or ParsedUtterance): string spoken by the user
+            alarm_ids (list): ids of the stored alarms to match against,
+                              ordered by time. Defaults to all alarms.
             max_results (int): max number of results desired
             dialog (str): name of dialog file used for disambiguation
             is_response (bool): is this being called by get_response
@@ -539,87 +639,26 @@ class AlarmSkill(MycroftSkill):
             (str): ["All", "Matched", "No Match Found", or "User Cancelled"]
             (list): list of matched alarm
         """
-        alarms = alarm or self.settings["alarm"]
         all_words = self.translate_list("all")
         next_words = self.translate_list("next")
         status = ["All", "Matched", "No Match Found", "User Cancelled", "Next"]
 
+        if isinstance(utt, str):
+            utt = self._parse_utterance(utt)
+        with self.latency.span("match"):
+            match = self.engine.match(utt, alarm_ids)
+
         # No alarms
-        if alarms is None or len(alarms) == 0:
+        if match is None:
             self.log.error("Cannot get match. No active alarms.")
             return (status[2], None)
 
-        # Extract Alarm Time
-        when, utt_no_datetime = extract_datetime(utt) or (None, None)
-
-        # Will return dt of unmatched string
-        today = extract_datetime("today", lang="en-us")[0]
-
-        # Check the time if it's midnight. This is to check if the user
-        # said a recurring alarm with only the Day or if the user did
-        # specify to set an alarm on midnight. If it's confirmed that
-        # it's for a day only, then get another response from the user
-        # to clarify what time on that day the recurring alarm is.
-        is_midnight = utterance_has_midnight(
-            utt, when, self.THRESHOLD, self.translate_list("midnight")
-        )
-
-        if when == today and not is_midnight:
-            when = None
-
-        time_matches = None
-        time_alarm = None
-        if when:
-            time_alarm = to_utc(when).timestamp()
-            if is_midnight:
-                time_alarm = time_alarm + 86400.0
-            time_matches = [a for a in alarms if abs(a["timestamp"] - time_alarm) <= 60]
-
-        # Extract Recurrence
-        recur = None
-        recurrence_matches = None
-        for word in self.recurrence_dict:
-            is_match = fuzzy_match(word, utt.lower(), self.THRESHOLD)
-            if is_match:
-                recur = create_day_set(utt, self.recurrence_dict)
-                alarm_recur = create_recurring_rule(when, recur)
-                recurrence_matches = [
-                    a for a in alarms if a["repeat_rule"] == alarm_recur["repeat_rule"]
-                ]
-                break
-
-        utt = utt_no_datetime or utt
-
-        # Extract Ordinal/Cardinal Numbers
-        number = extract_number(utt, ordinals=True)
-        if number and number > 0:
-            number = int(number)
-        else:
-            number = None
-
-        # Extract Name
-        name_matches = [
-            a
-            for a in alarms
-            if a["name"] and fuzzy_match(a["name"], utt, self.THRESHOLD)
-        ]
-
-        # Match Everything
-        alarm_to_match = None
-        if when:
-            if recur:
-                alarm_to_match = alarm_recur
-            else:
-                alarm_to_match = {"timestamp": time_alarm, "repeat_rule": ""}
-
-        # Find the Intersection of the Alarms list and all the matched alarms
-        orig_count = len(alarms)
-        if when and time_matches:
-            alarms = [a for a in alarms if a in time_matches]
-        if recur and recurrence_matches:
-            alarms = [a for a in alarms if a in recurrence_matches]
-        if name_matches:
-            alarms = [a for a in alarms if a in name_matches]
+        alarms = match.alarms
+        utt = match.remainder
+        number = match.number
+        recur = match.recur
+        when = match.when
+        orig_count = match.candidate_count
 
         # Utterance refers to all alarms
         if utt and any(fuzzy_match(i, utt, 1) for i in all_words):
@@ -631,8 +670,8 @@ class AlarmSkill(MycroftSkill):
         # Given something to match but no match found
         if (
             (number and number > len(alarms))
-            or (recur and not recurrence_matches)
-            or (when and not time_matches)
+            or (recur and not match.recurrence_matched)
+            or (when and not match.time_matched)
         ):
             return (status[2], None)
         # If number of alarms filtered were the same, assume user asked for
@@ -661,18 +700,19 @@ class AlarmSkill(MycroftSkill):
             if desc:
                 items_string = join_list(desc, self.translate("and"))
 
-            reply = self.get_response(
-                dialog,
-                data={
-                    "number": len(alarms),
-                    "list": items_string,
-                },
-                num_retries=1,
-            )
+            with self.latency.span("prompt"):
+                reply = self.get_response(
+                    dialog,
+                    data={
+                        "number": len(alarms),
+                        "list": items_string,
+                    },
+                    num_retries=1,
+                )
             if reply:
                 return self._get_alarm_matches(
                     reply,
-                    alarm=alarms,
+                    alarm_ids=match.alarm_ids,
                     max_results=max_results,
                     dialog=dialog,
                     is_response=True,
@@ -690,13 +730,14 @@ class AlarmSkill(MycroftSkill):
         .optionally("Recurring")
         .optionally("Recurrence")
     )
+    @traced("delete")
     def handle_delete(self, message):
         """Respond to request to remove a scheduled alarm."""
-        if has_expired_alarm(self.settings["alarm"]):
+        if self.engine.has_expired():
             self._stop_expired_alarm()
             return
 
-        total = len(self.settings["alarm"])
+        total = len(self.engine)
         if not total:
             self.speak_dialog("alarms.list.empty")
             return
@@ -705,7 +746,6 @@ class AlarmSkill(MycroftSkill):
 
         status, alarms = self._get_alarm_matches(
             utt,
-            alarm=self.settings["alarm"],
             max_results=1,
             dialog="ask.which.alarm.delete",
             is_response=False,
@@ -719,12 +759,13 @@ class AlarmSkill(MycroftSkill):
         if total == 1:
             desc = self._describe(alarms[0])
             recurring = ".recurring" if alarms[0]["repeat_rule"] else ""
-            if (
-                self.ask_yesno("ask.cancel.desc.alarm" + recurring, data={"desc": desc})
-                == "yes"
-            ):
-                del self.settings["alarm"][self.settings["alarm"].index(alarms[0])]
-                self._schedule()
+            with self.latency.span("prompt"):
+                answer = self.ask_yesno(
+                    "ask.cancel.desc.alarm" + recurring, data={"desc": desc}
+                )
+            if answer == "yes":
+                with self.latency.span("schedule"):
+                    self.engine.delete(alarms[:1])
                 self.speak_dialog(
                     "alarm.cancelled.desc" + recurring, data={"desc": desc}
                 )
@@ -736,14 +777,13 @@ class AlarmSkill(MycroftSkill):
                 # return True to skip all the remaining conditions
                 return
         elif status in ["Next", "All", "Matched"]:
-            if (
-                self.ask_yesno("ask.cancel.alarm.plural", data={"count": total})
-                == "yes"
-            ):
-                self.settings["alarm"] = [
-                    a for a in self.settings["alarm"] if a not in alarms
-                ]
-                self._schedule()
+            with self.latency.span("prompt"):
+                answer = self.ask_yesno(
+                    "ask.cancel.alarm.plural", data={"count": total}
+                )
+            if answer == "yes":
+                with self.latency.span("schedule"):
+                    self.engine.delete(alarms)
                 self.speak_dialog("alarm.cancelled.multi", data={"count": total})
                 self.gui.release()
             return
@@ -754,42 +794,28 @@ class AlarmSkill(MycroftSkill):
         return
 
     @intent_handler("snooze.intent")
+    @traced("snooze")
     def snooze_alarm(self, message):
         """Snooze an expired alarm for the requested time.
 
         If no time provided by user, defaults to 9 mins.
         """
-        if not has_expired_alarm(self.settings["alarm"]):
+        if not self.engine.has_expired():
             return
 
-        self.__end_beep()
-        self.__end_flash()
+        with self.latency.span("silence"):
+            self.__end_beep()
+            self.__end_flash()
 
         utt = message.data.get("utterance") or ""
-        snooze_for = extract_number(utt)
+        with self.latency.span("number"):
+            snooze_for = self.extraction_cache.extract_number(utt, lang=self.lang)
         if not snooze_for or snooze_for < 1:
             snooze_for = 9  # default to 9 minutes
 
         # Snooze always applies the the first alarm in the sorted array
-        alarm = self.settings["alarm"][0]
-        alarm_dt = get_alarm_local(alarm)
-        snooze = to_utc(alarm_dt) + timedelta(minutes=snooze_for)
-
-        if "snooze" in alarm:
-            # already snoozed
-            original_time = alarm["snooze"]
-        else:
-            original_time = alarm["timestamp"]
-
-        # Fill schedule with a snoozed entry -- 3 items:
-        #    snooze_expire_timestamp, repeat_rule, original_timestamp
-        self.settings["alarm"][0] = {
-            "timestamp": snooze.timestamp(),
-            "repeat_rule": alarm["repeat_rule"],
-            "name": alarm["name"],
-            "snooze": original_time,
-        }
-        self._schedule()
+        with self.latency.span("schedule"):
+            self.engine.snooze(snooze_for)
 
     @intent_handler("change.alarm.sound.intent")
     def handle_change_alarm(self, _):
@@ -800,96 +826,105 @@ class AlarmSkill(MycroftSkill):
         """
         self.speak_dialog("alarm.change.sound")
 
+    def shutdown(self):
+        """Make sure all alarm changes are on disk before unloading."""
+        self.animation.cancel()
+        self.ringer.stop()
+        self.player.close()
+        if self.engine:
+            self.engine.close()
+            self._dump_latency()
+
     ##########################################################################
     # Audio and Device Feedback
 
     def converse(self, utterances, lang="en-us"):
         """While an alarm is expired, check all utterances for Stop vocab."""
-        if has_expired_alarm(self.settings["alarm"]):
-            if utterances and self.voc_match(utterances[0], "StopBeeping"):
+        # Every utterance passes through here, do nothing else while quiet
+        if not self.engine.has_expired():
+            return False
+        return self._converse_ringing(utterances, lang or self.lang)
+
+    @traced("converse")
+    def _converse_ringing(self, utterances, lang):
+        with self.latency.span("voc_match"):
+            is_stop = utterances and self._is_stop(utterances[0], lang)
+        if is_stop:
+            with self.latency.span("silence"):
                 self._stop_expired_alarm()
-                return True  # and consume this phrase
+            return True  # and consume this phrase
+        return False
+
+    def _is_stop(self, utterance, lang):
+        """Check an utterance for the StopBeeping vocabulary."""
+        if lang in self.stop_vocab:
+            return self.stop_vocab.match(utterance, lang)
+        return self.voc_match(utterance, "StopBeeping")
 
     def stop(self, _=None):
         """Respond to system stop commands."""
-        if has_expired_alarm(self.settings["alarm"]):
+        self.animation.cancel()
+        if self.engine.has_expired():
             self._stop_expired_alarm()
             return True  # Stop signal handled no need to listen
         else:
             return False
 
-    def _play_beep(self, _=None):
-        """ Play alarm sound file """
-        now = now_local()
-
-        if not self.beep_start_time:
-            self.beep_start_time = now
-        elif (now - self.beep_start_time).total_seconds() > self.settings[
-            "max_alarm_secs"
-        ]:
-            # alarm has been running long enough, auto-quiet it
-            self.log.info("Automatically quieted alarm after 10 minutes")
-            self._stop_expired_alarm()
-            return
-
+    def _play_beep(self, alarm, on_sound_start=None):
+        """Start ringing the alarm sound file, flashing the alarm time."""
         # Validate user-selected alarm sound file
-        alarm_file = join(
-            abspath(dirname(__file__)), "sounds", self.sound_name + ".mp3"
-        )
-        if not isfile(alarm_file):
+        alarm_file = self.sound_cache.get(self.sound_name)
+        if alarm_file is None:
             # Couldn't find the required sound file
             self.sound_name = self.DEFAULT_SOUND
-            alarm_file = join(
-                abspath(dirname(__file__)), "sounds", self.sound_name + ".mp3"
-            )
+            alarm_file = self.sound_cache.get(self.sound_name)
 
-        beep_duration = self.sounds[self.sound_name]
+        beep_duration = self.sound_cache.duration(self.sound_name) or 0
         repeat_interval = beep_duration + self.BEEP_GAP
 
-        next_beep = now + timedelta(seconds=repeat_interval)
-
-        self.cancel_scheduled_event("Beep")
-        self.schedule_event(self._play_beep, to_system(next_beep), name="Beep")
+        # Without a faceplate there is nothing to flash
+        on_flash = None
+        if self.config_core["enclosure"].get("platform") == MARK_I:
+            on_flash = partial(self._while_beeping, alarm["timestamp"])
+
+        self.ringer.start(
+            alarm_file,
+            repeat_interval,
+            self.settings["max_alarm_secs"],
+            on_repeat=self._on_beep,
+            on_flash=on_flash,
+            on_timeout=self._on_ringing_timeout,
+            on_sound_start=on_sound_start,
+        )
 
-        # Increase volume each pass until fully on
+    def _on_beep(self):
+        """Increase volume each pass until fully on."""
         if self.saved_volume:
             if self.volume < 90:
                 self.volume += 10
             self.mixer.setvolume(self.volume)
 
-        try:
-            self.beep_process = play_mp3(alarm_file)
-        except Exception:
-            self.beep_process = None
+    def _on_ringing_timeout(self):
+        """Auto-quiet an alarm that has been running long enough."""
+        self.log.info(
+            "Automatically quieted alarm after {} seconds".format(
+                self.settings["max_alarm_secs"]
+            )
+        )
+        self._stop_expired_alarm()
 
-    def _while_beeping(self, message):
+    def _while_beeping(self, alarm_timestamp):
         if self.flash_state < 3:
             if self.flash_state == 0:
-                alarm_timestamp = message.data["alarm_time"]
                 alarm_dt = get_alarm_local(timestamp=alarm_timestamp)
                 self._render_time(alarm_dt)
             self.flash_state += 1
         else:
-            self.enclosure.mouth_reset()
+            self.display.reset()
             self.flash_state = 0
 
-        # Check if the WAV is still playing
-        if self.beep_process:
-            self.beep_process.poll()
-            if self.beep_process.returncode:
-                # The playback has ended
-                self.beep_process = None
-
     def __end_beep(self):
-        self.cancel_scheduled_event("Beep")
-        self.beep_start_time = None
-        if self.beep_process:
-            try:
-                if self.beep_process.poll() is None:  # still running
-                    self.beep_process.kill()
-            except Exception:
-                pass
-            self.beep_process = None
+        self.ringer.stop()
         self._restore_volume()
         self._restore_listen_beep()
 
@@ -915,16 +950,13 @@ class AlarmSkill(MycroftSkill):
             del self.settings["user_beep_setting"]
 
     def _stop_expired_alarm(self):
-        if has_expired_alarm(self.settings["alarm"]):
+        if self.engine.has_expired():
             self.__end_beep()
             self.__end_flash()
             self.cancel_scheduled_event("NextAlarm")
 
-            self.settings["alarm"] = curate_alarms(
-                self.settings["alarm"], 0
-            )  # end any expired alarm
+            self.engine.stop_expired()  # end any expired alarm
             self.gui.release()
-            self._schedule()
             return True
         else:
             return False
@@ -936,8 +968,13 @@ class AlarmSkill(MycroftSkill):
             self.saved_volume = None
 
     def _alarm_expired(self):
+        alarm = self.engine.ring()
+        if alarm is None:
+            return
+        audio_started = self.firings.fired(alarm)
+
         self.sound_name = self.settings["sound"]  # user-selected alarm sound
-        if not self.sound_name or self.sound_name not in self.sounds:
+        if not self.sound_name or self.sound_name not in self.sound_cache.names():
             # invalid sound name, use the default
             self.sound_name = self.DEFAULT_SOUND
 
@@ -948,67 +985,49 @@ class AlarmSkill(MycroftSkill):
         else:
             self.saved_volume = None
 
-        self._play_beep()
+        self.animation.cancel()
 
         # Once a second Flash the alarm and auto-listen
         self.flash_state = 0
         self.enclosure.deactivate_mouth_events()
-        alarm = self.settings["alarm"][0]
-        self.schedule_repeating_event(
-            self._while_beeping,
-            0,
-            1,
-            name="Flash",
-            data={"alarm_time": alarm["timestamp"]},
-        )
+        self._play_beep(alarm, on_sound_start=audio_started)
+
         alarm_timestamp = alarm.get("timestamp", "")
         alarm_dt = get_alarm_local(timestamp=alarm_timestamp)
         alarm_name = alarm.get("name", "")
         self._show_alarm_ui(alarm_dt, alarm_name, alarm_exp=True)
 
     def __end_flash(self):
-        self.cancel_scheduled_event("Flash")
-        self.enclosure.mouth_reset()
+        self.display.reset()
         self.enclosure.activate_mouth_events()
 
     def _show_alarm_anim(self, alarm_dt):
-        """Animated confirmation of the alarm."""
-        self.enclosure.mouth_reset()
+        """Animated confirmation of the alarm.
+
+        The animation plays in the background, mouth events are activated
+        again once it ends or is cancelled.
+        """
 
-        self._render_time(alarm_dt)
-        time.sleep(2)
-        self.enclosure.mouth_reset()
+        def render_time():
+            self.display.reset()
+            self._render_time(alarm_dt)
 
+        def on_done():
+            self.display.reset()
+            self.enclosure.activate_mouth_events()
+            self.log.debug("Alarm animation timing: {}".format(self.animation.stats()))
+
+        frames = [(0.0, render_time), (2.0, self.display.reset)]
         # Show an animation
-        # TODO: mouth_display_png() is choking images > 8x8
-        #       (likely on the enclosure side)
+        offset = 2.0
         for i in range(1, 16):
-            png = join(
-                abspath(dirname(__file__)), "anim", "Alarm-" + str(int(i)) + "-1.png"
-            )
-            # self.enclosure.mouth_display_png(png, x=0, y=0, refresh=False,
-            #                                  invert=True)
-            png = join(
-                abspath(dirname(__file__)), "anim", "Alarm-" + str(int(i)) + "-2.png"
-            )
-            if i < 8:
-                self.enclosure.mouth_display_png(
-                    png, x=8, y=0, refresh=False, invert=True
-                )
-            png = join(
-                abspath(dirname(__file__)), "anim", "Alarm-" + str(int(i)) + "-3.png"
-            )
-            self.enclosure.mouth_display_png(png, x=16, y=0, refresh=False, invert=True)
-            png = join(
-                abspath(dirname(__file__)), "anim", "Alarm-" + str(int(i)) + "-4.png"
-            )
-            self.enclosure.mouth_display_png(png, x=24, y=0, refresh=False, invert=True)
+            name = "alarm-{}".format(i)
+            frames.append((offset, partial(self.display.show_frame, name)))
+            offset += 1.0 if i == 4 else 0.15
+        frames.append((offset, lambda: None))  # hold the last frame
 
-            if i == 4:
-                time.sleep(1)
-            else:
-                time.sleep(0.15)
-        self.enclosure.mouth_reset()
+        self.enclosure.deactivate_mouth_events()
+        self.animation.play(frames, on_done=on_done)
 
     def _render_time(self, alarm_dt):
         """Show the time in numbers eg '8:00 AM'."""
@@ -1018,25 +1037,7 @@ class AlarmSkill(MycroftSkill):
         x = 16 - ((len(timestr) * 4) // 2)  # centers on display
         if not self.use_24hour:
             x += 1  # account for wider letters P and M, offset by the colon
-
-        # draw on the display
-        for ch in timestr:
-            if ch == ":":
-                png = "colon.png"
-                w = 2
-            elif ch == " ":
-                png = "blank.png"
-                w = 2
-            elif ch == "A" or ch == "P" or ch == "M":
-                png = ch + ".png"
-                w = 5
-            else:
-                png = ch + ".png"
-                w = 4
-
-            png = join(abspath(dirname(__file__)), "anim", png)
-            self.enclosure.mouth_display_png(png, x=x, y=2, refresh=False)
-            x += w
+        self.display.show_time(timestr, x)
 
     def _show_alarm_ui(self, alarm_dt, alarm_name, alarm_exp=False):
         if self.config_core.get("time_format") == USE_24_HOUR:
@@ -1062,12 +1063,7 @@ class AlarmSkill(MycroftSkill):
     @skill_api_method
     def delete_all_alarms(self):
         """Delete all stored alarms."""
-        if len(self.settings["alarm"]) > 0:
-            self.settings["alarm"] = []
-            self._schedule()
-            return True
-        else:
-            return False
+        return self.engine.delete_all()
 
     @skill_api_method
     def get_active_alarms(self):
@@ -1083,12 +1079,28 @@ class AlarmSkill(MycroftSkill):
                 "snooze" (float): [optional] POSIX timestamp if alarm was snoozed
             }
         """
-        return self.settings["alarm"]
+        return self.engine.alarms.serialize()
+
+    @skill_api_method
+    def get_firing_stats(self):
+        """Get how punctually the latest alarms went off.
+
+        Returns:
+            {
+                "lateness" (dict): time from the alarm time to firing
+                "snooze_lateness" (dict): the same for snoozed alarms
+                "audio_start" (dict): time from firing to the sound starting
+                "recent" (list): the latest firings
+            }
+            where each statistic is {"count", "mean_ms", "p50_ms", "p95_ms",
+            "max_ms"}.
+        """
+        return self.firings.summary()
 
     @skill_api_method
     def is_alarm_expired(self):
         """Check if an alarm is currently expired and beeping."""
-        return has_expired_alarm(self.settings["alarm"])
+        return self.engine.has_expired()
 
 
 def create_skill():
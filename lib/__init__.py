@@ -13,12 +13,39 @@
 # limitations under the License.
 
 from .alarm import (
+    AlarmStore,
     alarm_log_dump,
     curate_alarms,
+    get_alarm_key,
     get_alarm_local,
     get_next_repeat,
+    get_next_repeats,
     has_expired_alarm,
 )
+from .display import MouthDisplay
+from .engine import AlarmEngine, AlarmMatch, AlarmNotifier
 from .format import nice_relative_time
-from .parse import fuzzy_match, utterance_has_midnight
-from .recur import create_day_set, create_recurring_rule, describe_recurrence
\ No newline at end of file
+from .frames import FrameScheduler
+from .journal import AlarmJournal
+from .player import AlarmPlayer
+from .parse import (
+    ExtractionCache,
+    NameIndex,
+    ParsedUtterance,
+    ReferenceTime,
+    RegexFileCache,
+    VocabMatcher,
+    fuzzy_match,
+    utterance_has_midnight,
+)
+from .recur import (
+    create_day_set,
+    create_recurring_rule,
+    describe_recurrence,
+    get_repeat_rule,
+    get_repeat_rule_cache_info,
+)
+from .ringing import AlarmRinger
+from .sounds import SoundCache
+from .stats import FiringLog, LatencyHistogram, LatencyStats, traced
+from .wheel import AlarmDispatcher, TimerWheel
@@ -12,13 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from bisect import bisect_left, bisect_right, insort
 from datetime import datetime
-from dateutil.rrule import rrulestr
 
 from mycroft.util import LOG
 from mycroft.util.format import nice_time, nice_date
 from mycroft.util.time import default_timezone, now_local, now_utc, to_local, to_utc
 
+from .parse import NameIndex
+from .recur import get_day_mask, get_next_occurrence
+
 
 def alarm_log_dump(alarms, tag=""):
     """Create a log dump of all alarms. Useful when debugging."""
@@ -55,45 +58,75 @@ def alarm_log_dump(alarms, tag=""):
 
     return dump
 
-def curate_alarms(alarms, curation_limit=1):
+def curate_alarms(alarms, curation_limit=1, now=None):
     """Clean a list of alarms including rescheduling repeating alarms.
 
     Arguments:
         alarms (List): list of Alarms
         curation_limit (int, optional): Seconds past expired at which to 
                                         remove the alarm
+        now (datetime, optional): current time in the timezone to repeat in,
+                                  defaults to now_local()
     Returns:
         List: cleaned list of Alarms
     """
     curated_alarms = []
-    now_ts = to_utc(now_utc()).timestamp()
+    if now is None:
+        now = now_local()
+    now_ts = now.timestamp()
 
+    expired_alarms = [alarm for alarm in alarms if alarm["timestamp"] < now_ts]
+    curated_expired_alarms = iter(
+        _curate_expired_alarms(expired_alarms, now, curation_limit)
+    )
     for alarm in alarms:
         # Alarm format == [timestamp, repeat_rule[, orig_alarm_timestamp]]
         if alarm["timestamp"] < now_ts:
-            if alarm["timestamp"] < (now_ts - curation_limit):
-                # skip playing an old alarm
-                if alarm["repeat_rule"]:
-                    # reschedule in future if repeat rule exists
-                    curated_alarms.append(get_next_repeat(alarm))
-            else:
-                # schedule for right now, with the
-                # third entry as the original base time
-                base = alarm["name"] if alarm["name"] == "" else alarm["timestamp"]
-                curated_alarms.append(
-                    {
-                        "timestamp": now_ts + 1,
-                        "repeat_rule": alarm["repeat_rule"],
-                        "name": alarm["name"],
-                        "snooze": base,
-                    }
-                )
+            curated_alarm = next(curated_expired_alarms)
+            if curated_alarm:
+                curated_alarms.append(curated_alarm)
         else:
             curated_alarms.append(alarm)
 
     curated_alarms = sorted(curated_alarms, key=lambda a: a["timestamp"])
     return curated_alarms
 
+def _curate_expired_alarms(alarms, now, curation_limit):
+    """Get the replacements for expired alarms.
+
+    Arguments:
+        alarms (List): alarms whose timestamp is before now
+        now (datetime): current local time
+        curation_limit (int): Seconds past expired at which to remove the alarm
+    Returns:
+        List: for each alarm the rescheduled alarm, or None if the alarm
+              should be removed
+    """
+    now_ts = now.timestamp()
+    curated_alarms = [None] * len(alarms)
+    repeating = []
+    for idx, alarm in enumerate(alarms):
+        if alarm["timestamp"] < (now_ts - curation_limit):
+            # skip playing an old alarm
+            if alarm["repeat_rule"]:
+                # reschedule in future if repeat rule exists
+                repeating.append(idx)
+        else:
+            # schedule for right now, with the
+            # third entry as the original base time
+            base = alarm["name"] if alarm["name"] == "" else alarm["timestamp"]
+            curated_alarms[idx] = {
+                "timestamp": now_ts + 1,
+                "repeat_rule": alarm["repeat_rule"],
+                "name": alarm["name"],
+                "snooze": base,
+            }
+
+    next_repeats = get_next_repeats([alarms[idx] for idx in repeating], now)
+    for idx, next_repeat in zip(repeating, next_repeats):
+        curated_alarms[idx] = next_repeat
+    return curated_alarms
+
 def get_alarm_local(alarm=None, timestamp=None):
     """Get the local time of an Alarm or timestamp.
 
@@ -113,6 +146,18 @@ def get_alarm_local(alarm=None, timestamp=None):
 
     return datetime.fromtimestamp(ts, default_timezone())
 
+def get_alarm_key(alarm):
+    """Get the canonical key identifying an Alarm.
+
+    Two alarms with the same key are considered duplicates.
+
+    Arguments:
+        alarm (Alarm): single instance of an Alarm
+    Returns:
+        Tuple: (timestamp, repeat_rule, name)
+    """
+    return (alarm["timestamp"], alarm["repeat_rule"] or "", alarm["name"] or "")
+
 def get_next_repeat(alarm):
     """Get the next occurence of a repeating alarm.
 
@@ -126,17 +171,15 @@ def get_next_repeat(alarm):
         }
     """
     # evaluate recurrence to the next instance
-    if "snooze" in alarm:
+    if alarm.get("snooze"):
         # repeat from original time (it was snoozed)
-        ref = datetime.fromtimestamp(alarm["repeat_rule"])
+        start = get_alarm_local(timestamp=alarm["snooze"])
     else:
-        ref = datetime.fromtimestamp(alarm["timestamp"])
+        start = get_alarm_local(alarm)
 
-    # Create a repeat rule and get the next alarm occurrance after that
-    start = to_utc(ref)
-    repeat_rule = rrulestr("RRULE:" + alarm["repeat_rule"], dtstart=start)
-    now = to_utc(now_utc())
-    next_occurence = repeat_rule.after(now)
+    # Get the next alarm occurrance after now
+    now = now_local()
+    next_occurence = get_next_occurrence(alarm["repeat_rule"], start, now)
 
     LOG.debug("     Now={}".format(now))
     LOG.debug("Original={}".format(start))
@@ -148,6 +191,61 @@ def get_next_repeat(alarm):
         "name": alarm["name"],
     }
 
+def get_next_repeats(alarms, now=None):
+    """Get the next occurence of several repeating alarms at once.
+
+    Gives the same result as calling get_next_repeat() on each alarm, but
+    the clock and timezone are only read once and alarms that share a
+    repeat rule and time of day are only evaluated once. This keeps
+    curation fast after a device has been offline for a while.
+
+    Arguments:
+        alarms (List): repeating Alarms
+        now (datetime, optional): current time in the timezone to repeat in,
+                                  defaults to now_local()
+    Returns:
+        List: next occurence of each alarm, in the same order
+    """
+    if not alarms:
+        return []
+
+    if now is None:
+        now = now_local()
+    tz = now.tzinfo
+    now_ts = now.timestamp()
+    next_occurences = {}  # (repeat_rule, time of day) -> datetime
+
+    repeats = []
+    for alarm in alarms:
+        start_ts = alarm.get("snooze") or alarm["timestamp"]
+        start = datetime.fromtimestamp(start_ts, tz)
+        if start_ts > now_ts:
+            key = (alarm["repeat_rule"], start)
+        elif get_day_mask(alarm["repeat_rule"]):
+            # Only the time of day of a past start affects the next weekly repeat
+            key = (alarm["repeat_rule"], start.time())
+        else:
+            key = None
+        next_occurence = next_occurences.get(key)
+        if next_occurence is None:
+            next_occurence = get_next_occurrence(alarm["repeat_rule"], start, now)
+            if key:
+                next_occurences[key] = next_occurence
+        repeats.append(
+            {
+                "timestamp": to_utc(next_occurence).timestamp(),
+                "repeat_rule": alarm["repeat_rule"],
+                "name": alarm["name"],
+            }
+        )
+
+    LOG.debug(
+        "Rescheduled {} repeating alarms, {} distinct".format(
+            len(alarms), len(next_occurences)
+        )
+    )
+    return repeats
+
 def has_expired_alarm(alarms):
     """Check if list of alarms includes one that is currently expired.
     
@@ -166,3 +264,324 @@ def has_expired_alarm(alarms):
             return True
 
     return False
+
+
+class AlarmStore:
+    """Priority queue of Alarms keyed on their next fire time.
+
+    Alarms are ordered in a single sorted list of (timestamp, alarm_id)
+    pairs. Peeking at the next alarm to expire is O(1), the list serves
+    range queries by bisection, and inserting or removing an alarm is a
+    O(log n) search plus an O(n) list shift, which is cheap for the
+    number of alarms a user keeps. The store serializes to the same sorted
+    list of Alarm dicts that is kept in the Skill's settings["alarm"].
+
+    An index of canonical alarm keys (see get_alarm_key) is kept in sync
+    with the list so that duplicate checks are O(1). Alarm names are kept
+    in a NameIndex (self.names) for fuzzy name matching.
+
+    Each alarm gets an id that is stable for as long as it is stored. For
+    matching, the ids are also indexed by repeat rule and by name in hash
+    buckets.
+
+    If a journal is given, every change is appended to it, see
+    lib.journal.AlarmJournal.
+
+    Arguments:
+        alarms (List, optional): initial list of Alarms
+        journal (AlarmJournal, optional): journal recording each change
+    """
+
+    def __init__(self, alarms=None, journal=None):
+        self.journal = journal
+        self._alarms = {}  # alarm_id -> Alarm
+        self._keys = {}  # get_alarm_key(alarm) -> set of alarm_ids
+        self._times = []  # sorted (timestamp, alarm_id)
+        self._rules = {}  # repeat_rule -> set of alarm_ids
+        self._names = {}  # name -> set of alarm_ids
+        self.names = NameIndex()
+        self._next_id = 0
+        self._sorted = None
+        for alarm in alarms or []:
+            self._insert(alarm)
+
+    def __len__(self):
+        return len(self._alarms)
+
+    def __iter__(self):
+        return iter(self.sorted())
+
+    def __contains__(self, alarm):
+        return get_alarm_key(alarm) in self._keys
+
+    def add(self, alarm):
+        """Add an Alarm to the store.
+
+        Arguments:
+            alarm (Alarm): alarm to add
+        Returns:
+            int: id of the alarm within this store
+        """
+        alarm_id = self._add(alarm)
+        self._record("create", alarm)
+        return alarm_id
+
+    def peek(self):
+        """Get the next Alarm to expire without removing it.
+
+        Returns:
+            Alarm: earliest alarm, or None if the store is empty
+        """
+        if not self._times:
+            return None
+        return self._alarms[self._times[0][1]]
+
+    def pop(self):
+        """Remove and return the next Alarm to expire.
+
+        Returns:
+            Alarm: earliest alarm, or None if the store is empty
+        """
+        alarm = self._pop()
+        if alarm:
+            self._record("delete", alarm)
+        return alarm
+
+    def remove(self, alarm):
+        """Remove an Alarm from the store.
+
+        Arguments:
+            alarm (Alarm): alarm to remove
+        Returns:
+            Bool: True if the alarm was found and removed
+        """
+        removed = self._remove(alarm)
+        if removed:
+            self._record("delete", alarm)
+        return removed
+
+    def snooze(self, alarm, snoozed_alarm):
+        """Replace an Alarm with its snoozed version.
+
+        Arguments:
+            alarm (Alarm): alarm being snoozed
+            snoozed_alarm (Alarm): alarm to add in its place
+        """
+        self._remove(alarm)
+        self._add(snoozed_alarm)
+        self._record("snooze", alarm, snoozed_alarm)
+
+    def clear(self):
+        """Remove all Alarms from the store."""
+        self._alarms = {}
+        self._keys = {}
+        self._times = []
+        self._rules = {}
+        self._names = {}
+        self.names = NameIndex()
+        self._sorted = None
+        self._record("clear")
+
+    def curate(self, curation_limit=1, now=None, keep=None):
+        """Clean the store including rescheduling repeating alarms.
+
+        Only the expired alarms at the head of the queue are visited, see
+        curate_alarms() for the rules that are applied to them.
+
+        Arguments:
+            curation_limit (int, optional): Seconds past expired at which to
+                                            remove the alarm
+            now (datetime, optional): current time in the timezone to repeat
+                                      in, defaults to now_local()
+            keep (Alarm, optional): expired alarm to leave as it is, e.g.
+                                    the alarm that is ringing
+        """
+        if now is None:
+            now = now_local()
+        expired = bisect_left(self._times, (now.timestamp(), -1))
+        expired_ids = [alarm_id for _, alarm_id in self._times[:expired]]
+        if keep is not None:
+            for alarm_id in expired_ids:
+                if self._alarms[alarm_id] == keep:
+                    # Keeps its id, the alarm isn't changed
+                    expired_ids.remove(alarm_id)
+                    break
+        expired_alarms = [self._delete(alarm_id) for alarm_id in expired_ids]
+
+        curated_alarms = _curate_expired_alarms(expired_alarms, now, curation_limit)
+        for alarm, curated_alarm in zip(expired_alarms, curated_alarms):
+            if curated_alarm:
+                self._add(curated_alarm)
+                self._record("reschedule", alarm, curated_alarm)
+            else:
+                self._record("delete", alarm)
+
+    def sync(self):
+        """Make the journaled changes durable.
+
+        The journal is compacted into a new snapshot once it has grown
+        large compared to the number of alarms.
+        """
+        if self.journal is None:
+            return
+        if self.journal.should_compact(len(self)):
+            self.journal.compact(self.serialize())
+        else:
+            self.journal.sync()
+
+    def sorted(self):
+        """Get all Alarms ordered by their next fire time.
+
+        The returned list is cached until the store changes and must not be
+        modified by the caller.
+
+        Returns:
+            List: sorted list of Alarms
+        """
+        if self._sorted is None:
+            self._sorted = [self._alarms[alarm_id] for _, alarm_id in self._times]
+        return self._sorted
+
+    def get(self, alarm_id):
+        """Get an Alarm by its id.
+
+        Arguments:
+            alarm_id (int): id of the alarm within this store
+        Returns:
+            Alarm: the alarm, or None if it is no longer stored
+        """
+        return self._alarms.get(alarm_id)
+
+    def ids(self):
+        """Get the ids of all Alarms ordered by their next fire time.
+
+        Returns:
+            List: alarm ids
+        """
+        return [alarm_id for _, alarm_id in self._times]
+
+    def sort_ids(self, alarm_ids):
+        """Order alarm ids by the next fire time of their Alarms.
+
+        Arguments:
+            alarm_ids (Iterable): ids of stored alarms
+        Returns:
+            List: alarm ids
+        """
+        return sorted(
+            alarm_ids,
+            key=lambda alarm_id: (self._alarms[alarm_id]["timestamp"], alarm_id),
+        )
+
+    def ids_between(self, start, end):
+        """Get the ids of Alarms firing within a time range.
+
+        Arguments:
+            start (float): POSIX timestamp of the start of the range
+            end (float): POSIX timestamp of the end of the range, inclusive
+        Returns:
+            Set: alarm ids
+        """
+        lower = bisect_left(self._times, (start, -1))
+        upper = bisect_right(self._times, (end, self._next_id))
+        return {alarm_id for _, alarm_id in self._times[lower:upper]}
+
+    def ids_with_rule(self, repeat_rule):
+        """Get the ids of Alarms with a repeat rule.
+
+        Arguments:
+            repeat_rule (str): iCal repeat rule, "" for one-shot alarms
+        Returns:
+            Set: alarm ids
+        """
+        return set(self._rules.get(repeat_rule or "", ()))
+
+    def ids_with_names(self, names):
+        """Get the ids of Alarms with any of the given names.
+
+        Arguments:
+            names (Iterable): alarm names
+        Returns:
+            Set: alarm ids
+        """
+        alarm_ids = set()
+        for name in names:
+            alarm_ids.update(self._names.get(name, ()))
+        return alarm_ids
+
+    def serialize(self):
+        """Get the Alarms in the format stored in settings["alarm"].
+
+        Returns:
+            List: sorted list of Alarms
+        """
+        return list(self.sorted())
+
+    def _add(self, alarm):
+        """Add an Alarm without journaling it."""
+        return self._insert(alarm)
+
+    def _pop(self):
+        """Remove the earliest Alarm without journaling it."""
+        if not self._times:
+            return None
+        return self._delete(self._times[0][1])
+
+    def _remove(self, alarm):
+        """Remove an Alarm without journaling it."""
+        alarm_ids = self._keys.get(get_alarm_key(alarm), ())
+        for alarm_id in alarm_ids:
+            if self._alarms[alarm_id] == alarm:
+                break
+        else:
+            return False
+
+        self._delete(alarm_id)
+        return True
+
+    def _record(self, op, alarm=None, new_alarm=None):
+        """Append a change to the journal, if there is one."""
+        if self.journal is not None:
+            self.journal.append(op, alarm, new_alarm)
+
+    def _insert(self, alarm):
+        """Register an Alarm in the indexes.
+
+        Returns:
+            int: id of the alarm within this store
+        """
+        alarm_id = self._next_id
+        self._next_id += 1
+        self._alarms[alarm_id] = alarm
+        self._keys.setdefault(get_alarm_key(alarm), set()).add(alarm_id)
+        insort(self._times, (alarm["timestamp"], alarm_id))
+        self._rules.setdefault(alarm["repeat_rule"] or "", set()).add(alarm_id)
+        if alarm["name"]:
+            self._names.setdefault(alarm["name"], set()).add(alarm_id)
+            self.names.add(alarm["name"])
+        self._sorted = None
+        return alarm_id
+
+    def _delete(self, alarm_id):
+        """Unregister an Alarm from the indexes.
+
+        Returns:
+            Alarm: the removed alarm
+        """
+        alarm = self._alarms.pop(alarm_id)
+        _discard_from_bucket(self._keys, get_alarm_key(alarm), alarm_id)
+        del self._times[bisect_left(self._times, (alarm["timestamp"], alarm_id))]
+        _discard_from_bucket(self._rules, alarm["repeat_rule"] or "", alarm_id)
+        if alarm["name"]:
+            _discard_from_bucket(self._names, alarm["name"], alarm_id)
+            self.names.remove(alarm["name"])
+        self._sorted = None
+        return alarm
+
+
+def _discard_from_bucket(buckets, key, alarm_id):
+    """Remove an alarm id from a dict of sets, dropping empty sets."""
+    bucket = buckets[key]
+    bucket.discard(alarm_id)
+    if not bucket:
+        del buckets[key]
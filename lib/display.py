@@ -0,0 +1,204 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Mark 1 faceplate output for the Mycroft Alarm Skill."""
+
+from collections import OrderedDict
+from os.path import exists, join
+
+from mycroft.util import LOG
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Glyph image file and width on the display of each character in a time
+GLYPHS = {
+    ":": ("colon.png", 2),
+    " ": ("blank.png", 2),
+    "A": ("A.png", 5),
+    "P": ("P.png", 5),
+    "M": ("M.png", 5),
+}
+GLYPHS.update({str(digit): ("{}.png".format(digit), 4) for digit in range(10)})
+
+# Widest image sent to the faceplate at once, larger images are not
+# reliably displayed (see the Skill's initialize())
+TILE_WIDTH = 8
+# Row of the display the top of the glyphs is drawn at
+GLYPH_ROW = 2
+DISPLAY_HEIGHT = 8
+
+
+def encode_columns(columns):
+    """Encode columns of pixels for EnclosureAPI.mouth_display().
+
+    Arguments:
+        columns (List): one int per column, bit n set if row n is lit
+    Returns:
+        str: image code for the Mark 1 faceplate
+    """
+    code = [chr(65 + len(columns)), chr(65 + DISPLAY_HEIGHT)]
+    for column in columns:
+        code.append(chr(65 + (column & 0xF)))
+        code.append(chr(65 + (column >> 4)))
+    return "".join(code)
+
+
+def load_image_columns(png_file, row=0, invert=False):
+    """Read an image as columns of lit pixels, dark pixels are lit.
+
+    Arguments:
+        png_file (str): path of the image
+        row (int): row of the display the top of the image is drawn at
+        invert (bool): light pixels are lit instead, as with the invert
+                       option of EnclosureAPI.mouth_display_png()
+    Returns:
+        List: one int per column, bit n set if row n of the display is lit
+    """
+    image = Image.open(png_file).convert("L")
+    width, height = image.size
+    columns = []
+    for x in range(width):
+        column = 0
+        for y in range(height):
+            if (image.getpixel((x, y)) < 128) != invert:
+                column |= 1 << (y + row)
+        columns.append(column)
+    return columns
+
+
+class MouthDisplay:
+    """Draws times and animation frames on the faceplate of a Mark 1.
+
+    The glyph images are read once into an atlas of pixel columns. A time
+    is composed from the atlas into a single image, sent in as few tiles as
+    the faceplate accepts, and the encoded tiles are cached by time string.
+    Animation frames are encoded the same way when they are added, so
+    playing them sends image codes only. A time or frame that is already
+    on the display is not sent again until the display is reset. Without
+    PIL every glyph and frame tile is sent as its own image file.
+
+    Arguments:
+        enclosure (EnclosureAPI): the skill's enclosure
+        anim_dir (str): directory of the glyph images
+        cache_size (int): number of composed times to keep
+    """
+
+    def __init__(self, enclosure, anim_dir, cache_size=32):
+        self.enclosure = enclosure
+        self.anim_dir = anim_dir
+        self.cache_size = cache_size
+        self.displayed = None
+        self.atlas = self._load_atlas() if Image else None
+        self._frames = OrderedDict()  # (time string, x) -> [(x, image code)]
+        self._images = {}  # frame name -> [(x, image code or None, png file)]
+
+    def show_time(self, timestr, x):
+        """Draw a time unless it is on the display already.
+
+        Arguments:
+            timestr (str): time as written, e.g. "8:00 AM"
+            x (int): column of the display to start at
+        """
+        if self.displayed == (timestr, x):
+            return
+        if self.atlas is None:
+            self._draw_glyphs(timestr, x)
+        else:
+            for tile_x, code in self._get_frame(timestr, x):
+                self.enclosure.mouth_display(code, x=tile_x, y=0, refresh=False)
+        self.displayed = (timestr, x)
+
+    def add_frame(self, name, tiles):
+        """Encode an animation frame to draw with show_frame().
+
+        The tiles are light on dark images covering the full height of the
+        display, drawn as EnclosureAPI.mouth_display_png() with invert set.
+
+        Arguments:
+            name (str): name of the frame
+            tiles (List): (x, png file) of each tile of the frame
+        """
+        encoded = []
+        for x, png_file in tiles:
+            code = None
+            if Image is not None:
+                try:
+                    code = encode_columns(load_image_columns(png_file, invert=True))
+                except OSError as err:
+                    LOG.warning("Can't load frame {}: {}".format(png_file, err))
+            encoded.append((x, code, png_file))
+        self._images[name] = encoded
+
+    def show_frame(self, name):
+        """Draw an animation frame unless it is on the display already.
+
+        Arguments:
+            name (str): name given to add_frame()
+        """
+        if self.displayed == name:
+            return
+        for x, code, png_file in self._images[name]:
+            if code is None:
+                self.enclosure.mouth_display_png(
+                    png_file, x=x, y=0, refresh=False, invert=True
+                )
+            else:
+                self.enclosure.mouth_display(code, x=x, y=0, refresh=False)
+        self.displayed = name
+
+    def reset(self):
+        """Clear the display."""
+        self.enclosure.mouth_reset()
+        self.displayed = None
+
+    def _load_atlas(self):
+        atlas = {}
+        for char, (png, width) in GLYPHS.items():
+            png_file = join(self.anim_dir, png)
+            if not exists(png_file):
+                continue
+            try:
+                columns = load_image_columns(png_file, GLYPH_ROW)
+            except OSError as err:
+                LOG.warning("Can't load glyph {}: {}".format(png, err))
+                continue
+            atlas[char] = (columns + [0] * width)[:width]
+        return atlas
+
+    def _get_frame(self, timestr, x):
+        key = (timestr, x)
+        if key in self._frames:
+            self._frames.move_to_end(key)
+            return self._frames[key]
+
+        columns = []
+        for char in timestr:
+            columns.extend(self.atlas.get(char, []))
+        frame = [
+            (x + start, encode_columns(columns[start : start + TILE_WIDTH]))
+            for start in range(0, len(columns), TILE_WIDTH)
+        ]
+        self._frames[key] = frame
+        if len(self._frames) > self.cache_size:
+            self._frames.popitem(last=False)
+        return frame
+
+    def _draw_glyphs(self, timestr, x):
+        for char in timestr:
+            png, width = GLYPHS.get(char, (char + ".png", 4))
+            png_file = join(self.anim_dir, png)
+            self.enclosure.mouth_display_png(png_file, x=x, y=GLYPH_ROW, refresh=False)
+            x += width
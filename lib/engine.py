@@ -0,0 +1,373 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Alarm scheduling independent of the Mycroft Skill."""
+
+from mycroft.util.time import now_local, to_utc
+
+from .alarm import AlarmStore
+from .parse import ReferenceTime, fuzzy_match
+from .recur import create_recurring_rule
+
+
+class AlarmNotifier:
+    """Receives the changes of an AlarmEngine that need acting on.
+
+    The default implementation ignores them, subclasses override what they
+    need. Apart from alarms_changed(), notifications are only sent when the
+    value changes.
+    """
+
+    def next_alarm_changed(self, alarm):
+        """Called when the next alarm to expire changes.
+
+        Arguments:
+            alarm (Alarm): the next alarm, None if there are no alarms left
+        """
+
+    def active_changed(self, active):
+        """Called when there start or stop being any alarms.
+
+        Arguments:
+            active (bool): True if there are alarms
+        """
+
+    def alarms_changed(self, alarms):
+        """Called after the alarms have been changed and persisted.
+
+        Arguments:
+            alarms (List): sorted list of all Alarms, not to be modified
+        """
+
+
+class AlarmMatch:
+    """Alarms matching an utterance, see AlarmEngine.match().
+
+    Attributes:
+        alarm_ids (List): ids of the matching alarms ordered by time, all
+                          candidates if nothing in the utterance narrowed
+                          them down
+        alarms (List): the matching alarms, in the same order
+        candidate_count (int): number of alarms that were matched against
+        remainder (str): utterance left after removing the time
+        when (datetime): time given in the utterance, None if there is none
+        recur (set): day index strings of the recurrence, None if there is none
+        number (int): ordinal given in the utterance, None if there is none
+        time_matched (bool): True if an alarm has the given time
+        recurrence_matched (bool): True if an alarm has the given recurrence
+    """
+
+    def __init__(
+        self,
+        alarm_ids,
+        alarms,
+        candidate_count,
+        remainder,
+        when=None,
+        recur=None,
+        number=None,
+        time_matched=False,
+        recurrence_matched=False,
+    ):
+        self.alarm_ids = alarm_ids
+        self.alarms = alarms
+        self.candidate_count = candidate_count
+        self.remainder = remainder
+        self.when = when
+        self.recur = recur
+        self.number = number
+        self.time_matched = time_matched
+        self.recurrence_matched = recurrence_matched
+
+
+class AlarmEngine:
+    """The alarms of one device, with no dependency on the Skill.
+
+    The engine owns an AlarmStore and decides when alarms are created,
+    matched, snoozed, rescheduled and removed. Everything it needs from the
+    outside is passed in:
+
+    - the clock, so alarms can be evaluated at any point in time,
+    - the storage the changes are persisted to, e.g. an AlarmJournal, or
+      None to keep the alarms in memory only,
+    - a notifier told when the next alarm changes, so the caller can arm a
+      timer for it.
+
+    When that timer fires the caller rings the alarm with ring(). The alarm
+    keeps ringing until it is stopped, snoozed or deleted, so checking for
+    an expired alarm doesn't need the clock.
+
+    Engines don't share any state, one process can hold an engine for each
+    of any number of devices.
+
+    Arguments:
+        storage (AlarmJournal, optional): storage of the alarms
+        clock (Callable): returns the current time as an aware datetime in
+                          the timezone to repeat alarms in
+        notifier (AlarmNotifier, optional): receiver of the changes
+        alarms (List, optional): alarms to start with if the storage holds
+                                 none yet, e.g. migrated from elsewhere
+    """
+
+    def __init__(self, storage=None, clock=now_local, notifier=None, alarms=None):
+        self.storage = storage
+        self.clock = clock
+        self.notifier = notifier or AlarmNotifier()
+        self.reference_time = ReferenceTime(clock)
+        self.armed_timestamp = None  # time of the alarm last notified
+        self.active = None  # last active state notified
+        self.ringing = None  # alarm going off, see ring()
+
+        if storage is not None and storage.exists():
+            alarms = storage.load()
+        else:
+            alarms = list(alarms or [])
+            if storage is not None:
+                storage.compact(alarms)
+        self.alarms = AlarmStore(alarms, storage)
+
+    def __len__(self):
+        return len(self.alarms)
+
+    def now(self):
+        """Get the current time of the engine's clock."""
+        return self.clock()
+
+    def today(self):
+        """Get midnight at the start of the current day."""
+        return self.reference_time.today()
+
+    def create(self, when, name="", repeat=None):
+        """Add an alarm.
+
+        Arguments:
+            when (datetime): time of the alarm, seconds are ignored
+            name (str, optional): name of the alarm
+            repeat (set, optional): day index strings to repeat the alarm on
+        Returns:
+            Alarm: the new alarm, None if the same alarm already exists
+        """
+        requested_time = when.replace(second=0, microsecond=0)
+        if repeat:
+            rule = create_recurring_rule(requested_time, repeat, self.clock())
+            alarm = {
+                "timestamp": rule["timestamp"],
+                "repeat_rule": rule["repeat_rule"],
+                "name": name or "",
+            }
+        else:
+            alarm = {
+                "timestamp": to_utc(requested_time).timestamp(),
+                "repeat_rule": "",
+                "name": name or "",
+            }
+
+        if alarm in self.alarms:
+            return None
+        self.alarms.add(alarm)
+        self.update()
+        return alarm
+
+    def match(self, parsed, alarm_ids=None):
+        """Find the alarms an utterance refers to.
+
+        The time, recurrence and name in the utterance each narrow down the
+        alarms. Any of them that matches no alarm at all is ignored.
+
+        Arguments:
+            parsed (ParsedUtterance): the utterance
+            alarm_ids (List, optional): ids of the alarms to match against,
+                                        ordered by time. Defaults to all.
+        Returns:
+            AlarmMatch: the matching alarms, None if there are no candidates
+        """
+        if alarm_ids is None:
+            alarm_ids = self.alarms.ids()
+        else:
+            # Alarms may have been removed since the ids were handed out
+            alarm_ids = [i for i in alarm_ids if self.alarms.get(i) is not None]
+        if not alarm_ids:
+            return None
+
+        utt = parsed.utterance
+        when = parsed.when
+        is_midnight = parsed.is_midnight
+        # A bare date is read as midnight, it doesn't refer to a time
+        if when == self.today() and not is_midnight:
+            when = None
+
+        candidate_ids = set(alarm_ids)
+        time_matches = None
+        if when:
+            time_alarm = to_utc(when).timestamp()
+            if is_midnight:
+                time_alarm = time_alarm + 86400.0
+            time_matches = self.alarms.ids_between(time_alarm - 60, time_alarm + 60)
+            time_matches &= candidate_ids
+
+        recur = None
+        recurrence_matches = None
+        for word in parsed.recurrence_dict:
+            if fuzzy_match(word, utt.lower(), parsed.threshold):
+                recur = parsed.recurrence
+                alarm_recur = create_recurring_rule(when, recur, self.clock())
+                recurrence_matches = self.alarms.ids_with_rule(
+                    alarm_recur["repeat_rule"]
+                )
+                recurrence_matches &= candidate_ids
+                break
+
+        remainder = parsed.remainder or utt
+        matched_names = self.alarms.names.match(remainder, parsed.threshold)
+        name_matches = self.alarms.ids_with_names(matched_names) & candidate_ids
+
+        # Find the intersection of the candidates and all the matched alarms
+        candidate_count = len(alarm_ids)
+        if time_matches:
+            candidate_ids &= time_matches
+        if recur and recurrence_matches:
+            candidate_ids &= recurrence_matches
+        if name_matches:
+            candidate_ids &= name_matches
+        if len(candidate_ids) != candidate_count:
+            alarm_ids = self.alarms.sort_ids(candidate_ids)
+
+        return AlarmMatch(
+            alarm_ids,
+            [self.alarms.get(alarm_id) for alarm_id in alarm_ids],
+            candidate_count,
+            remainder,
+            when=when,
+            recur=recur,
+            number=parsed.number,
+            time_matched=bool(time_matches),
+            recurrence_matched=bool(recurrence_matches),
+        )
+
+    def next_alarm(self):
+        """Get the next alarm to expire, None if there are no alarms."""
+        return self.alarms.peek()
+
+    def ring(self):
+        """Set the next alarm going off, once its timer has fired.
+
+        Returns:
+            Alarm: the ringing alarm, None if there are no alarms
+        """
+        self.ringing = self.alarms.peek()
+        return self.ringing
+
+    def has_expired(self):
+        """Check if an alarm is going off, without reading the clock."""
+        return self.ringing is not None
+
+    def snooze(self, minutes):
+        """Snooze the ringing alarm.
+
+        Arguments:
+            minutes (int): minutes to snooze for
+        Returns:
+            Alarm: the snoozed alarm, None if no alarm is ringing
+        """
+        alarm = self.ringing
+        if alarm is None:
+            return None
+        self.ringing = None
+        snoozed_alarm = {
+            "timestamp": alarm["timestamp"] + minutes * 60,
+            "repeat_rule": alarm["repeat_rule"],
+            "name": alarm["name"],
+            # Snoozing again keeps the original time
+            "snooze": alarm.get("snooze", alarm["timestamp"]),
+        }
+        self.alarms.snooze(alarm, snoozed_alarm)
+        self.update()
+        return snoozed_alarm
+
+    def stop_expired(self):
+        """End the ringing alarm, rescheduling it if it repeats.
+
+        Returns:
+            bool: False if no alarm is ringing
+        """
+        if self.ringing is None:
+            return False
+        self.ringing = None
+        # The timer for the expired alarm has gone off, arm the next one
+        self.armed_timestamp = None
+        self.alarms.curate(0, self.clock())
+        self.update()
+        return True
+
+    def delete(self, alarms):
+        """Remove alarms.
+
+        Arguments:
+            alarms (List): alarms to remove
+        """
+        for alarm in alarms:
+            self.alarms.remove(alarm)
+            if alarm == self.ringing:
+                self.ringing = None
+        self.update()
+
+    def delete_all(self):
+        """Remove all alarms.
+
+        Returns:
+            bool: False if there were no alarms
+        """
+        if not self.alarms:
+            return False
+        self.ringing = None
+        self.alarms.clear()
+        self.update()
+        return True
+
+    def curate(self, curation_limit=1):
+        """Reschedule or remove the alarms that have expired.
+
+        The ringing alarm is left until it is stopped, snoozed or deleted.
+
+        Arguments:
+            curation_limit (int, optional): Seconds past expired at which to
+                                            remove the alarm
+        """
+        self.alarms.curate(curation_limit, self.clock(), keep=self.ringing)
+
+    def update(self):
+        """Clean up expired alarms, persist and notify the changes.
+
+        Besides alarms_changed(), the notifier is only called when the time
+        of the next alarm changes or there start or stop being any alarms.
+        """
+        self.curate()
+        self.alarms.sync()
+        self.notifier.alarms_changed(self.alarms.sorted())
+
+        next_alarm = self.alarms.peek()
+        next_timestamp = next_alarm["timestamp"] if next_alarm else None
+        if next_timestamp != self.armed_timestamp:
+            self.armed_timestamp = next_timestamp
+            self.notifier.next_alarm_changed(next_alarm)
+
+        active = bool(self.alarms)
+        if active != self.active:
+            self.active = active
+            self.notifier.active_changed(active)
+
+    def close(self):
+        """Persist all changes and close the storage."""
+        if self.storage is not None:
+            self.alarms.sync()
+            self.storage.close()
@@ -0,0 +1,102 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Animation playback for the Mycroft Alarm Skill."""
+
+import time
+from threading import Event, Thread, current_thread
+
+from mycroft.util import LOG
+
+
+class FrameScheduler:
+    """Plays the frames of an animation on a background thread.
+
+    A frame is a function drawing something on the display along with the
+    time it is due, in seconds from the start of the animation. Frames are
+    timed from the start rather than from the previous frame so delays
+    don't add up. How late frames are drawn is recorded for stats().
+
+    Arguments:
+        clock (Callable): monotonic clock returning seconds
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.frame_count = 0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+        self._cancelled = Event()
+        self._thread = None
+
+    @property
+    def is_running(self):
+        """bool: True while an animation is playing"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def play(self, frames, on_done=None):
+        """Start playing an animation, replacing the current one.
+
+        Arguments:
+            frames (List): (offset in seconds, function) pairs, sorted by
+                           offset
+            on_done (Callable, optional): called from the animation thread
+                                          once it ends or is cancelled
+        """
+        self.cancel()
+        self._cancelled = Event()
+        self._thread = Thread(
+            target=self._run,
+            args=(list(frames), on_done, self._cancelled),
+            daemon=True,
+        )
+        self._thread.start()
+
+    def cancel(self):
+        """Stop the current animation, skipping its remaining frames."""
+        self._cancelled.set()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not current_thread():
+            thread.join()
+
+    def stats(self):
+        """Get the timing statistics of the frames drawn so far.
+
+        Returns:
+            Dict: {"frames": int, "mean_lateness_ms": float,
+                   "max_lateness_ms": float}
+        """
+        mean = self.total_lateness / self.frame_count if self.frame_count else 0.0
+        return {
+            "frames": self.frame_count,
+            "mean_lateness_ms": mean * 1000,
+            "max_lateness_ms": self.max_lateness * 1000,
+        }
+
+    def _run(self, frames, on_done, cancelled):
+        start = self.clock()
+        try:
+            for offset, draw in frames:
+                due = start + offset
+                if cancelled.wait(max(0.0, due - self.clock())):
+                    break
+                lateness = max(0.0, self.clock() - due)
+                self.frame_count += 1
+                self.total_lateness += lateness
+                self.max_lateness = max(self.max_lateness, lateness)
+                draw()
+        except Exception:
+            LOG.exception("Animation frame failed")
+        finally:
+            if on_done:
+                on_done()
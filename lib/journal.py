@@ -0,0 +1,219 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Journaled persistence of the alarm list for the Mycroft Alarm Skill."""
+
+import json
+import os
+from os.path import exists, join
+
+from mycroft.util import LOG
+
+from .alarm import AlarmStore
+
+
+class AlarmJournal:
+    """Append-only log of changes to the alarm list.
+
+    Every change is appended as one JSON line to the journal instead of
+    rewriting the whole list. The journal is periodically compacted into a
+    snapshot of the full list. Both files carry a generation number so a
+    journal left behind by an interrupted compaction is never replayed on
+    top of the newer snapshot.
+
+    Record format:
+        {"op": "create" | "delete", "alarm": Alarm}
+        {"op": "snooze" | "reschedule", "alarm": Alarm, "new_alarm": Alarm}
+        {"op": "clear"}
+
+    Arguments:
+        path (str): directory to store the snapshot and journal in
+        sync_every (int): maximum number of records written between fsyncs
+        compact_every (int): number of records after which the journal is
+                             compacted, in addition to one per stored alarm
+    """
+
+    SNAPSHOT_FILE = "alarms.json"
+    JOURNAL_FILE = "alarms.journal"
+
+    def __init__(self, path, sync_every=16, compact_every=256):
+        self.snapshot_file = join(path, self.SNAPSHOT_FILE)
+        self.journal_file = join(path, self.JOURNAL_FILE)
+        self.sync_every = sync_every
+        self.compact_every = compact_every
+        self.generation = 0
+        self.record_count = 0
+        self._file = None
+        self._unsynced = 0
+
+    def exists(self):
+        """Check if there is anything to load."""
+        return exists(self.snapshot_file) or exists(self.journal_file)
+
+    def load(self):
+        """Load the snapshot and replay the journal on top of it.
+
+        The result is written back as a new snapshot with an empty journal.
+        A partially written record at the end of the journal, e.g. after a
+        power loss, is ignored along with anything following it.
+
+        Returns:
+            List: sorted list of Alarms
+        """
+        alarms = []
+        self.generation = 0
+        if exists(self.snapshot_file):
+            with open(self.snapshot_file) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+            self.generation = snapshot["generation"]
+            alarms = snapshot["alarms"]
+
+        store = AlarmStore(alarms)
+        for record in self._read_records():
+            _apply_record(store, record)
+
+        # Start over from a fresh snapshot of the replayed list
+        alarms = store.serialize()
+        self.compact(alarms)
+        return alarms
+
+    def append(self, op, alarm=None, new_alarm=None):
+        """Append a change to the journal.
+
+        The record is handed to the OS right away but only made durable by
+        sync(), or once sync_every records are waiting.
+
+        Arguments:
+            op (str): "create", "delete", "snooze", "reschedule" or "clear"
+            alarm (Alarm, optional): alarm that was changed
+            new_alarm (Alarm, optional): replacement for snooze/reschedule
+        """
+        record = {"op": op}
+        if alarm is not None:
+            record["alarm"] = alarm
+        if new_alarm is not None:
+            record["new_alarm"] = new_alarm
+
+        journal = self._open()
+        journal.write(json.dumps(record) + "\n")
+        journal.flush()
+        self.record_count += 1
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self.sync()
+
+    def sync(self):
+        """Flush any pending records to disk."""
+        if self._file and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def should_compact(self, alarm_count):
+        """Check if the journal has outgrown the list it describes.
+
+        Arguments:
+            alarm_count (int): number of alarms currently stored
+        """
+        return self.record_count > alarm_count + self.compact_every
+
+    def compact(self, alarms):
+        """Replace the snapshot with the given list and empty the journal.
+
+        Arguments:
+            alarms (List): complete list of Alarms
+        """
+        self.close()
+        generation = self.generation + 1
+        _write_atomic(
+            self.snapshot_file,
+            json.dumps({"generation": generation, "alarms": alarms}),
+        )
+        self.generation = generation
+        _write_atomic(self.journal_file, self._header())
+        self.record_count = 0
+
+    def close(self):
+        """Sync and close the journal file."""
+        if self._file:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def _header(self):
+        return json.dumps({"generation": self.generation}) + "\n"
+
+    def _open(self):
+        if self._file is None:
+            if not exists(self.journal_file):
+                _write_atomic(self.journal_file, self._header())
+            self._file = open(self.journal_file, "a")
+        return self._file
+
+    def _read_records(self):
+        """Read the records of the journal belonging to the current snapshot."""
+        if not exists(self.journal_file):
+            return
+        with open(self.journal_file) as journal:
+            for line_number, line in enumerate(journal):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    LOG.warning(
+                        "Ignoring incomplete alarm journal record {}".format(
+                            line_number
+                        )
+                    )
+                    return
+                if line_number == 0:
+                    if record.get("generation") != self.generation:
+                        LOG.info("Ignoring alarm journal of an older snapshot")
+                        return
+                    continue
+                yield record
+
+
+def _apply_record(store, record):
+    """Replay a single journal record on an AlarmStore."""
+    op = record["op"]
+    if op == "create":
+        store.add(record["alarm"])
+    elif op == "delete":
+        store.remove(record["alarm"])
+    elif op in ("snooze", "reschedule"):
+        store.remove(record["alarm"])
+        store.add(record["new_alarm"])
+    elif op == "clear":
+        store.clear()
+    else:
+        LOG.warning("Unknown alarm journal record: {}".format(op))
+
+
+def _write_atomic(path, data):
+    """Write a file so it either has the old or the new content on disk."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as tmp_file:
+        tmp_file.write(data)
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+    os.replace(tmp_path, path)
+    try:
+        dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
@@ -12,9 +12,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from datetime import datetime
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
 
+from dateutil.tz import resolve_imaginary
+from mycroft.util.format import expand_options
+from mycroft.util.parse import extract_datetime, extract_number
 from mycroft.util.parse import fuzzy_match as mycroft_fuzzy_match
+from mycroft.util.time import now_local
+
+from .recur import create_day_set
 
 def fuzzy_match(word, phrase, threshold):
     """
@@ -43,6 +54,110 @@ def fuzzy_match(word, phrase, threshold):
 
     return matched
 
+class NameIndex:
+    """Index of names by their number of words and length.
+
+    Fuzzy matching every name against an utterance is slow with many
+    names. fuzzy_match() compares a name with each run of as many words of
+    the utterance, and their ratio can't reach the threshold if their
+    lengths differ too much. Only names with a length that could match one
+    of those runs are scored, and each distinct name is scored once. The
+    result is the same as scoring every name.
+    """
+
+    def __init__(self):
+        self._names = {}  # name -> number of times added
+        self._lengths = {}  # word count -> {length -> set of names}
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, name):
+        """Add a name to the index.
+
+        Arguments:
+            name (str): name to add, may be added more than once
+        """
+        if name in self._names:
+            self._names[name] += 1
+            return
+        self._names[name] = 1
+        words, length = _name_shape(name)
+        lengths = self._lengths.setdefault(words, {})
+        lengths.setdefault(length, set()).add(name)
+
+    def remove(self, name):
+        """Remove one occurrence of a name from the index.
+
+        Arguments:
+            name (str): name to remove
+        """
+        count = self._names.get(name)
+        if count is None:
+            return
+        if count > 1:
+            self._names[name] = count - 1
+            return
+        del self._names[name]
+        words, length = _name_shape(name)
+        lengths = self._lengths[words]
+        lengths[length].discard(name)
+        if not lengths[length]:
+            del lengths[length]
+            if not lengths:
+                del self._lengths[words]
+
+    def candidates(self, phrase, threshold):
+        """Get the names that could fuzzy match within a phrase.
+
+        Two strings of lengths a and b have a ratio of at most
+        2 * min(a, b) / (a + b), so a name can only reach the threshold
+        against runs of words with a length in a fixed range of its own.
+
+        Arguments:
+            phrase (str): phrase to search
+            threshold (float): minimum fuzzy matching score, see fuzzy_match()
+        Returns:
+            Set: candidate names
+        """
+        phrase_split = phrase.split(" ")
+        names = set()
+        for words, lengths in self._lengths.items():
+            if words > len(phrase_split):
+                continue
+            if threshold <= 0:
+                for same_length in lengths.values():
+                    names.update(same_length)
+                continue
+            for i in range(len(phrase_split) - words + 1):
+                run = len(" ".join(phrase_split[i : i + words]))
+                # The margin keeps float rounding from excluding a length
+                shortest = math.ceil(threshold * run / (2 - threshold) - 1e-9)
+                longest = math.floor((2 - threshold) * run / threshold + 1e-9)
+                for length in range(shortest, longest + 1):
+                    names.update(lengths.get(length, ()))
+        return names
+
+    def match(self, phrase, threshold):
+        """Get the names that fuzzy match within a phrase.
+
+        Arguments:
+            phrase (str): phrase to search
+            threshold (float): minimum fuzzy matching score, see fuzzy_match()
+        Returns:
+            Set: matching names
+        """
+        return {
+            name
+            for name in self.candidates(phrase, threshold)
+            if fuzzy_match(name, phrase, threshold)
+        }
+
+
+def _name_shape(name):
+    """Get the word count and length fuzzy_match() compares a name by."""
+    return len(name.split(" ")), len(name.lower())
+
 def utterance_has_midnight(utterance, init_time, threshold, midnight_voc=None):
     """Check the time and see if it is midnight. 
     
@@ -69,4 +184,399 @@ def utterance_has_midnight(utterance, init_time, threshold, midnight_voc=None):
             if matched:
                 return matched
 
-    return matched
\ No newline at end of file
+    return matched
+
+
+def load_regex_file(rx_file):
+    """Read and compile the patterns of a .rx file.
+
+    Arguments:
+        rx_file (Str): path to a file with one pattern per line, lines
+                       starting with '#' are comments
+    Returns:
+        List: compiled patterns in the order of the file
+    """
+    with open(rx_file) as regex_file:
+        return [
+            re.compile(line.strip())
+            for line in regex_file.readlines()
+            if line.strip() and not line.strip().startswith("#")
+        ]
+
+class RegexFileCache:
+    """Cache of compiled patterns from .rx files.
+
+    Each file is read and compiled once and only reloaded when its
+    modification time changes.
+    """
+
+    def __init__(self):
+        self._patterns = {}  # rx_file -> (mtime, patterns)
+
+    def get(self, rx_file):
+        """Get the compiled patterns of a .rx file.
+
+        Arguments:
+            rx_file (Str): path to the .rx file
+        Returns:
+            List: compiled patterns, empty if the file can't be read
+        """
+        try:
+            mtime = os.stat(rx_file).st_mtime
+        except OSError:
+            self._patterns.pop(rx_file, None)
+            return []
+        cached = self._patterns.get(rx_file)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, load_regex_file(rx_file))
+            self._patterns[rx_file] = cached
+        return cached[1]
+
+
+def load_vocab_pattern(voc_file):
+    """Compile the lines of a .voc file into one pattern.
+
+    The file is read like Mycroft's vocabulary reader does: lines are
+    lowercased and "(a|b)" options are expanded. The pattern matches the
+    same utterances as voc_match(), any of the phrases as whole words.
+
+    Arguments:
+        voc_file (Str): path to a file with one phrase per line, lines
+                        starting with '#' are comments
+    Returns:
+        Pattern: compiled pattern, None if the file has no phrases
+    """
+    phrases = []
+    with open(voc_file, encoding="utf8") as vocab_file:
+        for line in vocab_file.readlines():
+            if line.startswith("#") or not line.strip():
+                continue
+            phrases.extend(expand_options(line.lower()))
+    phrases = [re.escape(phrase) for phrase in phrases if phrase]
+    if not phrases:
+        return None
+    return re.compile(r"\b(?:" + "|".join(phrases) + r")\b")
+
+
+class VocabMatcher:
+    """Matches utterances against one vocabulary in every language.
+
+    The .voc files are read and compiled up front, so a match is a single
+    regex search with no file access.
+
+    Arguments:
+        vocab_dir (Str): directory with a folder of .voc files per language
+        name (Str): name of the vocabulary, e.g. "StopBeeping"
+    """
+
+    def __init__(self, vocab_dir, name):
+        self._patterns = {}  # lang -> compiled pattern
+        try:
+            langs = os.listdir(vocab_dir)
+        except OSError:
+            langs = []
+        for lang in langs:
+            voc_file = os.path.join(vocab_dir, lang, name + ".voc")
+            if os.path.isfile(voc_file):
+                pattern = load_vocab_pattern(voc_file)
+                if pattern is not None:
+                    self._patterns[lang.lower()] = pattern
+
+    def __contains__(self, lang):
+        return lang.lower() in self._patterns
+
+    def match(self, utterance, lang):
+        """Check if an utterance contains the vocabulary.
+
+        Arguments:
+            utterance (Str): utterance from user
+            lang (Str): language of the utterance
+        Returns:
+            bool: False if there is no vocabulary for the language
+        """
+        pattern = self._patterns.get(lang.lower())
+        return bool(utterance and pattern and pattern.search(utterance))
+
+
+class ParsedUtterance:
+    """An utterance along with everything the skill extracts from it.
+
+    Each field is only extracted on first access and then kept, so the
+    intent handlers and the alarm matcher can share one instance instead of
+    parsing the same utterance repeatedly.
+
+    Arguments:
+        utterance (Str): utterance from user
+        lang (Str): language of the utterance, None for the default
+        threshold (Float): fuzzy matching threshold
+        midnight_voc (List): translated list of vocab equivalent to 'midnight'
+        recurrence_dict (Dict): map of strings to recurrence patterns
+        name_extractor (Callable): function returning the alarm name found in
+                                   the utterance with the datetime removed
+        cache (ExtractionCache): cache to extract the datetime and number
+                                 through, None to always run the parsers
+        timer (Callable): called with the name of each field extracted and
+                          the seconds it took, excluding the fields it
+                          depends on
+    """
+
+    def __init__(
+        self,
+        utterance,
+        lang=None,
+        threshold=0.7,
+        midnight_voc=None,
+        recurrence_dict=None,
+        name_extractor=None,
+        cache=None,
+        timer=None,
+    ):
+        self.utterance = utterance
+        self.lang = lang
+        self.threshold = threshold
+        self.midnight_voc = midnight_voc
+        self.recurrence_dict = recurrence_dict or {}
+        self.name_extractor = name_extractor
+        self.cache = cache
+        self.timer = timer
+        self._fields = {}
+        self._nested = 0.0  # seconds spent extracting the fields depended on
+
+    def _get(self, field, extract):
+        if field not in self._fields:
+            if self.timer is None:
+                self._fields[field] = extract()
+            else:
+                outer, self._nested = self._nested, 0.0
+                start = time.perf_counter()
+                self._fields[field] = extract()
+                elapsed = time.perf_counter() - start
+                self.timer(field, elapsed - self._nested)
+                self._nested = outer + elapsed
+        return self._fields[field]
+
+    def _extract_datetime(self):
+        extract = self.cache.extract_datetime if self.cache else extract_datetime
+        extracted = extract(self.utterance, lang=self.lang)
+        return extracted or (None, self.utterance)
+
+    @property
+    def when(self):
+        """datetime: date and time in the utterance, None if there is none"""
+        return self._get("datetime", self._extract_datetime)[0]
+
+    @property
+    def remainder(self):
+        """Str: the utterance with the date and time removed"""
+        return self._get("datetime", self._extract_datetime)[1]
+
+    def _extract_number(self):
+        extract = self.cache.extract_number if self.cache else extract_number
+        utterance = self.remainder or self.utterance
+        number = extract(utterance, ordinals=True, lang=self.lang)
+        if number and number > 0:
+            return int(number)
+        return None
+
+    @property
+    def number(self):
+        """int: positive ordinal or cardinal number left after the datetime"""
+        return self._get("number", self._extract_number)
+
+    @property
+    def name(self):
+        """Str: alarm name left after the datetime, empty if there is none"""
+
+        def extract():
+            if self.name_extractor is None:
+                return ""
+            return self.name_extractor(self.remainder)
+
+        return self._get("name", extract)
+
+    @property
+    def recurrence(self):
+        """Set: recurrence days mentioned in the utterance"""
+        return self._get(
+            "recurrence",
+            lambda: create_day_set(self.utterance, self.recurrence_dict),
+        )
+
+    @property
+    def is_midnight(self):
+        """Bool: True if the user explicitly asked for midnight"""
+        return self._get(
+            "is_midnight",
+            lambda: utterance_has_midnight(
+                self.utterance, self.when, self.threshold, self.midnight_voc
+            ),
+        )
+
+
+class ReferenceTime:
+    """Provider of the reference datetime for "today".
+
+    Utterances without a time are extracted as midnight of their day, so
+    comparing against today's midnight tells if the user gave a time at
+    all. The value is computed from the clock in the configured timezone
+    and kept until the next local midnight or until the timezone changes.
+
+    Arguments:
+        clock (Callable): function returning the current local datetime
+    """
+
+    def __init__(self, clock=now_local):
+        self.clock = clock
+        self._today = None
+        self._expires = None  # timestamp of the next local midnight
+
+    def today(self):
+        """Get the start of the current day.
+
+        Returns:
+            datetime: today's midnight in the configured timezone
+        """
+        now = self.clock()
+        if (
+            self._today is None
+            or now.tzinfo != self._today.tzinfo
+            or now.timestamp() >= self._expires
+        ):
+            self._today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            tomorrow = resolve_imaginary(self._today + timedelta(days=1))
+            self._expires = tomorrow.timestamp()
+        return self._today
+
+
+class ExtractionCache:
+    """Bounded LRU cache of datetime and number extraction results.
+
+    Users often repeat or rephrase a request, e.g. while being asked again
+    by get_response, so the same text reaches the parsers several times.
+    Utterances are normalized to lowercase with single spaces before being
+    parsed and used as key.
+
+    Datetimes are extracted relative to the current time. On a miss the
+    utterance is extracted against the current time and against a second
+    later to tell how the result depends on it:
+
+    - absolute results like "at 7 am" don't move, they are reused as they
+      are for the rest of the minute,
+    - relative results like "in 5 minutes" move along, they are kept as an
+      offset that is added to the current time for the rest of the day,
+    - anything else, e.g. a result changing at midnight, isn't kept.
+
+    Arguments:
+        size (int): maximum number of results to keep
+        clock (Callable): function returning the current local datetime
+    """
+
+    def __init__(self, size=64, clock=now_local):
+        self.size = size
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+
+    def __len__(self):
+        return len(self._results)
+
+    def extract_datetime(self, utterance, lang=None):
+        """Cached version of extract_datetime().
+
+        Arguments:
+            utterance (Str): utterance from user
+            lang (Str): language of the utterance, None for the default
+        Returns:
+            Tuple: (datetime, remaining utterance) or None if no datetime found
+        """
+        utterance = normalize_utterance(utterance)
+        anchor = self.clock().replace(microsecond=0)
+        minute = anchor.replace(second=0)
+        key = ("datetime", utterance, lang)
+        cached = self._results.get(key)
+        if cached is not None:
+            kind, valid_for, result = cached
+            if kind == "absolute" and valid_for == minute:
+                return self._hit(key)[2]
+            if kind == "relative" and valid_for == anchor.date():
+                offset, remainder = result
+                self._hit(key)
+                return (anchor + offset, remainder)
+
+        self.misses += 1
+        extracted = extract_datetime(utterance, anchorDate=anchor, lang=lang)
+        if not extracted:
+            self._store(key, ("absolute", minute, None))
+            return None
+        extracted = tuple(extracted)
+
+        later = anchor + timedelta(seconds=1)
+        moved = extract_datetime(utterance, anchorDate=later, lang=lang)
+        if moved and moved[1] == extracted[1]:
+            if moved[0] == extracted[0]:
+                self._store(key, ("absolute", minute, extracted))
+            elif moved[0] - extracted[0] == later - anchor:
+                offset = extracted[0] - anchor
+                self._store(key, ("relative", anchor.date(), (offset, extracted[1])))
+        return extracted
+
+    def extract_number(self, utterance, ordinals=False, lang=None):
+        """Cached version of extract_number().
+
+        Arguments:
+            utterance (Str): utterance from user
+            ordinals (bool): extract ordinal numbers like "second" as well
+            lang (Str): language of the utterance, None for the default
+        Returns:
+            int or float: the number found, False if there is none
+        """
+        utterance = normalize_utterance(utterance)
+        key = ("number", utterance, lang, ordinals)
+        if key in self._results:
+            return self._hit(key)
+
+        self.misses += 1
+        number = extract_number(utterance, ordinals=ordinals, lang=lang)
+        self._store(key, number)
+        return number
+
+    def info(self):
+        """Get the usage statistics of the cache.
+
+        Returns:
+            Dict: {"hits": int, "misses": int, "size": int, "maxsize": int}
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._results),
+            "maxsize": self.size,
+        }
+
+    def clear(self):
+        """Drop all cached results and reset the statistics."""
+        self._results.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _hit(self, key):
+        self.hits += 1
+        self._results.move_to_end(key)
+        return self._results[key]
+
+    def _store(self, key, result):
+        self._results[key] = result
+        if len(self._results) > self.size:
+            self._results.popitem(last=False)
+
+
+def normalize_utterance(utterance):
+    """Lowercase an utterance and collapse its whitespace.
+
+    Arguments:
+        utterance (Str): utterance from user
+    Returns:
+        Str: normalized utterance
+    """
+    return " ".join(utterance.lower().split())
@@ -0,0 +1,264 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Alarm sound playback for the Mycroft Alarm Skill."""
+
+import mmap
+import subprocess
+import wave
+from queue import Queue
+from threading import Lock, Thread
+
+from mycroft.util import LOG, play_mp3, play_wav
+
+try:
+    import alsaaudio
+except ImportError:
+    alsaaudio = None
+
+# Frames written to the audio device at a time
+PERIOD_SIZE = 1024
+
+
+class AlarmPlayer:
+    """Long-lived player process for the alarm sounds.
+
+    The player is started once in remote control mode and kept running, so
+    the audio device stays open and playing a sound only writes a command
+    to its stdin instead of starting a new decoder. If the player can't be
+    started, every sound falls back to play_mp3().
+
+    WAV files are played without any decoder: the file is memory-mapped and
+    its frames are written to an ALSA playback device that is kept open
+    between sounds. Without ALSA they are played with play_wav().
+
+    Sounds are played by a worker thread, so play() never waits for the
+    audio device.
+
+    Arguments:
+        command (List): command line of a player reading mpg123 style
+                        remote commands (LOAD, STOP, VOLUME, QUIT) on stdin
+    """
+
+    COMMAND = ["mpg123", "--remote"]
+
+    def __init__(self, command=None):
+        self.command = command or self.COMMAND
+        self.volume = 100
+        self._process = None
+        self._available = True
+        self._fallback_process = None
+        self._pcm = None
+        self._pcm_format = None
+        self._lock = Lock()
+        self._queue = Queue()
+        # Incremented by stop(), sounds queued before are skipped
+        self._generation = 0
+        self._thread = None
+
+    def play(self, sound_file, on_start=None):
+        """Start playing a sound once.
+
+        Arguments:
+            sound_file (str): path of the mp3 or WAV file to play
+            on_start (Callable, optional): called from the worker thread once
+                                           the sound is handed to the audio
+                                           device or player
+        """
+        if self._thread is None:
+            self._thread = Thread(target=self._work, daemon=True)
+            self._thread.start()
+        self._queue.put((sound_file, self._generation, on_start))
+
+    def stop(self):
+        """Stop the sound currently playing, if any."""
+        self._generation += 1
+        with self._lock:
+            if self._process:
+                self._send("STOP")
+            if self._pcm and hasattr(self._pcm, "drop"):
+                self._pcm.drop()
+            self._kill_fallback()
+
+    def set_volume(self, percent):
+        """Set the playback volume of the player.
+
+        Arguments:
+            percent (int): volume from 0 to 100
+        """
+        self.volume = percent
+        with self._lock:
+            # Otherwise the volume is set once the player is started
+            if self._process and self._process.poll() is None:
+                self._send("VOLUME {}".format(percent))
+
+    def close(self):
+        """Stop playback and end the player process."""
+        self.stop()
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            if self._process:
+                self._send("QUIT")
+                try:
+                    self._process.stdin.close()
+                    self._process.wait(timeout=1)
+                except Exception:
+                    self._process.kill()
+                self._process = None
+            if self._pcm:
+                self._pcm.close()
+                self._pcm = None
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            sound_file, generation, on_start = item
+            if generation != self._generation:
+                continue
+            try:
+                if sound_file.endswith(".wav"):
+                    self._play_pcm(sound_file, generation, on_start)
+                else:
+                    with self._lock:
+                        if generation == self._generation:
+                            self._load(sound_file)
+                            _started(on_start)
+            except Exception:
+                LOG.exception("Failed to play {}".format(sound_file))
+
+    def _load(self, sound_file):
+        if self._start() and self._send("LOAD {}".format(sound_file)):
+            return
+        self._kill_fallback()
+        try:
+            self._fallback_process = play_mp3(sound_file)
+        except Exception:
+            self._fallback_process = None
+
+    def _play_pcm(self, wav_file, generation, on_start=None):
+        """Write the frames of a WAV file to the audio device until done."""
+        with open(wav_file, "rb") as wav_fd:
+            with mmap.mmap(wav_fd.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                wav = wave.open(data)
+                with self._lock:
+                    if generation != self._generation:
+                        return
+                    pcm = self._open_pcm(wav)
+                    if pcm is None:
+                        self._kill_fallback()
+                        try:
+                            self._fallback_process = play_wav(wav_file)
+                        except Exception:
+                            self._fallback_process = None
+                        _started(on_start)
+                        return
+                _started(on_start)
+                while generation == self._generation:
+                    frames = wav.readframes(PERIOD_SIZE)
+                    if not frames:
+                        break
+                    with self._lock:
+                        if generation != self._generation:
+                            break
+                        pcm.write(frames)
+
+    def _open_pcm(self, wav):
+        """Get the ALSA device set up for the format of a WAV file.
+
+        Returns:
+            alsaaudio.PCM: the playback device, None if ALSA isn't available
+        """
+        if alsaaudio is None:
+            return None
+        pcm_format = (wav.getnchannels(), wav.getframerate(), wav.getsampwidth())
+        if self._pcm is None or self._pcm_format != pcm_format:
+            if self._pcm:
+                self._pcm.close()
+                self._pcm = None
+            sample_formats = {
+                1: alsaaudio.PCM_FORMAT_U8,
+                2: alsaaudio.PCM_FORMAT_S16_LE,
+                4: alsaaudio.PCM_FORMAT_S32_LE,
+            }
+            try:
+                pcm = alsaaudio.PCM(alsaaudio.PCM_PLAYBACK)
+                pcm.setchannels(pcm_format[0])
+                pcm.setrate(pcm_format[1])
+                pcm.setformat(sample_formats[pcm_format[2]])
+                pcm.setperiodsize(PERIOD_SIZE)
+            except (alsaaudio.ALSAAudioError, KeyError) as err:
+                LOG.warning("Can't open audio device, using play_wav: {}".format(err))
+                return None
+            self._pcm = pcm
+            self._pcm_format = pcm_format
+        return self._pcm
+
+    def _start(self):
+        """Make sure the player process is running.
+
+        Returns:
+            bool: False if the player is not available
+        """
+        if self._process and self._process.poll() is None:
+            return True
+        self._process = None
+        if not self._available:
+            return False
+        try:
+            self._process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                universal_newlines=True,
+            )
+        except OSError as err:
+            LOG.warning("Can't start alarm player, using play_mp3: {}".format(err))
+            self._available = False
+            return False
+        if self.volume != 100:
+            self._send("VOLUME {}".format(self.volume))
+        return True
+
+    def _send(self, command):
+        try:
+            self._process.stdin.write(command + "\n")
+            self._process.stdin.flush()
+            return True
+        except (OSError, ValueError):
+            # The player died, it is restarted on the next command
+            self._process = None
+            return False
+
+    def _kill_fallback(self):
+        if self._fallback_process:
+            try:
+                if self._fallback_process.poll() is None:  # still running
+                    self._fallback_process.kill()
+            except Exception:
+                pass
+            self._fallback_process = None
+
+
+def _started(on_start):
+    """Call an on_start callback, logging rather than raising errors."""
+    if on_start:
+        try:
+            on_start()
+        except Exception:
+            LOG.exception("Error in sound start callback")
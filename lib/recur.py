@@ -13,11 +13,22 @@
 # limitations under the License.
 """Recurrence functions for the Mycroft Alarm Skill."""
 
-from datetime import timedelta
+from datetime import datetime, timedelta
+from functools import lru_cache
 from dateutil.rrule import rrulestr
+from dateutil.tz import resolve_imaginary
 
 from mycroft.util.format import join_list
-from mycroft.util.time import now_utc, to_utc
+from mycroft.util.time import now_local, to_utc
+
+# iCal abbreviations of the day indices used in recurrence sets, 0 = Sunday
+DAY_ABBREVIATIONS = ["SU", "MO", "TU", "WE", "TH", "FR", "SA"]
+# Prefix of every rule created by create_recurring_rule()
+WEEKLY_RULE_PREFIX = "FREQ=WEEKLY;INTERVAL=1;BYDAY="
+
+# Number of parsed iCal rules to keep. Alarms tend to share a handful of
+# rules such as weekdays, weekends or every day.
+RULE_CACHE_SIZE = 32
 
 
 def create_day_set(phrase, recurrence_dict):
@@ -38,12 +49,14 @@ def create_day_set(phrase, recurrence_dict):
     return recur
 
 
-def create_recurring_rule(when, recur):
+def create_recurring_rule(when, recur, now=None):
     """Create a recurring iCal rrule.
 
     Arguments:
         when (datetime): datetime object of alarm
         recur (set): day index strings, e.g. {"3", "4"}
+        now (datetime, optional): current time in the timezone to repeat in,
+                                  defaults to now_local()
     Returns:
         {
             "timestamp" (datetime.timestamp): next occurence of alarm,
@@ -52,23 +65,22 @@ def create_recurring_rule(when, recur):
     # TODO: Support more complex alarms, e.g. first monday, monthly, etc
     """
     rule = ""
-    abbr = ["SU", "MO", "TU", "WE", "TH", "FR", "SA"]
     days = []
     for day in recur:
-        days.append(abbr[int(day)])
+        days.append(DAY_ABBREVIATIONS[int(day)])
     if days:
-        rule = "FREQ=WEEKLY;INTERVAL=1;BYDAY=" + ",".join(days)
+        rule = WEEKLY_RULE_PREFIX + ",".join(days)
 
     if when and rule:
-        when = to_utc(when)
+        if now is None:
+            now = now_local()
+        when = when.astimezone(now.tzinfo)
 
         # Create a repeating rule that starts in the past, enough days
         # back that it encompasses any repeat.
         past = when + timedelta(days=-45)
-        repeat_rule = rrulestr("RRULE:" + rule, dtstart=past)
-        now = to_utc(now_utc())
         # Get the first repeat that happens after right now
-        next_occurence = repeat_rule.after(now)
+        next_occurence = get_next_occurrence(rule, past, now)
         return {
             "timestamp": to_utc(next_occurence).timestamp(),
             "repeat_rule": rule,
@@ -127,3 +139,116 @@ def describe_repeat_rule(repeat_rule, recurrence_dict, connective="and"):
         recur, recurrence_dict, connective
     )
     return recur_description
+
+
+@lru_cache(maxsize=RULE_CACHE_SIZE)
+def _parse_repeat_rule(repeat_rule):
+    """Parse an iCal rule into a template, see get_repeat_rule()."""
+    return rrulestr("RRULE:" + repeat_rule)
+
+
+def get_repeat_rule(repeat_rule, dtstart):
+    """Get a dateutil rrule for an iCal rule string.
+
+    Parsing rule strings is expensive, so the parsed rule is cached by
+    its string and rebased onto the requested start.
+
+    Arguments:
+        repeat_rule (Str): iCal rule, e.g. "FREQ=WEEKLY;INTERVAL=1;BYDAY=MO"
+        dtstart (datetime): start of the recurrence
+    Returns:
+        rrule: recurrence starting at dtstart
+    """
+    return _parse_repeat_rule(repeat_rule).replace(dtstart=dtstart)
+
+
+def get_repeat_rule_cache_info():
+    """Get statistics about the cache of parsed iCal rules.
+
+    Returns:
+        Dict: {"hits": int, "misses": int, "size": int, "maxsize": int}
+    """
+    info = _parse_repeat_rule.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+    }
+
+
+def get_day_mask(repeat_rule):
+    """Get the days of a simple weekly iCal rule as a bit mask.
+
+    Only rules of the form created by create_recurring_rule() are supported,
+    e.g. "FREQ=WEEKLY;INTERVAL=1;BYDAY=MO,WE".
+
+    Arguments:
+        repeat_rule (Str): iCal rule
+    Returns:
+        int: 7-bit mask with bit 0 for Sunday to bit 6 for Saturday, or
+             None if the rule is not a simple weekly rule
+    """
+    if not repeat_rule or not repeat_rule.startswith(WEEKLY_RULE_PREFIX):
+        return None
+    day_mask = 0
+    for day in repeat_rule[len(WEEKLY_RULE_PREFIX) :].split(","):
+        if day not in DAY_ABBREVIATIONS:
+            return None
+        day_mask |= 1 << DAY_ABBREVIATIONS.index(day)
+    return day_mask
+
+
+def get_next_weekly_occurrence(dtstart, day_mask, after):
+    """Get the next occurrence of a weekly recurrence after a given time.
+
+    The occurrence is computed on local wall-clock time so it stays at the
+    same time of day across DST changes. Times skipped by a DST change are
+    moved forward to the first valid time.
+
+    Arguments:
+        dtstart (datetime): start of the recurrence, in local time
+        day_mask (int): days of the recurrence, see get_day_mask()
+        after (datetime): occurrence must be strictly later than this
+    Returns:
+        datetime: next occurrence in the timezone of dtstart
+    """
+    after_ts = after.timestamp()
+    if dtstart.timestamp() > after_ts:
+        # dtstart itself may be the next occurrence
+        after = dtstart - timedelta(microseconds=1)
+        after_ts = after.timestamp()
+    time_of_day = dtstart.time().replace(microsecond=0)
+    day = after.astimezone(dtstart.tzinfo).date()
+
+    # A matching day is at most a week away, or exactly a week if the only
+    # matching day is today and the time has already passed.
+    for offset in range(8):
+        candidate_day = day + timedelta(days=offset)
+        if not day_mask & (1 << (candidate_day.isoweekday() % 7)):
+            continue
+        candidate = resolve_imaginary(
+            datetime.combine(candidate_day, time_of_day, tzinfo=dtstart.tzinfo)
+        )
+        if candidate.timestamp() > after_ts:
+            return candidate
+    return None
+
+
+def get_next_occurrence(repeat_rule, dtstart, after):
+    """Get the next occurrence of an iCal rule after a given time.
+
+    Simple weekly rules are computed directly from their day mask, other
+    rules are evaluated with dateutil.
+
+    Arguments:
+        repeat_rule (Str): iCal rule
+        dtstart (datetime): start of the recurrence, in local time
+        after (datetime): occurrence must be strictly later than this
+    Returns:
+        datetime: next occurrence, or None if the rule has no more
+    """
+    day_mask = get_day_mask(repeat_rule)
+    if day_mask:
+        return get_next_weekly_occurrence(dtstart, day_mask, after)
+    return get_repeat_rule(repeat_rule, dtstart).after(after)
@@ -0,0 +1,154 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Control of a ringing alarm for the Mycroft Alarm Skill."""
+
+import time
+from threading import Event, Thread, current_thread
+
+from mycroft.util import LOG
+
+
+class AlarmRinger:
+    """Drives a ringing alarm from a single thread.
+
+    Repeating the sound, flashing the display and quieting the alarm once
+    it has rung long enough are all timed by one loop on a monotonic clock.
+    The loop only wakes up when one of them is due, so without a display to
+    flash it sleeps from one repetition of the sound to the next.
+
+    Arguments:
+        player (AlarmPlayer): player for the alarm sound
+        clock (Callable): monotonic clock returning seconds
+    """
+
+    def __init__(self, player, clock=time.monotonic):
+        self.player = player
+        self.clock = clock
+        self._stopped = Event()
+        self._thread = None
+
+    @property
+    def is_ringing(self):
+        """bool: True between start() and stop() or the timeout"""
+        return self._thread is not None and not self._stopped.is_set()
+
+    def start(
+        self,
+        sound_file,
+        repeat_interval,
+        max_duration,
+        on_repeat=None,
+        on_flash=None,
+        flash_interval=1.0,
+        on_timeout=None,
+        on_sound_start=None,
+    ):
+        """Start ringing, replacing the current alarm if any.
+
+        The callbacks are called from the ringing thread.
+
+        Arguments:
+            sound_file (str): path of the sound to play
+            repeat_interval (float): seconds from the start of one repetition
+                                     of the sound to the start of the next
+            max_duration (float): seconds after which ringing stops by itself
+            on_repeat (Callable, optional): called before every repetition
+            on_flash (Callable, optional): called every flash_interval, None if
+                                           there is nothing to flash
+            flash_interval (float): seconds between calls of on_flash
+            on_timeout (Callable, optional): called once max_duration is over
+            on_sound_start (Callable, optional): called from the player once
+                                                 the first repetition starts
+        """
+        self.stop()
+        self._stopped = Event()
+        self._thread = Thread(
+            target=self._ring,
+            args=(
+                self._stopped,
+                sound_file,
+                repeat_interval,
+                max_duration,
+                on_repeat,
+                on_flash,
+                flash_interval,
+                on_timeout,
+                on_sound_start,
+            ),
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop ringing and silence the sound."""
+        self._stopped.set()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not current_thread():
+            thread.join()
+        self.player.stop()
+
+    def _ring(
+        self,
+        stopped,
+        sound_file,
+        repeat_interval,
+        max_duration,
+        on_repeat,
+        on_flash,
+        flash_interval,
+        on_timeout,
+        on_sound_start,
+    ):
+        start = self.clock()
+        end = start + max_duration
+        next_repeat = start
+        next_flash = start if on_flash else None
+        while not stopped.is_set():
+            now = self.clock()
+            if now >= end:
+                stopped.set()
+                self.player.stop()
+                if on_timeout:
+                    _call(on_timeout)
+                return
+            if now >= next_repeat:
+                if on_repeat:
+                    _call(on_repeat)
+                if stopped.is_set():
+                    return
+                if on_sound_start:
+                    self.player.play(sound_file, on_start=on_sound_start)
+                    on_sound_start = None
+                else:
+                    self.player.play(sound_file)
+                # Skip repetitions missed while the system was suspended
+                while next_repeat <= now:
+                    next_repeat += repeat_interval
+            if next_flash is not None and now >= next_flash:
+                _call(on_flash)
+                while next_flash <= now:
+                    next_flash += flash_interval
+
+            due = min(end, next_repeat)
+            if next_flash is not None:
+                due = min(due, next_flash)
+            stopped.wait(max(0.0, due - self.clock()))
+
+
+def _call(callback):
+    """Call a callback, logging rather than raising errors."""
+    try:
+        callback()
+    except Exception:
+        LOG.exception("Error in alarm callback")
@@ -0,0 +1,153 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Decoded alarm sounds for the Mycroft Alarm Skill."""
+
+import os
+import subprocess
+import wave
+from glob import glob
+from os.path import basename, exists, join, splitext
+
+from mycroft.util import LOG
+
+
+class SoundCache:
+    """Cache of the alarm sounds decoded to WAV files.
+
+    Every mp3 in the sounds directory is an alarm sound. Each one is decoded
+    once, on first use, and the WAV file is kept until the mp3 changes. The
+    length of a sound is measured from the decoded audio, or taken from the
+    known lengths if it can't be decoded. A failed decode isn't retried
+    until the mp3 changes, the mp3 is played as it is instead.
+
+    Arguments:
+        sounds_dir (str): directory of the mp3 files
+        cache_dir (str): writable directory for the decoded WAV files
+        decode_command (List): command decoding an mp3 to a WAV file, called
+                               with the WAV and mp3 paths appended
+        durations (Dict): seconds of each sound to use if it can't be decoded
+    """
+
+    DECODE_COMMAND = ["mpg123", "--quiet", "-w"]
+    # Lengths of the sounds shipped with the Skill
+    DURATIONS = {
+        "bell": 5.0,
+        "escalate": 32.0,
+        "constant_beep": 5.0,
+        "beep4": 4.0,
+        "chimes": 22.0,
+    }
+
+    def __init__(self, sounds_dir, cache_dir, decode_command=None, durations=None):
+        self.sounds_dir = sounds_dir
+        self.cache_dir = cache_dir
+        self.decode_command = decode_command or self.DECODE_COMMAND
+        self.durations = self.DURATIONS if durations is None else durations
+        self._durations = {}  # name -> (mtime of the WAV file, seconds)
+        self._failed = {}  # mp3 path -> mtime of the mp3 that failed to decode
+
+    def names(self):
+        """Get the names of the available sounds.
+
+        Returns:
+            List: sound names, i.e. the mp3 file names without extension
+        """
+        mp3_files = glob(join(self.sounds_dir, "*.mp3"))
+        return sorted(splitext(basename(path))[0] for path in mp3_files)
+
+    def get(self, name):
+        """Get the file to play for a sound, decoding it if needed.
+
+        Arguments:
+            name (str): name of the sound
+        Returns:
+            str: path of the WAV file, the mp3 if it can't be decoded or None
+                 if there is no such sound
+        """
+        mp3_file = self._mp3_path(name)
+        if not exists(mp3_file):
+            return None
+        return self.prepare(name) or mp3_file
+
+    def prepare(self, name):
+        """Decode a sound unless an up to date WAV file exists.
+
+        Arguments:
+            name (str): name of the sound
+        Returns:
+            str: path of the WAV file, None if decoding failed
+        """
+        mp3_file = self._mp3_path(name)
+        wav_file = self._wav_path(name)
+        try:
+            mp3_mtime = os.stat(mp3_file).st_mtime
+        except OSError:
+            mp3_mtime = None
+        try:
+            if mp3_mtime is not None and os.stat(wav_file).st_mtime >= mp3_mtime:
+                return wav_file
+        except OSError:
+            pass
+        if mp3_file in self._failed and self._failed[mp3_file] == mp3_mtime:
+            return None
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_file = wav_file + ".tmp"
+        try:
+            subprocess.run(
+                self.decode_command + [tmp_file, mp3_file],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                check=True,
+            )
+            os.replace(tmp_file, wav_file)
+        except (OSError, subprocess.CalledProcessError) as err:
+            LOG.warning("Can't decode alarm sound {}: {}".format(name, err))
+            if exists(tmp_file):
+                os.remove(tmp_file)
+            self._failed[mp3_file] = mp3_mtime
+            return None
+        self._failed.pop(mp3_file, None)
+        return wav_file
+
+    def duration(self, name):
+        """Get the length of a sound.
+
+        Arguments:
+            name (str): name of the sound
+        Returns:
+            float: seconds of audio, None if the sound can't be decoded and
+                   its length isn't known
+        """
+        wav_file = self.prepare(name)
+        if wav_file is None:
+            return self.durations.get(name)
+        mtime = os.stat(wav_file).st_mtime
+        cached = self._durations.get(name)
+        if cached is None or cached[0] != mtime:
+            try:
+                with wave.open(wav_file) as wav:
+                    seconds = wav.getnframes() / wav.getframerate()
+            except (OSError, EOFError, wave.Error) as err:
+                LOG.warning("Can't read alarm sound {}: {}".format(name, err))
+                return self.durations.get(name)
+            cached = (mtime, seconds)
+            self._durations[name] = cached
+        return cached[1]
+
+    def _mp3_path(self, name):
+        return join(self.sounds_dir, name + ".mp3")
+
+    def _wav_path(self, name):
+        return join(self.cache_dir, name + ".wav")
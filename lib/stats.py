@@ -0,0 +1,317 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Latency statistics of the Mycroft Alarm Skill.
+
+Covers the stages of the intent handlers and how punctually alarms fire.
+"""
+
+import json
+import math
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from threading import Lock, local
+
+
+class LatencyHistogram:
+    """Counts of durations in buckets growing by a constant factor.
+
+    The memory used doesn't depend on the number of samples. Percentiles
+    are given as the upper bound of the bucket they fall in, so they are
+    at most `factor` times too high.
+
+    Arguments:
+        smallest (float): upper bound of the first bucket in seconds
+        factor (float): ratio of the bounds of consecutive buckets
+        buckets (int): number of buckets, longer durations go in the last one
+    """
+
+    def __init__(self, smallest=1e-5, factor=1.2, buckets=100):
+        self.smallest = smallest
+        self.factor = factor
+        self.counts = [0] * buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        """Add a duration.
+
+        Arguments:
+            seconds (float): the duration
+        """
+        if seconds <= self.smallest:
+            idx = 0
+        else:
+            idx = math.ceil(math.log(seconds / self.smallest, self.factor))
+            idx = min(idx, len(self.counts) - 1)
+        self.counts[idx] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent):
+        """Get the duration a percentage of the samples don't exceed.
+
+        Arguments:
+            percent (float): 0 to 100
+        Returns:
+            float: seconds, 0 if there are no samples
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * percent / 100))
+        seen = 0
+        for idx, count in enumerate(self.counts[:-1]):
+            seen += count
+            if seen >= rank:
+                return min(self.smallest * self.factor ** idx, self.max)
+        # The last bucket has no upper bound
+        return self.max
+
+    def summary(self):
+        """Get the statistics in milliseconds.
+
+        Returns:
+            Dict: {"count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"}
+        """
+        mean = self.total / self.count if self.count else 0.0
+        return {
+            "count": self.count,
+            "mean_ms": mean * 1000,
+            "p50_ms": self.percentile(50) * 1000,
+            "p95_ms": self.percentile(95) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+class LatencyStats:
+    """Latency histograms of each stage of each intent.
+
+    A trace times one request of an intent. Within it, spans time the
+    stages of the request. The time spent in a stage is summed over the
+    request and added to the histogram of the stage once the trace ends,
+    along with the total time of the request under "total". Traces are
+    kept per thread, spans and records outside of a trace are ignored.
+
+    Arguments:
+        clock (Callable): monotonic clock returning seconds
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self._histograms = {}  # intent -> {stage -> LatencyHistogram}
+        self._lock = Lock()
+        self._local = local()
+
+    @contextmanager
+    def trace(self, intent):
+        """Time a request of an intent.
+
+        Arguments:
+            intent (str): name of the intent, e.g. "set"
+        """
+        stages = {}
+        outer = getattr(self._local, "trace", None)
+        self._local.trace = stages
+        start = self.clock()
+        try:
+            yield
+        finally:
+            stages["total"] = self.clock() - start
+            self._local.trace = outer
+            with self._lock:
+                histograms = self._histograms.setdefault(intent, {})
+                for stage, seconds in stages.items():
+                    if stage not in histograms:
+                        histograms[stage] = LatencyHistogram()
+                    histograms[stage].add(seconds)
+
+    @contextmanager
+    def span(self, stage):
+        """Time a stage of the current request.
+
+        Arguments:
+            stage (str): name of the stage
+        """
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.record(stage, self.clock() - start)
+
+    def record(self, stage, seconds):
+        """Add time spent in a stage of the current request.
+
+        Arguments:
+            stage (str): name of the stage
+            seconds (float): time spent
+        """
+        stages = getattr(self._local, "trace", None)
+        if stages is not None:
+            stages[stage] = stages.get(stage, 0.0) + seconds
+
+    def summary(self):
+        """Get the statistics of every stage of every intent.
+
+        Returns:
+            Dict: {intent: {stage: LatencyHistogram.summary()}}
+        """
+        with self._lock:
+            return {
+                intent: {
+                    stage: histogram.summary()
+                    for stage, histogram in sorted(histograms.items())
+                }
+                for intent, histograms in sorted(self._histograms.items())
+            }
+
+    def dump(self, path):
+        """Write the summary to a JSON file.
+
+        Arguments:
+            path (str): file to write, replaced atomically
+        """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as json_file:
+            json.dump(self.summary(), json_file, indent=2)
+        os.replace(tmp_path, path)
+
+    def clear(self):
+        """Drop all statistics."""
+        with self._lock:
+            self._histograms = {}
+
+
+class FiringLog:
+    """Timing of the latest alarm firings, kept in a ring buffer.
+
+    For every firing this records how late it went off compared to the
+    alarm's timestamp, and how long it took from then until the sound
+    started. Firings of a snoozed alarm are kept apart from the others.
+
+    Arguments:
+        size (int): number of firings to keep
+        clock (Callable): returns the current POSIX timestamp
+        monotonic (Callable): monotonic clock returning seconds
+    """
+
+    def __init__(self, size=100, clock=time.time, monotonic=time.monotonic):
+        self.clock = clock
+        self.monotonic = monotonic
+        self._firings = deque(maxlen=size)
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._firings)
+
+    def fired(self, alarm):
+        """Record an alarm going off.
+
+        Arguments:
+            alarm (Alarm): the alarm
+        Returns:
+            Callable: to call once the alarm sound has started
+        """
+        fired_at = self.monotonic()
+        firing = {
+            "timestamp": alarm["timestamp"],
+            "snoozed": bool(alarm.get("snooze")),
+            "lateness_ms": (self.clock() - alarm["timestamp"]) * 1000,
+            "audio_start_ms": None,
+        }
+        with self._lock:
+            self._firings.append(firing)
+
+        def audio_started():
+            if firing["audio_start_ms"] is None:
+                firing["audio_start_ms"] = (self.monotonic() - fired_at) * 1000
+
+        return audio_started
+
+    def summary(self, recent=10):
+        """Get statistics over the firings kept.
+
+        Arguments:
+            recent (int): number of the latest firings to include
+        Returns:
+            Dict: {
+                "lateness": statistics of alarms that weren't snoozed,
+                "snooze_lateness": statistics of snoozed alarms,
+                "audio_start": statistics of the time to start the sound,
+                "recent": the latest firings, oldest first
+            }
+            where the statistics are {"count", "mean_ms", "p50_ms",
+            "p95_ms", "max_ms"}.
+        """
+        with self._lock:
+            firings = [dict(firing) for firing in self._firings]
+        return {
+            "lateness": _describe(
+                [f["lateness_ms"] for f in firings if not f["snoozed"]]
+            ),
+            "snooze_lateness": _describe(
+                [f["lateness_ms"] for f in firings if f["snoozed"]]
+            ),
+            "audio_start": _describe(
+                [
+                    f["audio_start_ms"]
+                    for f in firings
+                    if f["audio_start_ms"] is not None
+                ]
+            ),
+            "recent": firings[-recent:] if recent else [],
+        }
+
+
+def _describe(samples):
+    """Get count, mean, nearest rank percentiles and max of samples."""
+    samples = sorted(samples)
+    count = len(samples)
+    if not count:
+        return {"count": 0}
+
+    def percentile(percent):
+        return samples[max(1, math.ceil(count * percent / 100)) - 1]
+
+    return {
+        "count": count,
+        "mean_ms": sum(samples) / count,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "max_ms": samples[-1],
+    }
+
+
+def traced(intent):
+    """Decorate a method to trace its calls as requests of an intent.
+
+    The object must keep its LatencyStats in a `latency` attribute.
+
+    Arguments:
+        intent (str): name of the intent
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.latency.trace(intent):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,277 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Firing large numbers of alarms from one timer."""
+
+import math
+import time
+from threading import Event, Lock, Thread, current_thread
+
+from mycroft.util import LOG
+
+from .engine import AlarmNotifier
+
+# Seconds covered by one slot of each level of the wheel, and slots per level
+SPANS = (1, 60, 3600, 86400)
+SLOTS = (60, 60, 24, 366)
+
+# Entry fields
+_TICK = 0
+_ITEM = 1
+_ACTIVE = 2
+
+
+class TimerWheel:
+    """Hierarchical timing wheel with second, minute, hour and day levels.
+
+    Every level is a ring of buckets. An item is put in the bucket of the
+    lowest level whose ring reaches its time, which is O(1). When the
+    wheel turns past a minute, hour or day, the items in the bucket of the
+    higher level that just came up are spread over the level below. Items
+    further away than the day ring are kept aside until the ring wraps.
+
+    Time is counted in whole seconds, an item fires on the first second at
+    or after its timestamp. Cancelled items are dropped when their bucket
+    is reached. Seconds at which no bucket can come up are skipped, so
+    turning the wheel over a long time with few items is cheap.
+
+    Arguments:
+        now (float): POSIX timestamp to start the wheel at
+    """
+
+    def __init__(self, now):
+        self.current = math.floor(now)
+        self._levels = [[[] for _ in range(slots)] for slots in SLOTS]
+        self._sizes = [0] * len(SLOTS)  # entries per level, including cancelled
+        self._overflow = []
+        self._due = []
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, timestamp, item):
+        """Arm an item.
+
+        Arguments:
+            timestamp (float): POSIX timestamp at which the item fires
+            item: anything, returned by advance() once due
+        Returns:
+            List: entry for cancel()
+        """
+        entry = [math.ceil(timestamp), item, True]
+        self._count += 1
+        self._place(entry)
+        return entry
+
+    def cancel(self, entry):
+        """Disarm an item.
+
+        Arguments:
+            entry (List): entry returned by add()
+        """
+        if entry[_ACTIVE]:
+            entry[_ACTIVE] = False
+            self._count -= 1
+
+    def advance(self, now):
+        """Turn the wheel to a point in time, collecting the items due.
+
+        Arguments:
+            now (float): POSIX timestamp, earlier times are ignored
+        Returns:
+            List: the items due, in the order they became due
+        """
+        target = math.floor(now)
+        due = []
+        self._collect_due(due)
+        while self.current < target:
+            if not self._count:
+                # Nothing to cascade, skip ahead
+                self.current = target
+                break
+            # Skip to the next bucket of the lowest level that has any items
+            step = 1
+            for level in range(len(SLOTS) - 1):
+                if self._sizes[level]:
+                    break
+                step = SPANS[level + 1] - self.current % SPANS[level + 1]
+            self.current = min(target, self.current + step)
+            self._tick(due)
+        return due
+
+    def _tick(self, due):
+        current = self.current
+        # Cascade from the top down so items end up in the bucket they fire from
+        if current % SPANS[3] == 0:
+            if (current // SPANS[3]) % SLOTS[3] == 0:
+                overflow, self._overflow = self._overflow, []
+                self._cascade(overflow)
+            self._cascade_level(3)
+        if current % SPANS[2] == 0:
+            self._cascade_level(2)
+        if current % SPANS[1] == 0:
+            self._cascade_level(1)
+
+        bucket = self._levels[0][current % SLOTS[0]]
+        if bucket:
+            self._levels[0][current % SLOTS[0]] = []
+            self._sizes[0] -= len(bucket)
+            self._collect(bucket, due)
+        # Items cascaded onto the current second
+        self._collect_due(due)
+
+    def _cascade_level(self, level):
+        buckets = self._levels[level]
+        idx = (self.current // SPANS[level]) % SLOTS[level]
+        if buckets[idx]:
+            bucket, buckets[idx] = buckets[idx], []
+            self._sizes[level] -= len(bucket)
+            self._cascade(bucket)
+
+    def _cascade(self, entries):
+        for entry in entries:
+            if entry[_ACTIVE]:
+                self._place(entry)
+
+    def _collect_due(self, due):
+        if self._due:
+            entries, self._due = self._due, []
+            self._collect(entries, due)
+
+    def _collect(self, entries, due):
+        for entry in entries:
+            if entry[_ACTIVE]:
+                entry[_ACTIVE] = False
+                self._count -= 1
+                due.append(entry[_ITEM])
+
+    def _place(self, entry):
+        tick = entry[_TICK]
+        current = self.current
+        if tick <= current:
+            self._due.append(entry)
+            return
+        # Unrolled over the levels, this is the hot path when arming
+        if tick - current < SLOTS[0]:
+            level, slot = 0, tick % SLOTS[0]
+        elif tick // SPANS[1] - current // SPANS[1] < SLOTS[1]:
+            level, slot = 1, (tick // SPANS[1]) % SLOTS[1]
+        elif tick // SPANS[2] - current // SPANS[2] < SLOTS[2]:
+            level, slot = 2, (tick // SPANS[2]) % SLOTS[2]
+        elif tick // SPANS[3] - current // SPANS[3] < SLOTS[3]:
+            level, slot = 3, (tick // SPANS[3]) % SLOTS[3]
+        else:
+            self._overflow.append(entry)
+            return
+        self._levels[level][slot].append(entry)
+        self._sizes[level] += 1
+
+
+class AlarmDispatcher:
+    """Fires the next alarm of any number of AlarmEngines from one thread.
+
+    Each engine arms the dispatcher under a key through the notifier from
+    notifier(). Once a second the wheel is turned and the callback is called
+    with the keys of all the engines whose next alarm came due.
+
+    Arguments:
+        callback (Callable): called with a list of keys, from the dispatcher
+                             thread
+        clock (Callable): returns the current POSIX timestamp
+    """
+
+    def __init__(self, callback, clock=time.time):
+        self.callback = callback
+        self.clock = clock
+        self.wheel = TimerWheel(clock())
+        self._entries = {}  # key -> wheel entry
+        self._lock = Lock()
+        self._stopped = Event()
+        self._thread = None
+
+    def arm(self, key, timestamp):
+        """Set the time to fire a key at, replacing the previous one.
+
+        Arguments:
+            key (Hashable): identifies the engine, e.g. a device id
+            timestamp (float): POSIX timestamp, None to disarm
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry:
+                self.wheel.cancel(entry)
+            if timestamp is not None:
+                self._entries[key] = self.wheel.add(timestamp, key)
+
+    def disarm(self, key):
+        """Stop a key from firing."""
+        self.arm(key, None)
+
+    def notifier(self, key):
+        """Get the notifier arming this dispatcher for an AlarmEngine.
+
+        Arguments:
+            key (Hashable): passed to the callback when the engine's next
+                            alarm is due
+        Returns:
+            AlarmNotifier: notifier for the engine
+        """
+        return _DispatchNotifier(self, key)
+
+    def run_pending(self):
+        """Fire the keys that are due now.
+
+        Returns:
+            List: keys that were fired
+        """
+        with self._lock:
+            keys = self.wheel.advance(self.clock())
+            for key in keys:
+                del self._entries[key]
+        if keys:
+            try:
+                self.callback(keys)
+            except Exception:
+                LOG.exception("Error in alarm dispatch")
+        return keys
+
+    def start(self):
+        """Fire alarms from a background thread until stop()."""
+        self.stop()
+        self._stopped = Event()
+        self._thread = Thread(target=self._run, args=(self._stopped,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread."""
+        self._stopped.set()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not current_thread():
+            thread.join()
+
+    def _run(self, stopped):
+        while not stopped.is_set():
+            self.run_pending()
+            # Wake up on the next second
+            now = self.clock()
+            stopped.wait(math.floor(now) + 1 - now)
+
+
+class _DispatchNotifier(AlarmNotifier):
+    def __init__(self, dispatcher, key):
+        self.dispatcher = dispatcher
+        self.key = key
+
+    def next_alarm_changed(self, alarm):
+        self.dispatcher.arm(self.key, alarm["timestamp"] if alarm else None)
@@ -0,0 +1,113 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare alarm matching by list scans with the AlarmStore indexes.
+
+Run from the root of the Skill:
+    python -m test.benchmark.bench_match
+"""
+
+import random
+import timeit
+
+from lib.alarm import AlarmStore
+from lib.parse import fuzzy_match
+
+ALARM_COUNT = 10000
+NUMBER = 20
+THRESHOLD = 0.7
+RULES = [
+    "",
+    "FREQ=WEEKLY;INTERVAL=1;BYDAY=SU,SA,WE,MO,FR,TH,TU",
+    "FREQ=WEEKLY;INTERVAL=1;BYDAY=WE,MO,FR,TH,TU",
+    "FREQ=WEEKLY;INTERVAL=1;BYDAY=SU,SA",
+]
+NAMES = ["", "", "", "wake up", "medicine", "gym", "call mom", "trash day"]
+
+
+def create_alarms(count, seed=1):
+    rand = random.Random(seed)
+    start = 4000000000.0
+    alarms = []
+    for idx in range(count):
+        name = rand.choice(NAMES)
+        alarms.append(
+            {
+                "timestamp": start + rand.randrange(0, 90 * 86400, 60),
+                "repeat_rule": rand.choice(RULES),
+                "name": name + " " + str(idx % 50) if name else "",
+            }
+        )
+    return alarms
+
+
+def match_with_scans(alarms, time_alarm, repeat_rule, utt):
+    """The previous implementation of _get_alarm_matches."""
+    time_matches = [a for a in alarms if abs(a["timestamp"] - time_alarm) <= 60]
+    recurrence_matches = [a for a in alarms if a["repeat_rule"] == repeat_rule]
+    name_matches = [
+        a for a in alarms if a["name"] and fuzzy_match(a["name"], utt, THRESHOLD)
+    ]
+    if time_matches:
+        alarms = [a for a in alarms if a in time_matches]
+    if recurrence_matches:
+        alarms = [a for a in alarms if a in recurrence_matches]
+    if name_matches:
+        alarms = [a for a in alarms if a in name_matches]
+    return alarms
+
+
+def match_with_indexes(store, time_alarm, repeat_rule, utt):
+    candidate_ids = set(store.ids())
+    time_matches = store.ids_between(time_alarm - 60, time_alarm + 60)
+    recurrence_matches = store.ids_with_rule(repeat_rule)
+    matched_names = store.names.match(utt, THRESHOLD)
+    name_matches = store.ids_with_names(matched_names)
+    for matches in (time_matches, recurrence_matches, name_matches):
+        if matches:
+            candidate_ids &= matches
+    return [store.get(alarm_id) for alarm_id in store.sort_ids(candidate_ids)]
+
+
+def main():
+    alarms = sorted(create_alarms(ALARM_COUNT), key=lambda a: a["timestamp"])
+    store = AlarmStore(alarms)
+    target = alarms[ALARM_COUNT // 2]
+    queries = [
+        ("time", target["timestamp"], "", "cancel my alarm"),
+        ("time+rule", target["timestamp"], RULES[2], "cancel my weekday alarm"),
+        ("name", -1, "", "cancel my medicine 7 alarm"),
+    ]
+    print("{} alarms".format(ALARM_COUNT))
+    print("{:<10} {:>12} {:>12} {:>8}".format("query", "scans", "indexes", "speedup"))
+    for label, time_alarm, repeat_rule, utt in queries:
+        assert match_with_scans(
+            alarms, time_alarm, repeat_rule, utt
+        ) == match_with_indexes(store, time_alarm, repeat_rule, utt)
+        slow = timeit.timeit(
+            lambda: match_with_scans(alarms, time_alarm, repeat_rule, utt),
+            number=NUMBER,
+        )
+        fast = timeit.timeit(
+            lambda: match_with_indexes(store, time_alarm, repeat_rule, utt),
+            number=NUMBER,
+        )
+        print(
+            "{:<10} {:>9.2f} ms {:>9.2f} ms {:>7.1f}x".format(
+                label, slow / NUMBER * 1e3, fast / NUMBER * 1e3, slow / fast
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
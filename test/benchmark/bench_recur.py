@@ -0,0 +1,73 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare the weekly fast path of get_next_occurrence() with dateutil.
+
+Run from the root of the Skill:
+    python -m test.benchmark.bench_recur
+"""
+
+import timeit
+from datetime import timedelta
+
+from dateutil.rrule import rrulestr
+from mycroft.util.time import now_local
+
+from lib.recur import get_day_mask, get_next_weekly_occurrence
+
+RULES = {
+    "daily": "FREQ=WEEKLY;INTERVAL=1;BYDAY=SU,SA,WE,MO,FR,TH,TU",
+    "weekdays": "FREQ=WEEKLY;INTERVAL=1;BYDAY=WE,MO,FR,TH,TU",
+    "mondays": "FREQ=WEEKLY;INTERVAL=1;BYDAY=MO",
+}
+NUMBER = 2000
+
+
+def next_with_dateutil(rule, dtstart, now):
+    """The previous implementation, iterating from 45 days in the past."""
+    return rrulestr("RRULE:" + rule, dtstart=dtstart).after(now)
+
+
+def next_with_day_mask(rule, dtstart, now):
+    return get_next_weekly_occurrence(dtstart, get_day_mask(rule), now)
+
+
+def main():
+    now = now_local()
+    dtstart = now.replace(hour=7, minute=0, second=0, microsecond=0)
+    dtstart -= timedelta(days=45)
+    print(
+        "{:<10} {:>14} {:>14} {:>8}".format("rule", "dateutil", "day mask", "speedup")
+    )
+    for name, rule in RULES.items():
+        assert next_with_dateutil(rule, dtstart, now) == next_with_day_mask(
+            rule, dtstart, now
+        )
+        slow = timeit.timeit(
+            lambda: next_with_dateutil(rule, dtstart, now), number=NUMBER
+        )
+        fast = timeit.timeit(
+            lambda: next_with_day_mask(rule, dtstart, now), number=NUMBER
+        )
+        print(
+            "{:<10} {:>11.1f} us {:>11.1f} us {:>7.1f}x".format(
+                name,
+                slow / NUMBER * 1e6,
+                fast / NUMBER * 1e6,
+                slow / fast,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Fire a day of alarms through the TimerWheel and through a heap.
+
+A synthetic day of alarms is armed, then time is advanced one second at a
+time and every alarm due is collected. A tenth of the alarms are cancelled
+and re-armed before the day starts, like alarms that are changed.
+
+Run from the root of the Skill:
+    python -m test.benchmark.bench_wheel [alarm count]
+"""
+
+import heapq
+import random
+import sys
+import time
+
+from lib.wheel import TimerWheel
+
+ALARM_COUNT = 1000000
+DAY = 86400
+START = 4000000000.0
+
+
+def create_timestamps(count, seed=1):
+    rand = random.Random(seed)
+    # Alarms cluster on the full and half hour, like people set them
+    timestamps = []
+    for _ in range(count):
+        if rand.random() < 0.7:
+            offset = rand.randrange(0, DAY, 1800)
+        else:
+            offset = rand.uniform(0, DAY)
+        timestamps.append(START + offset)
+    return timestamps
+
+
+def fire_with_wheel(timestamps):
+    wheel = TimerWheel(START)
+    start = time.perf_counter()
+    entries = [wheel.add(timestamp, idx) for idx, timestamp in enumerate(timestamps)]
+    for idx in range(0, len(entries), 10):
+        wheel.cancel(entries[idx])
+        entries[idx] = wheel.add(timestamps[idx], idx)
+    armed = time.perf_counter()
+
+    fired = 0
+    largest_batch = 0
+    for second in range(1, DAY + 1):
+        batch = wheel.advance(START + second)
+        fired += len(batch)
+        largest_batch = max(largest_batch, len(batch))
+    done = time.perf_counter()
+    return fired, largest_batch, armed - start, done - armed
+
+
+def fire_with_heap(timestamps):
+    heap = []
+    start = time.perf_counter()
+    entries = []
+    for idx, timestamp in enumerate(timestamps):
+        entry = [timestamp, idx, True]
+        heapq.heappush(heap, entry)
+        entries.append(entry)
+    for idx in range(0, len(entries), 10):
+        entries[idx][2] = False
+        entry = [timestamps[idx], idx, True]
+        heapq.heappush(heap, entry)
+        entries[idx] = entry
+    armed = time.perf_counter()
+
+    fired = 0
+    largest_batch = 0
+    for second in range(1, DAY + 1):
+        now = START + second
+        batch = []
+        while heap and heap[0][0] <= now:
+            entry = heapq.heappop(heap)
+            if entry[2]:
+                batch.append(entry[1])
+        fired += len(batch)
+        largest_batch = max(largest_batch, len(batch))
+    done = time.perf_counter()
+    return fired, largest_batch, armed - start, done - armed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else ALARM_COUNT
+    timestamps = create_timestamps(count)
+    print("{} alarms over a simulated day".format(count))
+    print(
+        "{:<6} {:>10} {:>10} {:>12} {:>12} {:>14}".format(
+            "timer", "fired", "max batch", "arm", "fire", "per alarm"
+        )
+    )
+    for label, fire in (("wheel", fire_with_wheel), ("heap", fire_with_heap)):
+        fired, largest_batch, arm_time, fire_time = fire(timestamps)
+        assert fired == count
+        print(
+            "{:<6} {:>10} {:>10} {:>9.2f} s {:>9.2f} s {:>11.2f} us".format(
+                label,
+                fired,
+                largest_batch,
+                arm_time,
+                fire_time,
+                (arm_time + fire_time) / count * 1e6,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark suite for the alarm, recurrence, parse and format functions.
+
+Every benchmark runs over synthetic alarm sets of increasing size, mixing
+one-shot and recurring alarms, named and unnamed, with the names and
+recurrence vocabulary of several languages. Results are printed as a table
+and can be written as JSON to compare runs against each other.
+
+Run from the root of the Skill:
+    python -m test.benchmark.run
+    python -m test.benchmark.run --sizes 10,1000 --output after.json \\
+        --compare before.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import timeit
+from datetime import datetime, timedelta
+from os.path import abspath, dirname, join
+
+from dateutil.tz import gettz
+
+from lib.alarm import curate_alarms, get_next_repeat
+from lib.format import nice_relative_time
+from lib.parse import fuzzy_match
+from lib.recur import create_recurring_rule, describe_recurrence
+
+SKILL_DIR = dirname(dirname(dirname(abspath(__file__))))
+SIZES = [10, 100, 1000, 10000, 100000]
+LOCALES = ["en-us", "de-de", "fr-fr", "es-es"]
+THRESHOLD = 0.7
+RESULTS_VERSION = 1
+
+# Alarm names and a request to cancel a named alarm in each language
+ALARM_NAMES = {
+    "en-us": ["wake up", "medicine", "gym", "call mom", "trash day", "school run"],
+    "de-de": ["aufstehen", "medizin", "training", "mama anrufen", "müll", "schule"],
+    "fr-fr": ["réveil", "médicaments", "sport", "appeler maman", "poubelle", "école"],
+    "es-es": ["despertar", "medicina", "gimnasio", "llamar a mamá", "basura", "clase"],
+}
+CANCEL_TEMPLATES = {
+    "en-us": "cancel the {} alarm",
+    "de-de": "lösche den wecker {}",
+    "fr-fr": "annule l'alarme {}",
+    "es-es": "cancela la alarma {}",
+}
+DAY_SETS = [
+    {"1", "2", "3", "4", "5"},
+    {"0", "6"},
+    {"0", "1", "2", "3", "4", "5", "6"},
+    {"1"},
+    {"1", "3", "5"},
+    {"2", "4"},
+]
+
+
+def load_recurrence_dict(lang):
+    """Read the recurrence vocabulary of a language from the Skill."""
+    recurrence_dict = {}
+    with open(join(SKILL_DIR, "dialog", lang, "recurring.value")) as value_file:
+        for line in value_file:
+            if line.startswith("#") or "," not in line:
+                continue
+            name, days = line.split(",", 1)
+            recurrence_dict[name.strip()] = days.strip()
+    return recurrence_dict
+
+
+def load_connective(lang):
+    """Read the word joining a list of days in a language."""
+    with open(join(SKILL_DIR, "dialog", lang, "and.dialog")) as dialog_file:
+        return dialog_file.readline().strip()
+
+
+class AlarmSet:
+    """Synthetic alarms of one size and language.
+
+    A fifth of the alarms have expired, within or beyond the curation limit.
+    Two in five repeat weekly, and half of them are named.
+
+    Arguments:
+        size (int): number of alarms
+        lang (str): language of the names and recurrence vocabulary
+        now (datetime): current time of the set
+        seed (int): seed of the random generator
+    """
+
+    def __init__(self, size, lang, now, seed=1):
+        rand = random.Random(seed)
+        self.size = size
+        self.lang = lang
+        self.now = now
+        self.recurrence_dict = load_recurrence_dict(lang)
+        self.connective = load_connective(lang)
+
+        names = ALARM_NAMES[lang]
+        template = CANCEL_TEMPLATES[lang]
+        self.alarms = []
+        self.recurrences = []  # (datetime, day set) of the recurring alarms
+        self.utterances = []
+        for _ in range(size):
+            if rand.random() < 0.2:
+                offset = -rand.choice([0.5, 30, 3600, 5 * 86400])
+            else:
+                offset = rand.randrange(60, 30 * 86400, 60)
+            when = now + timedelta(seconds=offset)
+            name = rand.choice(names) if rand.random() < 0.5 else ""
+            repeat_rule = ""
+            if rand.random() < 0.4:
+                days = rand.choice(DAY_SETS)
+                rule = create_recurring_rule(when, days, now)
+                repeat_rule = rule["repeat_rule"]
+                self.recurrences.append((when, days))
+            self.alarms.append(
+                {
+                    "timestamp": when.timestamp(),
+                    "repeat_rule": repeat_rule,
+                    "name": name,
+                }
+            )
+            self.utterances.append(template.format(rand.choice(names)))
+        self.alarms.sort(key=lambda alarm: alarm["timestamp"])
+        self.repeating = [alarm for alarm in self.alarms if alarm["repeat_rule"]]
+
+
+def bench_curate_alarms(data):
+    return lambda: curate_alarms(data.alarms, now=data.now)
+
+
+def bench_get_next_repeat(data):
+    def run():
+        for alarm in data.repeating:
+            get_next_repeat(alarm)
+
+    return run
+
+
+def bench_create_recurring_rule(data):
+    def run():
+        for when, days in data.recurrences:
+            create_recurring_rule(when, days, data.now)
+
+    return run
+
+
+def bench_describe_recurrence(data):
+    def run():
+        for _, days in data.recurrences:
+            describe_recurrence(days, data.recurrence_dict, data.connective)
+
+    return run
+
+
+def bench_fuzzy_match(data):
+    def run():
+        for alarm, utterance in zip(data.alarms, data.utterances):
+            if alarm["name"]:
+                fuzzy_match(alarm["name"], utterance, THRESHOLD)
+
+    return run
+
+
+def bench_nice_relative_time(data):
+    times = [
+        datetime.fromtimestamp(alarm["timestamp"], data.now.tzinfo)
+        for alarm in data.alarms
+    ]
+
+    def run():
+        for when in times:
+            nice_relative_time(when, relative_to=data.now, lang=data.lang)
+
+    return run
+
+
+# name -> (function creating the benchmark of an AlarmSet, depends on language)
+BENCHMARKS = {
+    "curate_alarms": (bench_curate_alarms, False),
+    "get_next_repeat": (bench_get_next_repeat, False),
+    "create_recurring_rule": (bench_create_recurring_rule, False),
+    "describe_recurrence": (bench_describe_recurrence, True),
+    "fuzzy_match": (bench_fuzzy_match, True),
+    "nice_relative_time": (bench_nice_relative_time, True),
+}
+
+
+def measure(run, size, repeat):
+    """Get the best time of a benchmark run in seconds."""
+    # Small sets are run many times for a measurable time
+    number = max(1, 1000 // size)
+    return min(timeit.repeat(run, number=number, repeat=repeat)) / number
+
+
+def run_benchmarks(names, sizes, locales, repeat, now):
+    """Run benchmarks on every combination of size and language.
+
+    Returns:
+        List: one result dict per benchmark, language and size
+    """
+    results = []
+    for size in sizes:
+        for idx, lang in enumerate(locales):
+            data = AlarmSet(size, lang, now)
+            for name in names:
+                create, per_language = BENCHMARKS[name]
+                if not per_language and idx > 0:
+                    continue
+                seconds = measure(create(data), size, repeat)
+                result = {
+                    "benchmark": name,
+                    "locale": lang if per_language else None,
+                    "size": size,
+                    "seconds": seconds,
+                    "per_alarm_us": seconds / size * 1e6,
+                }
+                results.append(result)
+                print(format_result(result))
+    return results
+
+
+def format_result(result, baseline=None):
+    line = "{:<22} {:<6} {:>7} {:>12.3f} ms {:>10.2f} us".format(
+        result["benchmark"],
+        result["locale"] or "-",
+        result["size"],
+        result["seconds"] * 1e3,
+        result["per_alarm_us"],
+    )
+    if baseline:
+        line += " {:>7.2f}x".format(result["seconds"] / baseline["seconds"])
+    return line
+
+
+def result_key(result):
+    return (result["benchmark"], result["locale"], result["size"])
+
+
+def compare(results, baseline_file):
+    """Print the results with their ratio to a previous run."""
+    with open(baseline_file) as json_file:
+        baseline = {result_key(r): r for r in json.load(json_file)["results"]}
+    print("\nCompared to {} (< 1 is faster)".format(baseline_file))
+    for result in results:
+        print(format_result(result, baseline.get(result_key(result))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in SIZES),
+        help="comma separated numbers of alarms",
+    )
+    parser.add_argument(
+        "--locales", default=",".join(LOCALES), help="comma separated languages"
+    )
+    parser.add_argument(
+        "--benchmarks",
+        default=",".join(BENCHMARKS),
+        help="comma separated benchmark names",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark")
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    locales = args.locales.split(",")
+    names = args.benchmarks.split(",")
+    # A fixed time keeps the alarm sets the same from run to run
+    now = datetime(2021, 6, 1, 12, 0, tzinfo=gettz("Europe/Berlin"))
+
+    print(
+        "{:<22} {:<6} {:>7} {:>15} {:>13}".format(
+            "benchmark", "locale", "alarms", "time", "per alarm"
+        )
+    )
+    results = run_benchmarks(names, sizes, locales, args.repeat, now)
+
+    if args.output:
+        with open(args.output, "w") as json_file:
+            json.dump(
+                {
+                    "version": RESULTS_VERSION,
+                    "created": datetime.now().isoformat(timespec="seconds"),
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "repeat": args.repeat,
+                    "results": results,
+                },
+                json_file,
+                indent=2,
+            )
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
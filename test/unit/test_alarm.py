@@ -21,10 +21,12 @@ from mycroft.util.time import now_local, now_utc, to_local, to_utc
 from lingua_franca import set_default_lang
 
 from lib.alarm import (
+    AlarmStore,
     alarm_log_dump,
     curate_alarms,
     get_alarm_local,
     get_next_repeat,
+    get_next_repeats,
     has_expired_alarm,
 )
 
@@ -98,7 +100,6 @@ class TestGetAlarmLocal(unittest.TestCase):
 
 
 class TestGetNextRepeat(unittest.TestCase):
-    @pytest.mark.skip("Failing")
     def test_get_next_repeat(self):
         expired_alarm = {
             "timestamp": _get_timestamp("yesterday at 7pm"),
@@ -117,6 +118,32 @@ class TestGetNextRepeat(unittest.TestCase):
         self.assertEqual(rescheduled_alarm["timestamp"], expected_timestamp)
 
 
+class TestGetNextRepeats(unittest.TestCase):
+    def test_matches_get_next_repeat(self):
+        alarms = []
+        for day in ["yesterday", "last week", "last monday"]:
+            for time in ["7am", "7pm", "11:30pm"]:
+                for rule in [RRULE_DAILY, RRULE_WEEKDAYS, "FREQ=DAILY;INTERVAL=2"]:
+                    alarms.append(
+                        {
+                            "timestamp": _get_timestamp(day + " at " + time),
+                            "repeat_rule": rule,
+                            "name": "",
+                        }
+                    )
+        alarms.append(
+            {
+                "timestamp": _get_timestamp("yesterday at 7:09am"),
+                "repeat_rule": RRULE_DAILY,
+                "name": "snoozed",
+                "snooze": _get_timestamp("yesterday at 7am"),
+            }
+        )
+        self.assertEqual(
+            get_next_repeats(alarms), [get_next_repeat(alarm) for alarm in alarms]
+        )
+
+
 class TestHasExpiredAlarm(unittest.TestCase):
     def test_has_expired_alarm(self):
         alarms = [
@@ -144,3 +171,124 @@ class TestHasExpiredAlarm(unittest.TestCase):
         ]
         alarm_expired = has_expired_alarm(alarms)
         self.assertFalse(alarm_expired)
+
+
+class TestAlarmStore(unittest.TestCase):
+    def setUp(self):
+        self.tomorrow = {
+            "timestamp": _get_timestamp("tomorrow at 7pm"),
+            "repeat_rule": "",
+            "name": "",
+        }
+        self.next_week = {
+            "timestamp": _get_timestamp("next week at 10am"),
+            "repeat_rule": "",
+            "name": "",
+        }
+        self.tomorrow_morning = {
+            "timestamp": _get_timestamp("tomorrow at 6am"),
+            "repeat_rule": "",
+            "name": "wake up",
+        }
+
+    def test_peek_and_pop_in_time_order(self):
+        store = AlarmStore([self.next_week, self.tomorrow])
+        store.add(self.tomorrow_morning)
+        self.assertEqual(store.peek(), self.tomorrow_morning)
+        self.assertEqual(store.pop(), self.tomorrow_morning)
+        self.assertEqual(store.pop(), self.tomorrow)
+        self.assertEqual(store.pop(), self.next_week)
+        self.assertIsNone(store.pop())
+        self.assertIsNone(store.peek())
+
+    def test_remove_alarm(self):
+        store = AlarmStore([self.next_week, self.tomorrow, self.tomorrow_morning])
+        self.assertTrue(store.remove(self.tomorrow_morning))
+        self.assertFalse(store.remove(self.tomorrow_morning))
+        self.assertNotIn(self.tomorrow_morning, store)
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.peek(), self.tomorrow)
+
+    def test_duplicate_detection(self):
+        store = AlarmStore([self.tomorrow])
+        self.assertIn(dict(self.tomorrow), store)
+        self.assertNotIn(self.tomorrow_morning, store)
+        snoozed = dict(self.tomorrow_morning, snooze=self.tomorrow_morning["timestamp"])
+        store.snooze(self.tomorrow, snoozed)
+        self.assertNotIn(self.tomorrow, store)
+        self.assertIn(self.tomorrow_morning, store)
+
+    def test_lookup_indexes(self):
+        weekdays = {
+            "timestamp": _get_timestamp("tomorrow at 6:30am"),
+            "repeat_rule": RRULE_WEEKDAYS,
+            "name": "wake up",
+        }
+        store = AlarmStore([self.next_week, self.tomorrow, self.tomorrow_morning])
+        weekdays_id = store.add(weekdays)
+        self.assertIs(store.get(weekdays_id), weekdays)
+        self.assertEqual(
+            [store.get(alarm_id) for alarm_id in store.ids()], store.sorted()
+        )
+
+        tomorrow_ts = self.tomorrow["timestamp"]
+        (tomorrow_id,) = store.ids_between(tomorrow_ts - 60, tomorrow_ts + 60)
+        self.assertEqual(store.get(tomorrow_id), self.tomorrow)
+        self.assertEqual(store.ids_with_rule(RRULE_WEEKDAYS), {weekdays_id})
+        self.assertEqual(len(store.ids_with_rule("")), 3)
+        wake_up_ids = store.ids_with_names(["wake up"])
+        self.assertEqual(len(wake_up_ids), 2)
+        self.assertEqual(
+            [store.get(alarm_id) for alarm_id in store.sort_ids(wake_up_ids)],
+            [self.tomorrow_morning, weekdays],
+        )
+
+        store.remove(weekdays)
+        self.assertIsNone(store.get(weekdays_id))
+        self.assertEqual(store.ids_with_rule(RRULE_WEEKDAYS), set())
+        self.assertEqual(len(store.ids_with_names(["wake up"])), 1)
+        self.assertEqual(
+            store.ids_between(weekdays["timestamp"], weekdays["timestamp"]), set()
+        )
+
+    def test_serialize_matches_sorted_settings(self):
+        alarms = [self.next_week, self.tomorrow, self.tomorrow_morning]
+        store = AlarmStore(alarms)
+        self.assertEqual(
+            store.serialize(), sorted(alarms, key=lambda a: a["timestamp"])
+        )
+
+    def test_curate_matches_curate_alarms(self):
+        alarms = [
+            self.tomorrow,
+            {
+                "timestamp": _get_timestamp("yesterday at 7pm"),
+                "repeat_rule": RRULE_DAILY,
+                "name": "",
+            },
+            {
+                "timestamp": _get_timestamp("yesterday at 8pm"),
+                "repeat_rule": "",
+                "name": "",
+            },
+        ]
+        store = AlarmStore(alarms)
+        store.curate()
+        self.assertEqual(store.serialize(), curate_alarms(alarms))
+
+    def test_curate_keeps_alarm(self):
+        ringing = {
+            "timestamp": _get_timestamp("yesterday at 7pm"),
+            "repeat_rule": RRULE_DAILY,
+            "name": "",
+        }
+        expired = {
+            "timestamp": _get_timestamp("yesterday at 8pm"),
+            "repeat_rule": "",
+            "name": "",
+        }
+        store = AlarmStore([self.tomorrow, ringing, expired])
+        (ringing_id,) = store.ids_with_rule(RRULE_DAILY)
+        store.curate(keep=ringing)
+        self.assertEqual(store.serialize(), [ringing, self.tomorrow])
+        self.assertIs(store.get(ringing_id), ringing)
@@ -0,0 +1,101 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from os.path import abspath, dirname, join
+from unittest.mock import MagicMock, patch
+
+from lib.display import Image, MouthDisplay, encode_columns
+
+ANIM_DIR = join(dirname(dirname(dirname(abspath(__file__)))), "anim")
+
+
+class TestEncodeColumns(unittest.TestCase):
+    def test_encode_columns(self):
+        columns = [0b01001000, 0b01111100, 0b01000000, 0]
+        self.assertEqual(encode_columns(columns), "EIIEMHAEAA")
+
+
+@unittest.skipIf(Image is None, "PIL is not installed")
+class TestMouthDisplay(unittest.TestCase):
+    def setUp(self):
+        self.enclosure = MagicMock()
+        self.display = MouthDisplay(self.enclosure, ANIM_DIR)
+
+    def test_atlas(self):
+        # Same encoding as the faceplate codes used by the date/time skill
+        self.assertEqual(encode_columns(self.display.atlas["0"]), "EIMHEEMHAA")
+        self.assertEqual(encode_columns(self.display.atlas["1"]), "EIIEMHAEAA")
+        self.assertEqual(encode_columns(self.display.atlas[":"]), "CIICAA")
+
+    def test_show_time_in_tiles(self):
+        self.display.show_time("10:30", 7)
+        calls = self.enclosure.mouth_display.call_args_list
+        # 18 columns are sent as tiles of at most 8 columns
+        self.assertEqual([call[1]["x"] for call in calls], [7, 15, 23])
+        self.assertEqual(calls[0][0][0], "IIIEMHAEAAMHEEMHAA")
+        self.assertEqual(calls[2][0][0], "CIMHAA")
+
+    def test_only_send_changes(self):
+        self.display.show_time("8:00 AM", 3)
+        sent = self.enclosure.mouth_display.call_count
+        self.display.show_time("8:00 AM", 3)
+        self.assertEqual(self.enclosure.mouth_display.call_count, sent)
+
+        self.display.reset()
+        self.enclosure.mouth_reset.assert_called_once()
+        self.display.show_time("8:00 AM", 3)
+        self.assertEqual(self.enclosure.mouth_display.call_count, 2 * sent)
+        self.assertEqual(len(self.display._frames), 1)
+
+    def test_without_pil(self):
+        with patch("lib.display.Image", None):
+            display = MouthDisplay(self.enclosure, ANIM_DIR)
+        display.show_time("1:05", 10)
+        calls = self.enclosure.mouth_display_png.call_args_list
+        self.assertEqual(
+            [(call[0][0], call[1]["x"]) for call in calls],
+            [
+                (join(ANIM_DIR, "1.png"), 10),
+                (join(ANIM_DIR, "colon.png"), 14),
+                (join(ANIM_DIR, "0.png"), 16),
+                (join(ANIM_DIR, "5.png"), 20),
+            ],
+        )
+        self.enclosure.mouth_display.assert_not_called()
+
+    def test_show_frame(self):
+        tiles = [(16, join(ANIM_DIR, "Alarm-5-3.png"))]
+        self.display.add_frame("alarm-5", tiles)
+        self.display.show_frame("alarm-5")
+        # Light pixels are lit, as mouth_display_png(..., invert=True) draws them
+        columns = [4, 4, 4, 8, 148, 236, 24, 0]
+        self.enclosure.mouth_display.assert_called_once_with(
+            encode_columns(columns), x=16, y=0, refresh=False
+        )
+        self.enclosure.mouth_display_png.assert_not_called()
+
+        self.display.show_frame("alarm-5")
+        self.enclosure.mouth_display.assert_called_once()
+
+    def test_show_frame_without_pil(self):
+        tiles = [(8, join(ANIM_DIR, "Alarm-1-2.png"))]
+        with patch("lib.display.Image", None):
+            display = MouthDisplay(self.enclosure, ANIM_DIR)
+            display.add_frame("alarm-1", tiles)
+        display.show_frame("alarm-1")
+        self.enclosure.mouth_display_png.assert_called_once_with(
+            tiles[0][1], x=8, y=0, refresh=False, invert=True
+        )
+        self.enclosure.mouth_display.assert_not_called()
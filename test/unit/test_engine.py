@@ -0,0 +1,220 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from datetime import datetime, timedelta
+from tempfile import TemporaryDirectory
+
+from dateutil.tz import gettz
+
+from lib.engine import AlarmEngine, AlarmNotifier
+from lib.journal import AlarmJournal
+from lib.parse import ParsedUtterance
+
+TZ = gettz("Europe/Berlin")
+RRULE_MONDAYS = "FREQ=WEEKLY;INTERVAL=1;BYDAY=MO"
+
+
+class RecordingNotifier(AlarmNotifier):
+    def __init__(self):
+        self.next_alarms = []
+        self.active = []
+        self.alarms = []
+
+    def next_alarm_changed(self, alarm):
+        self.next_alarms.append(alarm)
+
+    def active_changed(self, active):
+        self.active.append(active)
+
+    def alarms_changed(self, alarms):
+        self.alarms.append(alarms)
+
+
+class TestAlarmEngine(unittest.TestCase):
+    def setUp(self):
+        # Friday
+        self.start = datetime(2021, 3, 12, 8, 0, tzinfo=TZ)
+        self.now = self.start
+        self.notifier = RecordingNotifier()
+        self.engine = AlarmEngine(clock=lambda: self.now, notifier=self.notifier)
+
+    def _at(self, **kwargs):
+        return self.start + timedelta(**kwargs)
+
+    def test_create(self):
+        alarm = self.engine.create(self._at(hours=1, seconds=30), "tea")
+        self.assertEqual(alarm["timestamp"], self._at(hours=1).timestamp())
+        self.assertEqual(alarm["name"], "tea")
+        self.assertEqual(self.engine.next_alarm(), alarm)
+        self.assertIsNone(self.engine.create(self._at(hours=1), "tea"))
+        self.assertEqual(len(self.engine), 1)
+
+    def test_create_recurring_uses_clock(self):
+        alarm = self.engine.create(self._at(hours=-1), repeat={"1"})
+        self.assertEqual(alarm["repeat_rule"], RRULE_MONDAYS)
+        monday = datetime(2021, 3, 15, 7, 0, tzinfo=TZ)
+        self.assertEqual(alarm["timestamp"], monday.timestamp())
+
+    def test_notifications(self):
+        first = self.engine.create(self._at(hours=2))
+        second = self.engine.create(self._at(hours=1))
+        self.engine.create(self._at(hours=3))
+        self.assertEqual(self.notifier.next_alarms, [first, second])
+        self.assertEqual(self.notifier.active, [True])
+
+        self.engine.delete_all()
+        self.assertEqual(self.notifier.next_alarms, [first, second, None])
+        self.assertEqual(self.notifier.active, [True, False])
+        self.assertFalse(self.engine.delete_all())
+
+    def test_expire_snooze_and_stop(self):
+        alarm = self.engine.create(self._at(minutes=1), repeat={"5"})
+        self.assertFalse(self.engine.has_expired())
+        self.assertIsNone(self.engine.snooze(9))
+
+        self.now = self._at(minutes=1)
+        self.assertEqual(self.engine.ring(), alarm)
+        self.assertTrue(self.engine.has_expired())
+        snoozed = self.engine.snooze(9)
+        self.assertEqual(snoozed["timestamp"], alarm["timestamp"] + 9 * 60)
+        self.assertEqual(snoozed["snooze"], alarm["timestamp"])
+        self.assertFalse(self.engine.has_expired())
+
+        self.now = self._at(minutes=10, seconds=30)
+        self.assertEqual(self.engine.ring(), snoozed)
+        self.assertTrue(self.engine.stop_expired())
+        self.assertFalse(self.engine.stop_expired())
+        # Repeats a week later
+        next_alarm = self.engine.next_alarm()
+        self.assertEqual(next_alarm["timestamp"], alarm["timestamp"] + 7 * 86400)
+        self.assertNotIn("snooze", next_alarm)
+        self.assertEqual(self.notifier.next_alarms[-1], next_alarm)
+
+    def test_ringing_does_not_read_the_clock(self):
+        self.engine.create(self._at(minutes=1))
+        self.engine.create(self._at(minutes=2))
+        self.now = self._at(minutes=5)
+        self.assertFalse(self.engine.has_expired())
+
+        self.engine.ring()
+        self.engine.clock = None
+        self.assertTrue(self.engine.has_expired())
+
+    def test_ringing_alarm_is_not_curated(self):
+        alarm = self.engine.create(self._at(minutes=1), repeat={"5"})
+        self.now = self._at(minutes=1)
+        self.engine.ring()
+        self.now = self._at(minutes=3)
+        self.engine.create(self._at(hours=1))
+        self.assertEqual(self.engine.next_alarm(), alarm)
+
+        snoozed = self.engine.snooze(9)
+        self.assertEqual(len(self.engine), 2)
+        self.assertEqual(self.engine.next_alarm(), snoozed)
+        self.assertEqual(snoozed["timestamp"], alarm["timestamp"] + 9 * 60)
+
+    def test_deleting_ringing_alarm(self):
+        alarm = self.engine.create(self._at(minutes=1))
+        later = self.engine.create(self._at(minutes=2))
+        self.assertIsNone(AlarmEngine().ring())
+
+        self.engine.ring()
+        self.engine.delete([later])
+        self.assertTrue(self.engine.has_expired())
+        self.engine.delete([alarm])
+        self.assertFalse(self.engine.has_expired())
+
+        self.engine.create(self._at(minutes=3))
+        self.engine.ring()
+        self.engine.delete_all()
+        self.assertFalse(self.engine.has_expired())
+
+    def test_match_by_name(self):
+        self.engine.create(self._at(hours=1), "tea")
+        laundry = self.engine.create(self._at(hours=2), "laundry")
+        match = self.engine.match(ParsedUtterance("cancel the laundry alarm"))
+        self.assertEqual(match.alarms, [laundry])
+        self.assertEqual(match.candidate_count, 2)
+        self.assertIsNone(match.when)
+
+    def test_match_without_alarms(self):
+        self.assertIsNone(self.engine.match(ParsedUtterance("cancel the alarm")))
+
+    def test_match_skips_removed_ids(self):
+        tea = self.engine.create(self._at(hours=1), "tea")
+        alarm_ids = self.engine.alarms.ids()
+        self.engine.delete([tea])
+        self.assertIsNone(self.engine.match(ParsedUtterance("tea"), alarm_ids))
+
+    def test_storage(self):
+        with TemporaryDirectory() as path:
+            migrated = [
+                {
+                    "timestamp": self._at(hours=1).timestamp(),
+                    "repeat_rule": "",
+                    "name": "",
+                }
+            ]
+            engine = AlarmEngine(
+                AlarmJournal(path), clock=lambda: self.now, alarms=migrated
+            )
+            alarm = engine.create(self._at(hours=2), "tea")
+            engine.close()
+
+            engine = AlarmEngine(AlarmJournal(path), clock=lambda: self.now)
+            self.assertEqual(engine.alarms.serialize(), migrated + [alarm])
+            engine.close()
+
+    def test_alarms_round_trip_through_settings(self):
+        # The Skill keeps a copy of the alarms in settings["alarm"]
+        settings = {"alarm": []}
+        with TemporaryDirectory() as path:
+            engine = AlarmEngine(
+                AlarmJournal(path),
+                clock=lambda: self.now,
+                notifier=self.notifier,
+                alarms=settings["alarm"],
+            )
+            tea = engine.create(self._at(hours=1), "tea")
+            settings["alarm"] = list(self.notifier.alarms[-1])
+            engine.close()
+        self.assertEqual(settings["alarm"], [tea])
+
+        # A journal that was lost, e.g. after a downgrade, is rebuilt from them
+        with TemporaryDirectory() as path:
+            engine = AlarmEngine(
+                AlarmJournal(path), clock=lambda: self.now, alarms=settings["alarm"]
+            )
+            self.assertEqual(engine.alarms.serialize(), [tea])
+            engine.close()
+
+    def test_independent_engines(self):
+        engines = [
+            AlarmEngine(clock=lambda: self.now, notifier=RecordingNotifier())
+            for _ in range(1000)
+        ]
+        for minutes, engine in enumerate(engines, 1):
+            engine.create(self._at(minutes=minutes))
+        self.now = self._at(minutes=500, seconds=30)
+        for engine in engines:
+            if engine.next_alarm()["timestamp"] <= self.now.timestamp():
+                engine.ring()
+        expired = [engine for engine in engines if engine.has_expired()]
+        self.assertEqual(len(expired), 500)
+        for engine in expired:
+            engine.stop_expired()
+        self.assertEqual(sum(len(engine) for engine in engines), 500)
+        self.assertEqual(len(engines[0]), 0)
+        self.assertEqual(len(engines[-1].notifier.next_alarms), 1)
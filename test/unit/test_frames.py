@@ -0,0 +1,65 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import unittest
+from threading import Event
+
+from lib.frames import FrameScheduler
+
+
+class TestFrameScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = FrameScheduler()
+        self.drawn = []
+        self.done = Event()
+
+    def frame(self, name):
+        return lambda: self.drawn.append((name, time.monotonic()))
+
+    def test_plays_frames_in_background(self):
+        start = time.monotonic()
+        self.scheduler.play(
+            [(0.0, self.frame("a")), (0.05, self.frame("b")), (0.1, self.frame("c"))],
+            on_done=self.done.set,
+        )
+        # play() returns right away
+        self.assertLess(time.monotonic() - start, 0.05)
+        self.assertTrue(self.scheduler.is_running)
+        self.assertTrue(self.done.wait(5))
+
+        self.assertEqual([name for name, _ in self.drawn], ["a", "b", "c"])
+        self.assertGreaterEqual(self.drawn[2][1] - start, 0.1)
+        stats = self.scheduler.stats()
+        self.assertEqual(stats["frames"], 3)
+        self.assertGreaterEqual(stats["max_lateness_ms"], stats["mean_lateness_ms"])
+
+    def test_cancel(self):
+        self.scheduler.play(
+            [(0.0, self.frame("a")), (10.0, self.frame("b"))], on_done=self.done.set
+        )
+        while not self.drawn:
+            time.sleep(0.01)
+        start = time.monotonic()
+        self.scheduler.cancel()
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertTrue(self.done.is_set())
+        self.assertFalse(self.scheduler.is_running)
+        self.assertEqual([name for name, _ in self.drawn], ["a"])
+
+    def test_play_replaces_animation(self):
+        self.scheduler.play([(10.0, self.frame("old"))])
+        self.scheduler.play([(0.0, self.frame("new"))], on_done=self.done.set)
+        self.assertTrue(self.done.wait(5))
+        self.assertEqual([name for name, _ in self.drawn], ["new"])
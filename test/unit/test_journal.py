@@ -0,0 +1,101 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from lib.alarm import AlarmStore
+from lib.journal import AlarmJournal
+
+RRULE_DAILY = "FREQ=WEEKLY;INTERVAL=1;BYDAY=SU,SA,WE,MO,FR,TH,TU"
+
+
+def _alarm(timestamp, name="", repeat_rule=""):
+    return {"timestamp": timestamp, "repeat_rule": repeat_rule, "name": name}
+
+
+class TestAlarmJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.path = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _reload(self):
+        journal = AlarmJournal(self.path)
+        self.assertTrue(journal.exists())
+        return journal.load()
+
+    def test_replay_changes(self):
+        journal = AlarmJournal(self.path)
+        self.assertFalse(journal.exists())
+        journal.compact([_alarm(4000000000.0)])
+        store = AlarmStore(journal.load(), journal)
+        store.add(_alarm(4000000100.0, "wake up"))
+        store.add(_alarm(4000000200.0, repeat_rule=RRULE_DAILY))
+        store.remove(_alarm(4000000000.0))
+        snoozed = dict(_alarm(4000000700.0, "wake up"), snooze=4000000100.0)
+        store.snooze(_alarm(4000000100.0, "wake up"), snoozed)
+        store.sync()
+        journal.close()
+
+        self.assertEqual(self._reload(), store.serialize())
+
+    def test_clear(self):
+        journal = AlarmJournal(self.path)
+        store = AlarmStore([], journal)
+        store.add(_alarm(4000000000.0))
+        store.clear()
+        store.add(_alarm(4000000100.0))
+        journal.close()
+
+        self.assertEqual(self._reload(), [_alarm(4000000100.0)])
+
+    def test_incomplete_record_is_ignored(self):
+        journal = AlarmJournal(self.path)
+        store = AlarmStore([], journal)
+        store.add(_alarm(4000000000.0))
+        journal.close()
+        with open(join(self.path, AlarmJournal.JOURNAL_FILE), "a") as f:
+            f.write('{"op": "create", "alarm": {"timest')
+
+        self.assertEqual(self._reload(), [_alarm(4000000000.0)])
+
+    def test_compaction(self):
+        journal = AlarmJournal(self.path, compact_every=4)
+        store = AlarmStore([], journal)
+        for idx in range(10):
+            store.add(_alarm(4000000000.0 + idx))
+            store.sync()
+        self.assertLessEqual(journal.record_count, len(store) + 4)
+        journal.close()
+
+        self.assertEqual(self._reload(), store.serialize())
+
+    def test_journal_of_older_snapshot_is_ignored(self):
+        journal = AlarmJournal(self.path)
+        store = AlarmStore([], journal)
+        store.add(_alarm(4000000000.0))
+        journal.close()
+        with open(join(self.path, AlarmJournal.JOURNAL_FILE)) as f:
+            stale_journal = f.read()
+
+        # Compaction interrupted before the journal was emptied
+        journal.compact(store.serialize())
+        with open(join(self.path, AlarmJournal.JOURNAL_FILE), "w") as f:
+            f.write(stale_journal)
+
+        self.assertEqual(self._reload(), [_alarm(4000000000.0)])
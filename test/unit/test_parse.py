@@ -12,12 +12,46 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import random
+import re
 import unittest
-from datetime import datetime
+from datetime import datetime, timedelta
+from tempfile import TemporaryDirectory
 
-from lib.parse import fuzzy_match, utterance_has_midnight
+from unittest.mock import patch
+
+from dateutil.tz import gettz
+from mycroft.util.format import expand_options
+from mycroft.util.parse import extract_datetime, extract_number
+
+from lib.parse import (
+    ExtractionCache,
+    NameIndex,
+    ParsedUtterance,
+    ReferenceTime,
+    RegexFileCache,
+    VocabMatcher,
+    fuzzy_match,
+    utterance_has_midnight,
+)
 
 THRESHOLD = 0.7
+VOCAB_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "vocab",
+)
+
+
+def voc_match(utterance, voc_file):
+    """Match a .voc file the way MycroftSkill.voc_match() does."""
+    vocab = []
+    with open(voc_file, encoding="utf8") as vocab_file:
+        for line in vocab_file.readlines():
+            if line.startswith("#") or line.strip() == "":
+                continue
+            vocab.extend(expand_options(line.lower()))
+    return any(re.match(r".*\b" + phrase + r"\b.*", utterance) for phrase in vocab)
 
 
 class TestFuzzyMatch(unittest.TestCase):
@@ -27,6 +61,72 @@ class TestFuzzyMatch(unittest.TestCase):
         )
 
 
+class TestNameIndex(unittest.TestCase):
+    NAMES = ["wake up", "medicine", "take out the trash", "gym", "call mom", "a"]
+
+    def test_match_agrees_with_fuzzy_match(self):
+        index = NameIndex()
+        for name in self.NAMES:
+            index.add(name)
+        for utt in [
+            "cancel my wake up alarm",
+            "delete the medecine alarm",
+            "cancel the alarm to take out the trash",
+            "when is my jim alarm",
+            "cancel all alarms",
+        ]:
+            expected = {
+                name for name in self.NAMES if fuzzy_match(name, utt, THRESHOLD)
+            }
+            self.assertEqual(index.match(utt, THRESHOLD), expected)
+
+    def test_match_equals_full_scan(self):
+        rand = random.Random(1)
+        letters = "abcdefghijklmnopqrstuvwxyz"
+
+        def random_word():
+            return "".join(rand.choice(letters) for _ in range(rand.randint(1, 9)))
+
+        def typo(name):
+            chars = list(name)
+            for _ in range(rand.randint(1, 4)):
+                idx = rand.randrange(len(chars) + 1)
+                chars[idx:idx] = rand.choice(["", rand.choice(letters + " ")])
+                if rand.random() < 0.5 and idx < len(chars):
+                    del chars[idx]
+            return "".join(chars)
+
+        for _ in range(30):
+            names = [
+                " ".join(random_word() for _ in range(rand.randint(1, 3)))
+                for _ in range(20)
+            ]
+            index = NameIndex()
+            for name in names:
+                index.add(name)
+            for name in rand.sample(names, 5):
+                utt = "delete the {} alarm".format(typo(name))
+                for threshold in (0.5, THRESHOLD):
+                    expected = {n for n in names if fuzzy_match(n, utt, threshold)}
+                    self.assertEqual(index.match(utt, threshold), expected, utt)
+
+    def test_remove(self):
+        index = NameIndex()
+        index.add("gym")
+        index.add("gym")
+        index.remove("gym")
+        self.assertEqual(index.candidates("gym alarm", THRESHOLD), {"gym"})
+        index.remove("gym")
+        self.assertEqual(index.candidates("gym alarm", THRESHOLD), set())
+        self.assertEqual(len(index), 0)
+
+    def test_candidates_by_length(self):
+        index = NameIndex()
+        for name in ["gym", "take out the trash", "a"]:
+            index.add(name)
+        self.assertEqual(index.candidates("gym alarm", THRESHOLD), {"gym"})
+
+
 class TestUtteranceHasMidnight(unittest.TestCase):
     def test_utterance_has_midnight(self):
         midnight_datetime = datetime(2021, 3, 10, 0, 0, 0)
@@ -37,3 +137,241 @@ class TestUtteranceHasMidnight(unittest.TestCase):
                 threshold=THRESHOLD,
             )
         )
+
+
+class TestRegexFileCache(unittest.TestCase):
+    def test_reload_on_change(self):
+        with TemporaryDirectory() as tmp_dir:
+            rx_file = os.path.join(tmp_dir, "name.rx")
+            with open(rx_file, "w") as f:
+                f.write("# comment\n^set an? (?P<Name>.*) alarm$\n")
+            cache = RegexFileCache()
+            patterns = cache.get(rx_file)
+            self.assertEqual(len(patterns), 1)
+            self.assertEqual(
+                patterns[0].search("set a wake up alarm").group("Name"), "wake up"
+            )
+            self.assertIs(cache.get(rx_file), patterns)
+
+            with open(rx_file, "a") as f:
+                f.write("^.*alarm.* (called|named) (?P<Name>.*)$\n")
+            mtime = os.stat(rx_file).st_mtime
+            os.utime(rx_file, (mtime + 1, mtime + 1))
+            self.assertEqual(len(cache.get(rx_file)), 2)
+
+    def test_missing_file(self):
+        self.assertEqual(RegexFileCache().get("/nonexistent/name.rx"), [])
+
+
+class TestVocabMatcher(unittest.TestCase):
+    def test_match(self):
+        with TemporaryDirectory() as tmp_dir:
+            os.makedirs(os.path.join(tmp_dir, "en-us"))
+            os.makedirs(os.path.join(tmp_dir, "ca-es"))
+            os.makedirs(os.path.join(tmp_dir, "de-de"))
+            with open(os.path.join(tmp_dir, "en-us", "StopBeeping.voc"), "w") as f:
+                f.write("# comment\nStop\nshut up\n")
+            with open(os.path.join(tmp_dir, "ca-es", "StopBeeping.voc"), "w") as f:
+                f.write("(apaga|desactiva)(-la|-ho|)\n")
+            with open(os.path.join(tmp_dir, "de-de", "StopBeeping.voc"), "w") as f:
+                f.write("# only a comment\n")
+            matcher = VocabMatcher(tmp_dir, "StopBeeping")
+
+        self.assertIn("en-US", matcher)
+        self.assertNotIn("de-de", matcher)
+        self.assertTrue(matcher.match("please stop", "en-us"))
+        self.assertTrue(matcher.match("shut up now", "en-us"))
+        self.assertFalse(matcher.match("unstoppable", "en-us"))
+        self.assertFalse(matcher.match("shut the door", "en-us"))
+        self.assertFalse(matcher.match("", "en-us"))
+        self.assertTrue(matcher.match("apaga-la", "ca-es"))
+        self.assertTrue(matcher.match("desactiva", "ca-es"))
+        self.assertFalse(matcher.match("stop", "fr-fr"))
+
+    def test_matches_voc_match(self):
+        matcher = VocabMatcher(VOCAB_DIR, "StopBeeping")
+        for lang in sorted(os.listdir(VOCAB_DIR)):
+            voc_file = os.path.join(VOCAB_DIR, lang, "StopBeeping.voc")
+            if not os.path.isfile(voc_file):
+                self.assertNotIn(lang, matcher)
+                continue
+            self.assertIn(lang, matcher)
+            with open(voc_file, encoding="utf8") as vocab_file:
+                words = vocab_file.read().lower().split()
+            utterances = ["set an alarm for 7 am", "what time is it", ""]
+            for word in words:
+                utterances.extend(
+                    [word, "please " + word + " now", word + "x", "x" + word]
+                )
+            for utterance in utterances:
+                self.assertEqual(
+                    matcher.match(utterance, lang),
+                    voc_match(utterance, voc_file),
+                    "{}: {!r}".format(lang, utterance),
+                )
+
+    def test_missing_directory(self):
+        matcher = VocabMatcher("/nonexistent/vocab", "StopBeeping")
+        self.assertNotIn("en-us", matcher)
+
+
+class TestParsedUtterance(unittest.TestCase):
+    RECURRENCE_DICT = {"weekdays": "1 2 3 4 5", "mondays": "1"}
+
+    def test_fields(self):
+        parsed = ParsedUtterance(
+            "set a wake up alarm for 7 am on weekdays",
+            recurrence_dict=self.RECURRENCE_DICT,
+            name_extractor=lambda utt: "wake up" if "wake up" in utt else "",
+        )
+        self.assertEqual((parsed.when.hour, parsed.when.minute), (7, 0))
+        self.assertNotIn("7", parsed.remainder)
+        self.assertEqual(parsed.name, "wake up")
+        self.assertEqual(parsed.recurrence, {"1", "2", "3", "4", "5"})
+        self.assertFalse(parsed.is_midnight)
+
+    def test_without_datetime(self):
+        parsed = ParsedUtterance("cancel the second alarm")
+        self.assertIsNone(parsed.when)
+        self.assertEqual(parsed.remainder, "cancel the second alarm")
+        self.assertEqual(parsed.number, 2)
+        self.assertEqual(parsed.name, "")
+        self.assertEqual(parsed.recurrence, set())
+
+    def test_midnight(self):
+        parsed = ParsedUtterance("set an alarm for midnight", threshold=THRESHOLD)
+        self.assertTrue(parsed.is_midnight)
+
+    def test_fields_are_extracted_once(self):
+        parsed = ParsedUtterance("delete the alarm at 8 pm")
+        with patch(
+            "lib.parse.extract_datetime", return_value=[datetime(2021, 3, 10, 20), ""]
+        ) as extract:
+            for _ in range(3):
+                parsed.when
+                parsed.remainder
+                parsed.is_midnight
+        self.assertEqual(extract.call_count, 1)
+
+    def test_timer(self):
+        timings = []
+        parsed = ParsedUtterance(
+            "set a wake up alarm for 7 am",
+            name_extractor=lambda utt: "wake up",
+            timer=lambda field, seconds: timings.append((field, seconds)),
+        )
+        parsed.name
+        parsed.when
+        # The name depends on the datetime, which is timed on its own
+        self.assertEqual([field for field, _ in timings], ["datetime", "name"])
+        self.assertTrue(all(seconds >= 0 for _, seconds in timings))
+
+
+class TestReferenceTime(unittest.TestCase):
+    def setUp(self):
+        self.now = datetime(2021, 3, 27, 22, 30, tzinfo=gettz("Europe/Berlin"))
+        self.reference = ReferenceTime(clock=lambda: self.now)
+
+    def test_today_is_midnight(self):
+        today = self.reference.today()
+        self.assertEqual(today, datetime(2021, 3, 27, tzinfo=gettz("Europe/Berlin")))
+        self.assertIs(self.reference.today(), today)
+
+    def test_rollover_at_midnight(self):
+        today = self.reference.today()
+        self.now = self.now + timedelta(hours=1, minutes=29)
+        self.assertIs(self.reference.today(), today)
+        self.now = datetime.fromtimestamp(
+            self.now.timestamp() + 60, gettz("Europe/Berlin")
+        )
+        self.assertEqual(
+            self.reference.today(), datetime(2021, 3, 28, tzinfo=gettz("Europe/Berlin"))
+        )
+
+    def test_timezone_change(self):
+        self.reference.today()
+        self.now = self.now.astimezone(gettz("America/New_York"))
+        self.assertEqual(
+            self.reference.today(),
+            datetime(2021, 3, 27, tzinfo=gettz("America/New_York")),
+        )
+
+
+class TestExtractionCache(unittest.TestCase):
+    UTTERANCES = [
+        "set an alarm for 7 am",
+        "cancel my alarm tomorrow at 8:30 pm",
+        "delete the second alarm",
+        "snooze for 15 minutes",
+        "set an alarm for 20 seconds from now",
+        "when is my wake up alarm",
+    ]
+
+    def setUp(self):
+        self.now = datetime(2021, 3, 10, 12, 0, 15, tzinfo=gettz("UTC"))
+        self.cache = ExtractionCache(size=4, clock=lambda: self.now)
+
+    def test_matches_uncached_results(self):
+        self.now = self.now.replace(second=0)
+        for utt in self.UTTERANCES:
+            for _ in range(2):
+                cached = self.cache.extract_datetime(utt)
+                expected = extract_datetime(utt, anchorDate=self.now)
+                self.assertEqual(cached and list(cached), expected)
+                self.now += timedelta(seconds=5)
+            for ordinals in (False, True):
+                self.assertEqual(
+                    self.cache.extract_number(utt, ordinals=ordinals),
+                    extract_number(utt, ordinals=ordinals),
+                )
+        # The repeated utterances were found although the clock had moved
+        self.assertEqual(self.cache.info()["hits"], len(self.UTTERANCES))
+
+    def test_hits_and_eviction(self):
+        with patch("lib.parse.extract_number", return_value=2) as extract:
+            for utt in ["one", "two", "three", "four", "One", "five", "two"]:
+                self.cache.extract_number(utt)
+            self.cache.extract_number("one ")
+        self.assertEqual(extract.call_count, 6)
+        self.assertEqual(
+            self.cache.info(), {"hits": 2, "misses": 6, "size": 4, "maxsize": 4}
+        )
+
+    def test_absolute_result(self):
+        at_seven = [datetime(2021, 3, 10, 19, 0, tzinfo=gettz("UTC")), ""]
+        with patch("lib.parse.extract_datetime", return_value=at_seven) as extract:
+            self.cache.extract_datetime("at 7 pm")
+            self.assertEqual(extract.call_count, 2)
+            self.now += timedelta(seconds=30)
+            self.assertEqual(self.cache.extract_datetime("at 7 pm")[0], at_seven[0])
+            self.assertEqual(extract.call_count, 2)
+            self.now += timedelta(seconds=30)
+            self.cache.extract_datetime("at 7 pm")
+            self.assertEqual(extract.call_count, 4)
+
+    def test_relative_result(self):
+        # On second 0 a relative result looks like an absolute time
+        self.now = self.now.replace(second=0)
+
+        def extract(text, anchorDate=None, lang=None):
+            return [anchorDate + timedelta(minutes=5), "set an alarm"]
+
+        with patch("lib.parse.extract_datetime", side_effect=extract) as mock:
+            first = self.cache.extract_datetime("in 5 minutes")
+            self.now += timedelta(seconds=20)
+            second = self.cache.extract_datetime("in 5 minutes")
+            self.now += timedelta(hours=1)
+            third = self.cache.extract_datetime("in 5 minutes")
+        self.assertEqual(mock.call_count, 2)
+        self.assertEqual(second[0] - first[0], timedelta(seconds=20))
+        self.assertEqual(third, (self.now + timedelta(minutes=5), "set an alarm"))
+
+    def test_result_changing_otherwise_is_not_cached(self):
+        def extract(text, anchorDate=None, lang=None):
+            return [anchorDate.replace(second=0) + timedelta(days=1), ""]
+
+        self.now = self.now.replace(second=59)
+        with patch("lib.parse.extract_datetime", side_effect=extract) as mock:
+            self.cache.extract_datetime("tomorrow")
+            self.cache.extract_datetime("tomorrow")
+        self.assertEqual(mock.call_count, 4)
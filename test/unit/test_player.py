@@ -0,0 +1,149 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import time
+import wave
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+from threading import Event
+from unittest.mock import MagicMock, patch
+
+from lib.player import AlarmPlayer
+
+# Stand-in for mpg123 that logs the remote commands it receives
+FAKE_PLAYER = """
+import sys
+with open(sys.argv[1], "a") as log:
+    for line in sys.stdin:
+        log.write(line)
+        log.flush()
+        if line.strip() == "QUIT":
+            break
+"""
+
+
+class TestAlarmPlayer(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.log_file = join(self.tmp_dir.name, "commands.log")
+        self.player = AlarmPlayer([sys.executable, "-c", FAKE_PLAYER, self.log_file])
+
+    def tearDown(self):
+        self.player.close()
+        self.tmp_dir.cleanup()
+
+    def commands(self):
+        with open(self.log_file) as log:
+            return log.read().splitlines()
+
+    def wait_for(self, count):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            try:
+                if len(self.commands()) >= count:
+                    return
+            except FileNotFoundError:
+                pass
+            time.sleep(0.01)
+
+    def test_plays_with_one_process(self):
+        for _ in range(3):
+            self.player.play("/sounds/bell.mp3")
+            self.wait_for(1)
+            process = self.player._process
+        self.wait_for(3)
+        self.assertIs(self.player._process, process)
+        self.player.stop()
+        self.wait_for(4)
+        self.assertEqual(self.commands(), ["LOAD /sounds/bell.mp3"] * 3 + ["STOP"])
+
+    def test_stop_skips_queued_sounds(self):
+        with self.player._lock:
+            self.player.play("/sounds/bell.mp3")
+            self.player.play("/sounds/chimes.mp3")
+            self.player._generation += 1
+        self.player.play("/sounds/escalate.mp3")
+        self.wait_for(1)
+        self.assertEqual(self.commands(), ["LOAD /sounds/escalate.mp3"])
+
+    def test_volume_and_close(self):
+        self.player.set_volume(30)
+        self.player.play("/sounds/bell.mp3")
+        self.wait_for(2)
+        self.player.set_volume(60)
+        self.player.close()
+        self.assertIsNone(self.player._process)
+        self.assertEqual(
+            self.commands(),
+            ["VOLUME 30", "LOAD /sounds/bell.mp3", "VOLUME 60", "STOP", "QUIT"],
+        )
+
+    def test_on_start(self):
+        started = Event()
+        self.player.play("/sounds/bell.mp3", on_start=started.set)
+        self.assertTrue(started.wait(5))
+        self.wait_for(1)
+        self.assertEqual(self.commands(), ["LOAD /sounds/bell.mp3"])
+
+    def test_fallback_to_play_mp3(self):
+        player = AlarmPlayer(["/nonexistent/mpg123"])
+        process = MagicMock()
+        process.poll.return_value = None
+        with patch("lib.player.play_mp3", return_value=process) as play_mp3:
+            player.play("/sounds/bell.mp3")
+            player.play("/sounds/bell.mp3")
+            while play_mp3.call_count < 2:
+                time.sleep(0.01)
+            player.stop()
+        play_mp3.assert_called_with("/sounds/bell.mp3")
+        process.kill.assert_called()
+        player.close()
+
+    def test_wav_without_alsa(self):
+        wav_file = join(self.tmp_dir.name, "bell.wav")
+        with wave.open(wav_file, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(8000)
+            wav.writeframes(bytes(1600))
+        with patch("lib.player.alsaaudio", None):
+            with patch("lib.player.play_wav") as play_wav:
+                self.player.play(wav_file)
+                while not play_wav.called:
+                    time.sleep(0.01)
+                self.player.stop()
+        play_wav.assert_called_once_with(wav_file)
+        self.assertIsNone(self.player._process)
+
+    def test_wav_through_pcm(self):
+        wav_file = join(self.tmp_dir.name, "bell.wav")
+        with wave.open(wav_file, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(8000)
+            wav.writeframes(bytes(range(256)) * 20)
+        alsaaudio = MagicMock()
+        pcm = alsaaudio.PCM.return_value
+        with patch("lib.player.alsaaudio", alsaaudio):
+            self.player.play(wav_file)
+            self.player.play(wav_file)
+            while pcm.write.call_count < 6:
+                time.sleep(0.01)
+            self.player.stop()
+        alsaaudio.PCM.assert_called_once()
+        pcm.setrate.assert_called_once_with(8000)
+        written = b"".join(call[0][0] for call in pcm.write.call_args_list[:3])
+        self.assertEqual(written, bytes(range(256)) * 20)
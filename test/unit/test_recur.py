@@ -13,7 +13,10 @@
 # limitations under the License.
 
 import unittest
+from datetime import datetime, timedelta
 
+from dateutil.rrule import rrulestr
+from dateutil.tz import gettz
 from lingua_franca import set_default_lang
 from mycroft.util.parse import extract_datetime
 
@@ -22,6 +25,11 @@ from lib.recur import (
     create_recurring_rule,
     describe_recurrence,
     describe_repeat_rule,
+    get_day_mask,
+    get_next_occurrence,
+    get_next_weekly_occurrence,
+    get_repeat_rule,
+    get_repeat_rule_cache_info,
 )
 
 set_default_lang("en-us")
@@ -80,3 +88,71 @@ class TestDescribeRepeatRule(unittest.TestCase):
         )
         weekday_description = describe_repeat_rule(RRULE_WEEKDAYS, RECURRENCE_DICT)
         self.assertEqual(weekday_description, "weekdays")
+
+
+class TestGetRepeatRule(unittest.TestCase):
+    def test_cached_rule_matches_parsed_rule(self):
+        start = extract_datetime("last monday at 7am")[0]
+        now = extract_datetime("now")[0]
+        for rule in [RRULE_DAILY, RRULE_MONDAYS, RRULE_WEEKDAYS]:
+            for days in range(0, 10):
+                dtstart = start + timedelta(days=days, minutes=days)
+                self.assertEqual(
+                    get_repeat_rule(rule, dtstart).after(now),
+                    rrulestr("RRULE:" + rule, dtstart=dtstart).after(now),
+                )
+
+    def test_cache_hits(self):
+        start = extract_datetime("last monday at 7am")[0]
+        get_repeat_rule(RRULE_MONDAYS, start)
+        hits = get_repeat_rule_cache_info()["hits"]
+        get_repeat_rule(RRULE_MONDAYS, start + timedelta(days=1))
+        self.assertEqual(get_repeat_rule_cache_info()["hits"], hits + 1)
+
+
+class TestGetNextOccurrence(unittest.TestCase):
+    def test_get_day_mask(self):
+        self.assertEqual(get_day_mask(RRULE_MONDAYS), 0b0000010)
+        self.assertEqual(get_day_mask(RRULE_WEEKDAYS), 0b0111110)
+        self.assertEqual(get_day_mask(RRULE_DAILY), 0b1111111)
+        self.assertIsNone(get_day_mask("FREQ=DAILY;INTERVAL=1"))
+        self.assertIsNone(get_day_mask(""))
+
+    def test_weekly_matches_dateutil(self):
+        tz = gettz("Europe/Berlin")
+        dtstart = datetime(2021, 1, 4, 7, 30, tzinfo=tz)
+        for rule in [RRULE_DAILY, RRULE_MONDAYS, RRULE_WEEKDAYS]:
+            repeat_rule = rrulestr("RRULE:" + rule, dtstart=dtstart)
+            for hours in range(0, 24 * 21, 5):
+                after = dtstart + timedelta(hours=hours)
+                self.assertEqual(
+                    get_next_weekly_occurrence(dtstart, get_day_mask(rule), after),
+                    repeat_rule.after(after),
+                )
+
+    def test_weekly_keeps_local_time_across_dst(self):
+        tz = gettz("America/New_York")
+        # DST starts on Sunday 2021-03-14
+        dtstart = datetime(2021, 3, 8, 7, 0, tzinfo=tz)
+        after = datetime(2021, 3, 13, 12, 0, tzinfo=tz)
+        next_occurrence = get_next_occurrence(RRULE_MONDAYS, dtstart, after)
+        self.assertEqual(
+            next_occurrence.timestamp(),
+            datetime(2021, 3, 15, 11, 0, tzinfo=gettz("UTC")).timestamp(),
+        )
+        self.assertEqual(next_occurrence.hour, 7)
+
+    def test_dtstart_in_the_future(self):
+        tz = gettz("UTC")
+        dtstart = datetime(2021, 3, 15, 7, 0, tzinfo=tz)
+        after = datetime(2021, 3, 1, 7, 0, tzinfo=tz)
+        self.assertEqual(get_next_occurrence(RRULE_MONDAYS, dtstart, after), dtstart)
+
+    def test_other_rules_use_dateutil(self):
+        tz = gettz("UTC")
+        dtstart = datetime(2021, 3, 1, 7, 0, tzinfo=tz)
+        after = datetime(2021, 3, 2, 7, 0, tzinfo=tz)
+        self.assertEqual(
+            get_next_occurrence("FREQ=DAILY;INTERVAL=3", dtstart, after),
+            datetime(2021, 3, 4, 7, 0, tzinfo=tz),
+        )
@@ -0,0 +1,95 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import unittest
+from threading import Event
+from unittest.mock import MagicMock
+
+from lib.ringing import AlarmRinger
+
+
+class TestAlarmRinger(unittest.TestCase):
+    def setUp(self):
+        self.player = MagicMock()
+        self.ringer = AlarmRinger(self.player)
+        self.timed_out = Event()
+
+    def tearDown(self):
+        self.ringer.stop()
+
+    def test_ring_until_timeout(self):
+        on_repeat = MagicMock()
+        on_flash = MagicMock()
+        self.ringer.start(
+            "bell.wav",
+            0.2,
+            0.5,
+            on_repeat=on_repeat,
+            on_flash=on_flash,
+            flash_interval=0.02,
+            on_timeout=self.timed_out.set,
+        )
+        self.assertTrue(self.ringer.is_ringing)
+        self.assertTrue(self.timed_out.wait(5))
+
+        self.assertEqual(self.player.play.call_count, 3)
+        self.player.play.assert_called_with("bell.wav")
+        self.assertEqual(on_repeat.call_count, 3)
+        self.assertGreater(on_flash.call_count, 10)
+        self.player.stop.assert_called()
+        self.assertFalse(self.ringer.is_ringing)
+
+    def test_stop(self):
+        on_flash = MagicMock()
+        self.ringer.start(
+            "bell.wav", 10, 10, on_flash=on_flash, on_timeout=self.timed_out.set
+        )
+        while not self.player.play.called:
+            time.sleep(0.01)
+        self.ringer.stop()
+        self.assertFalse(self.ringer.is_ringing)
+        self.player.stop.assert_called()
+        self.assertEqual(self.player.play.call_count, 1)
+        self.assertEqual(on_flash.call_count, 1)
+        self.assertFalse(self.timed_out.is_set())
+
+    def test_stop_from_callback(self):
+        self.ringer.start("bell.wav", 10, 10, on_repeat=self.ringer.stop)
+        while self.ringer.is_ringing:
+            time.sleep(0.01)
+        self.player.play.assert_not_called()
+
+    def test_sleeps_without_flash(self):
+        clock = MagicMock(side_effect=time.monotonic)
+        ringer = AlarmRinger(self.player, clock=clock)
+        ringer.start("bell.wav", 0.2, 0.5, on_timeout=self.timed_out.set)
+        self.assertTrue(self.timed_out.wait(5))
+        # Only woken up for the three repetitions and the timeout
+        self.assertLess(clock.call_count, 12)
+
+    def test_sound_start_on_first_repetition(self):
+        on_sound_start = MagicMock()
+        self.ringer.start(
+            "bell.wav",
+            0.1,
+            0.25,
+            on_timeout=self.timed_out.set,
+            on_sound_start=on_sound_start,
+        )
+        self.assertTrue(self.timed_out.wait(5))
+        calls = self.player.play.call_args_list
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(calls[0], (("bell.wav",), {"on_start": on_sound_start}))
+        self.assertEqual(calls[1], (("bell.wav",), {}))
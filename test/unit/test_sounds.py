@@ -0,0 +1,135 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+import unittest
+from os.path import exists, join
+from tempfile import TemporaryDirectory
+
+from lib.sounds import SoundCache
+
+# Stand-in for mpg123 writing one second of silence per mp3 byte
+FAKE_DECODER = """
+import sys, wave
+with open(sys.argv[2], "rb") as mp3:
+    seconds = len(mp3.read())
+with wave.open(sys.argv[1], "wb") as wav:
+    wav.setnchannels(2)
+    wav.setsampwidth(2)
+    wav.setframerate(8000)
+    wav.writeframes(bytes(4 * 8000 * seconds))
+"""
+
+# Stand-in for a decoder that fails, counting its calls in a file
+FAILING_DECODER = """
+import sys
+with open(sys.argv[1], "a") as calls:
+    calls.write(sys.argv[3] + "\\n")
+sys.exit(1)
+"""
+
+
+class TestSoundCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.sounds_dir = join(self.tmp_dir.name, "sounds")
+        self.cache_dir = join(self.tmp_dir.name, "cache")
+        os.makedirs(self.sounds_dir)
+        self.write_mp3("bell", 5)
+        self.write_mp3("chimes", 22)
+        self.cache = SoundCache(
+            self.sounds_dir,
+            self.cache_dir,
+            decode_command=[sys.executable, "-c", FAKE_DECODER],
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_mp3(self, name, seconds):
+        with open(join(self.sounds_dir, name + ".mp3"), "wb") as mp3:
+            mp3.write(bytes(seconds))
+
+    def test_names(self):
+        self.assertEqual(self.cache.names(), ["bell", "chimes"])
+        self.write_mp3("new_sound", 3)
+        self.assertEqual(self.cache.names(), ["bell", "chimes", "new_sound"])
+
+    def test_decode_once(self):
+        wav_file = self.cache.get("bell")
+        self.assertEqual(wav_file, join(self.cache_dir, "bell.wav"))
+        self.assertEqual(self.cache.duration("bell"), 5.0)
+        self.assertEqual(self.cache.duration("chimes"), 22.0)
+
+        mtime = os.stat(wav_file).st_mtime
+        self.assertEqual(self.cache.get("bell"), wav_file)
+        self.assertEqual(os.stat(wav_file).st_mtime, mtime)
+
+    def test_decode_again_when_changed(self):
+        self.assertEqual(self.cache.duration("bell"), 5.0)
+        self.write_mp3("bell", 7)
+        mp3_file = join(self.sounds_dir, "bell.mp3")
+        mtime = os.stat(join(self.cache_dir, "bell.wav")).st_mtime
+        os.utime(mp3_file, (mtime + 1, mtime + 1))
+        self.assertEqual(self.cache.duration("bell"), 7.0)
+
+    def test_missing_sound(self):
+        self.assertIsNone(self.cache.get("siren"))
+
+    def test_decoder_not_available(self):
+        cache = SoundCache(
+            self.sounds_dir, self.cache_dir, decode_command=["/nonexistent/mpg123"]
+        )
+        self.assertEqual(cache.get("bell"), join(self.sounds_dir, "bell.mp3"))
+        self.assertEqual(cache.duration("bell"), 5.0)
+        self.assertEqual(cache.duration("chimes"), 22.0)
+        self.assertFalse(exists(join(self.cache_dir, "bell.wav.tmp")))
+
+        self.write_mp3("siren", 3)
+        self.assertIsNone(cache.duration("siren"))
+        cache = SoundCache(
+            self.sounds_dir,
+            self.cache_dir,
+            decode_command=["/nonexistent/mpg123"],
+            durations={"siren": 3.0},
+        )
+        self.assertEqual(cache.duration("siren"), 3.0)
+        self.assertIsNone(cache.duration("bell"))
+
+    def test_failed_decode_not_retried(self):
+        calls_file = join(self.tmp_dir.name, "calls")
+        cache = SoundCache(
+            self.sounds_dir,
+            self.cache_dir,
+            decode_command=[sys.executable, "-c", FAILING_DECODER, calls_file],
+        )
+
+        def decoder_calls():
+            with open(calls_file) as calls:
+                return len(calls.read().splitlines())
+
+        mp3_file = join(self.sounds_dir, "bell.mp3")
+        self.assertEqual(cache.get("bell"), mp3_file)
+        self.assertEqual(cache.get("bell"), mp3_file)
+        self.assertEqual(cache.duration("bell"), 5.0)
+        self.assertEqual(decoder_calls(), 1)
+
+        # Only a changed mp3 is decoded again
+        self.write_mp3("bell", 7)
+        mtime = os.stat(mp3_file).st_mtime
+        os.utime(mp3_file, (mtime + 1, mtime + 1))
+        self.assertEqual(cache.get("bell"), mp3_file)
+        self.assertEqual(cache.get("bell"), mp3_file)
+        self.assertEqual(decoder_calls(), 2)
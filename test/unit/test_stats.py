@@ -0,0 +1,146 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from lib.stats import FiringLog, LatencyHistogram, LatencyStats, traced
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for ms in range(1, 101):
+            histogram.add(ms / 1000)
+        summary = histogram.summary()
+        self.assertEqual(summary["count"], 100)
+        self.assertAlmostEqual(summary["mean_ms"], 50.5)
+        self.assertAlmostEqual(summary["max_ms"], 100)
+        for percent in (50, 95, 99):
+            estimate = summary["p{}_ms".format(percent)]
+            self.assertGreaterEqual(estimate, percent * 0.999)
+            self.assertLessEqual(estimate, percent * histogram.factor)
+
+    def test_bounds(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(histogram.percentile(50), 0.0)
+        histogram.add(0)
+        histogram.add(1e6)
+        self.assertEqual(histogram.percentile(50), histogram.smallest)
+        self.assertEqual(histogram.percentile(100), 1e6)
+
+
+class TestLatencyStats(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.stats = LatencyStats(clock=self.clock)
+
+    def test_stages_are_summed_per_request(self):
+        with self.stats.trace("set"):
+            with self.stats.span("prompt"):
+                self.clock.now += 2.0
+            self.stats.record("datetime", 0.01)
+            with self.stats.span("prompt"):
+                self.clock.now += 1.0
+            self.clock.now += 0.5
+        summary = self.stats.summary()["set"]
+        self.assertEqual(set(summary), {"datetime", "prompt", "total"})
+        self.assertEqual(summary["prompt"]["count"], 1)
+        self.assertAlmostEqual(summary["prompt"]["max_ms"], 3000)
+        self.assertAlmostEqual(summary["total"]["max_ms"], 3500)
+
+    def test_outside_of_trace(self):
+        with self.stats.span("schedule"):
+            self.clock.now += 1.0
+        self.stats.record("datetime", 1.0)
+        self.assertEqual(self.stats.summary(), {})
+
+    def test_nested_traces(self):
+        with self.stats.trace("wake"):
+            with self.stats.trace("set"):
+                self.stats.record("name", 0.1)
+            self.stats.record("name", 0.2)
+        summary = self.stats.summary()
+        self.assertAlmostEqual(summary["set"]["name"]["max_ms"], 100)
+        self.assertAlmostEqual(summary["wake"]["name"]["max_ms"], 200)
+
+    def test_traced(self):
+        class Handler:
+            def __init__(self, latency):
+                self.latency = latency
+
+            @traced("status")
+            def handle(self, clock):
+                clock.now += 0.25
+                raise ValueError
+
+        with self.assertRaises(ValueError):
+            Handler(self.stats).handle(self.clock)
+        self.assertAlmostEqual(self.stats.summary()["status"]["total"]["max_ms"], 250)
+
+    def test_dump(self):
+        with self.stats.trace("snooze"):
+            self.clock.now += 0.1
+        with TemporaryDirectory() as path:
+            stats_file = join(path, "latency.json")
+            self.stats.dump(stats_file)
+            with open(stats_file) as json_file:
+                self.assertEqual(json.load(json_file), self.stats.summary())
+        self.stats.clear()
+        self.assertEqual(self.stats.summary(), {})
+
+
+class TestFiringLog(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.monotonic = FakeClock()
+        self.log = FiringLog(size=3, clock=lambda: self.now, monotonic=self.monotonic)
+
+    def test_firings(self):
+        audio_started = self.log.fired({"timestamp": 999.5})
+        self.monotonic.now += 0.2
+        audio_started()
+        self.monotonic.now += 1.0
+        audio_started()
+        self.now = 1600.0
+        self.log.fired({"timestamp": 1598.0, "snooze": 999.5})
+
+        summary = self.log.summary()
+        self.assertEqual(summary["lateness"]["count"], 1)
+        self.assertAlmostEqual(summary["lateness"]["max_ms"], 500)
+        self.assertAlmostEqual(summary["snooze_lateness"]["p50_ms"], 2000)
+        self.assertEqual(summary["audio_start"]["count"], 1)
+        self.assertAlmostEqual(summary["audio_start"]["mean_ms"], 200)
+        self.assertEqual(len(summary["recent"]), 2)
+        self.assertIsNone(summary["recent"][1]["audio_start_ms"])
+
+    def test_ring_buffer(self):
+        for lateness in range(5):
+            self.log.fired({"timestamp": self.now - lateness})
+        self.assertEqual(len(self.log), 3)
+        summary = self.log.summary(recent=0)
+        self.assertEqual(summary["lateness"]["count"], 3)
+        self.assertAlmostEqual(summary["lateness"]["max_ms"], 4000)
+        self.assertAlmostEqual(summary["lateness"]["p50_ms"], 3000)
+        self.assertEqual(summary["recent"], [])
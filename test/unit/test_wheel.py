@@ -0,0 +1,106 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import unittest
+from datetime import datetime, timedelta, timezone
+from math import ceil, floor
+
+from lib.engine import AlarmEngine
+from lib.wheel import AlarmDispatcher, TimerWheel
+
+START = 1600000000.0
+
+
+class TestTimerWheel(unittest.TestCase):
+    def test_fires_at_the_right_second(self):
+        rand = random.Random(1)
+        wheel = TimerWheel(START)
+        timestamps = [
+            START + rand.choice([0.5, 59, 61, 3599.5, 3601, 86400, 86401, 5e5, 4e7])
+            for _ in range(200)
+        ]
+        for idx, timestamp in enumerate(timestamps):
+            wheel.add(timestamp, idx)
+        self.assertEqual(len(wheel), 200)
+
+        fired = {}
+        now = START
+        for step in [0.2, 1, 58, 1, 1, 3000, 538.5, 1.5, 1, 82798, 1, 1, 4e5, 4e7]:
+            now += step
+            for idx in wheel.advance(now):
+                fired[idx] = now
+            # Everything due has fired, nothing early
+            for idx, timestamp in enumerate(timestamps):
+                self.assertEqual(idx in fired, ceil(timestamp) <= floor(now))
+        self.assertEqual(len(fired), 200)
+        self.assertEqual(len(wheel), 0)
+
+    def test_matches_sorting(self):
+        rand = random.Random(2)
+        wheel = TimerWheel(START)
+        timestamps = [START + rand.randrange(1, 3 * 86400) for _ in range(1000)]
+        for timestamp in timestamps:
+            wheel.add(timestamp, timestamp)
+        fired = []
+        for second in range(1, 3 * 86400 + 1, 7):
+            fired.extend(wheel.advance(START + second))
+        self.assertEqual(sorted(fired), sorted(timestamps))
+        self.assertEqual(
+            fired, sorted(fired), "items should be fired in time order across ticks"
+        )
+
+    def test_past_and_cancelled_items(self):
+        wheel = TimerWheel(START)
+        wheel.add(START - 10, "past")
+        entry = wheel.add(START + 120, "cancelled")
+        wheel.add(START + 120, "kept")
+        wheel.cancel(entry)
+        wheel.cancel(entry)
+        self.assertEqual(len(wheel), 2)
+        self.assertEqual(wheel.advance(START), ["past"])
+        self.assertEqual(wheel.advance(START + 200), ["kept"])
+        self.assertEqual(len(wheel), 0)
+
+
+class TestAlarmDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.now = START
+        self.fired = []
+        self.dispatcher = AlarmDispatcher(self.fired.extend, clock=lambda: self.now)
+
+    def test_arm_replaces(self):
+        self.dispatcher.arm("kitchen", START + 30)
+        self.dispatcher.arm("kitchen", START + 90)
+        self.dispatcher.arm("bedroom", START + 60)
+        self.dispatcher.arm("hall", START + 10)
+        self.dispatcher.disarm("hall")
+        self.now = START + 60
+        self.assertEqual(self.dispatcher.run_pending(), ["bedroom"])
+        self.now = START + 120
+        self.dispatcher.run_pending()
+        self.assertEqual(self.fired, ["bedroom", "kitchen"])
+
+    def test_engines(self):
+        clock = lambda: datetime.fromtimestamp(self.now, timezone.utc)
+        engines = {
+            device: AlarmEngine(clock=clock, notifier=self.dispatcher.notifier(device))
+            for device in range(100)
+        }
+        for device, engine in engines.items():
+            engine.create(clock() + timedelta(minutes=device + 1))
+        engines[5].delete_all()
+
+        self.now = START + 10 * 60
+        self.assertEqual(self.dispatcher.run_pending(), list(range(5)) + [6, 7, 8, 9])